@@ -0,0 +1,129 @@
+class Effect:
+    """
+        Class Effect:
+            A visual effect that is drawn every frame for a fixed amount of time.
+
+            Methods
+            -------
+            __init__(self, duration, draw, rect)
+                Creates the effect. draw(surface, progress) is called every frame with progress going from 0 to 1,
+                and rect is the screen area the effect may paint over.
+
+            Update(self, dt)
+                Advances the effect by dt milliseconds and returns False once it has finished.
+
+            Draw(self, surface)
+                Draws the current state of the effect and returns the rect it painted over.
+    """
+    def __init__(self, duration, draw, rect):
+        self.duration = duration
+        self.elapsed = 0
+        self.draw_function = draw
+        self.rect = rect
+
+    def update(self, dt):
+        """
+        :param dt: Milliseconds since the last frame.
+        :return: True while the effect is still playing.
+        """
+        self.elapsed += dt
+        return self.elapsed < self.duration
+
+    def draw(self, surface):
+        """
+        :param surface: The surface to draw the effect on.
+        :return: The screen rect the effect may have painted over.
+        """
+        self.draw_function(surface, min(1.0, self.elapsed / self.duration))
+        return self.rect
+
+
+class MessageCountdown:
+    """
+        Class MessageCountdown:
+            Counts down a game's message_timer by one every simulation tick and clears the message once it runs out.
+            It never finishes on its own and draws nothing.
+    """
+    def __init__(self, game):
+        self.game = game
+
+    def update(self, dt):
+        """
+        :param dt: Milliseconds since the last tick (unused, the timer counts ticks).
+        :return: True, the countdown keeps running for the whole game.
+        """
+        if self.game.message_timer > 0:
+            self.game.message_timer -= 1
+            if self.game.message_timer == 0:
+                self.game.current_message = ""
+        return True
+
+    def draw(self, surface):
+        """
+        :param surface: The surface to draw on.
+        :return: None, nothing is drawn.
+        """
+        return None
+
+
+class Animator:
+    """
+        Class Animator:
+            Keeps the timed entries (effects, countdowns) that are advanced by the main loop's frame clock,
+            so nothing has to block the loop with pygame.time.delay.
+
+            An entry is any object with update(dt), returning False once it has finished, and draw(surface),
+            returning the rect it painted over or None.
+
+            Methods
+            -------
+            Add(self, entry)
+                Schedules an entry.
+
+            Play(self, duration, draw, rect)
+                Schedules an Effect and returns it.
+
+            Update(self, dt)
+                Advances every entry by dt milliseconds and drops the finished ones.
+
+            Draw(self, surface)
+                Draws every entry and returns the rects that were painted over.
+    """
+    def __init__(self):
+        self.entries = []
+
+    def add(self, entry):
+        """
+        :param entry: The entry to schedule.
+        :return: The entry.
+        """
+        self.entries.append(entry)
+        return entry
+
+    def play(self, duration, draw, rect):
+        """
+        :param duration: How long the effect plays, in milliseconds.
+        :param draw: Function draw(surface, progress) that draws the effect.
+        :param rect: The screen area the effect may paint over.
+        :return: The scheduled Effect.
+        """
+        return self.add(Effect(duration, draw, rect))
+
+    def update(self, dt):
+        """
+        :param dt: Milliseconds since the last frame.
+        :return: None
+        """
+        self.entries = [entry for entry in self.entries if entry.update(dt)]
+
+    def draw(self, surface):
+        """
+        :param surface: The surface to draw on.
+        :return: List of rects painted over by the entries.
+        """
+        rects = []
+        for entry in self.entries:
+            rect = entry.draw(surface)
+            if rect:
+                rects.append(rect)
+        return rects
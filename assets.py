@@ -0,0 +1,191 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pygame
+
+# Directory where packed atlases are cached between runs
+CACHE_DIR = ".sprite_cache"
+
+
+class SpriteLoader:
+    """
+        class SpriteLoader:
+    def __init__(self, file_name, cell_size):
+        """
+    def __init__(self, file_name, cell_size):
+        """
+        Initialize the sprite loader with the file name and desired cell size.
+
+        :param file_name: Path to the sprite image file.
+        :param cell_size: Tuple (width, height) for scaling the sprite.
+        """
+        self.file_name = file_name
+        self.cell_size = cell_size
+        self.sprite = self.load_and_scale()
+
+    def load_and_scale(self):
+        """
+        Load the sprite from the file and scale it to the desired size.
+
+        :return: Scaled sprite as a pygame.Surface object.
+        """
+        sprite = pygame.image.load(self.file_name).convert_alpha()
+        return pygame.transform.scale(sprite, self.cell_size)
+
+
+class SpriteAtlas:
+    """
+        Class SpriteAtlas:
+            Packs every sprite, already scaled to the cell size, side by side into a single surface.
+
+            Decoding the full size PNGs and scaling them is the slowest part of starting the game, so the packed
+            atlas is written to CACHE_DIR as raw RGBA pixels. The cache file name is derived from the cell size
+            and a hash of every source file, so editing a PNG or changing the cell size simply misses the cache.
+            Scaled variants of a sprite (like the larger boss sprite) are made once and then reused.
+
+            Methods
+            -------
+            __init__(self, sprite_files, cell_size, cache_dir=CACHE_DIR)
+                Loads the atlas from the cache, or builds and caches it.
+
+            Get(self, name)
+                Returns the sprite with the given name.
+
+            Scaled(self, name, factor)
+                Returns the sprite scaled by a factor relative to the cell size.
+    """
+    def __init__(self, sprite_files, cell_size, cache_dir=CACHE_DIR):
+        """
+        :param sprite_files: Dictionary mapping sprite names to image file paths.
+        :param cell_size: Width and height each sprite is scaled to.
+        :param cache_dir: Directory for the cached atlas, or None to disable the disk cache.
+        """
+        self.sprite_files = sprite_files
+        self.cell_size = cell_size
+        self.cache_dir = cache_dir
+        self.names = list(sprite_files)
+        self.surface = self.load()
+        self.sprites = {name: self.surface.subsurface((index * cell_size, 0, cell_size, cell_size))
+                        for index, name in enumerate(self.names)}
+        self.variants = {}
+
+    def cache_path(self):
+        """
+        :return: Path of the cache file for the current sprite files and cell size.
+        """
+        digest = hashlib.sha1(str(self.cell_size).encode())
+        for name in self.names:
+            digest.update(name.encode())
+            with open(self.sprite_files[name], "rb") as file:
+                digest.update(hashlib.sha1(file.read()).digest())
+        return os.path.join(self.cache_dir, f"atlas-{digest.hexdigest()}.rgba")
+
+    def load(self):
+        """
+        Reads the atlas from the cache if possible, otherwise builds it from the image files and caches it.
+
+        :return: The atlas as a pygame.Surface.
+        """
+        size = (len(self.names) * self.cell_size, self.cell_size)
+        path = self.cache_path() if self.cache_dir else None
+
+        if path and os.path.exists(path):
+            with open(path, "rb") as file:
+                pixels = file.read()
+            if len(pixels) == size[0] * size[1] * 4:
+                return pygame.image.frombytes(pixels, size, "RGBA").convert_alpha()
+
+        surface = self.build(size)
+        if path:
+            self.save(surface, path)
+        return surface
+
+    def build(self, size):
+        """
+        :param size: Size of the atlas surface.
+        :return: A new atlas surface with every sprite decoded and scaled into its slot.
+        """
+        surface = pygame.Surface(size, pygame.SRCALPHA).convert_alpha()
+        for index, name in enumerate(self.names):
+            sprite = SpriteLoader(self.sprite_files[name], (self.cell_size, self.cell_size)).sprite
+            surface.blit(sprite, (index * self.cell_size, 0))
+        return surface
+
+    def save(self, surface, path):
+        """
+        Writes the atlas pixels to the cache. A failed write only means the next start builds the atlas again.
+
+        :param surface: The atlas surface.
+        :param path: Path of the cache file.
+        :return: None
+        """
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temporary_path = path + ".tmp"
+            with open(temporary_path, "wb") as file:
+                file.write(pygame.image.tobytes(surface, "RGBA"))
+            os.replace(temporary_path, path)
+        except OSError:
+            pass
+
+    def get(self, name):
+        """
+        :param name: Name of the sprite.
+        :return: The sprite, scaled to the cell size.
+        """
+        return self.sprites[name]
+
+    def scaled(self, name, factor):
+        """
+        :param name: Name of the sprite.
+        :param factor: Size relative to the cell size, e.g. 1.5 for the boss.
+        :return: The scaled sprite, made on the first request and reused afterward.
+        """
+        size = int(self.cell_size * factor)
+        key = (name, size)
+        variant = self.variants.get(key)
+        if variant is None:
+            variant = self.variants[key] = pygame.transform.scale(self.sprites[name], (size, size))
+        return variant
+
+
+class BackgroundAtlas:
+    """
+        Class BackgroundAtlas:
+            Builds a SpriteAtlas on a worker thread, so the window can show its first frames while the PNGs are
+            decoded and scaled. pygame releases the GIL while it loads and scales images, so the main loop keeps
+            running meanwhile. The display mode must be set before, the atlas converts its surface to it.
+
+            Methods
+            -------
+            Poll(self)
+                Returns the SpriteAtlas once it is built, None before that.
+    """
+    def __init__(self, sprite_files, cell_size, cache_dir=CACHE_DIR):
+        """
+        :param sprite_files: Dictionary mapping sprite names to image file paths.
+        :param cell_size: Width and height each sprite is scaled to.
+        :param cache_dir: Directory for the cached atlas, or None to disable the disk cache.
+        """
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sprites")
+        self.future = executor.submit(SpriteAtlas, sprite_files, cell_size, cache_dir)
+        executor.shutdown(wait=False)
+
+    def poll(self):
+        """
+        :return: The SpriteAtlas if it is built, otherwise None. Raises whatever building it raised.
+        """
+        if not self.future.done():
+            return None
+        return self.future.result()
+
+
+def placeholder(color, size):
+    """
+    :param color: Fill color.
+    :param size: Width and height.
+    :return: A flat colored square, drawn in place of a sprite that has not loaded yet.
+    """
+    surface = pygame.Surface((size, size)).convert()
+    surface.fill(color)
+    return surface
@@ -0,0 +1,321 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from array import array
+
+# Render without a window, so the suite runs on servers and in CI
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+from game import DungeonGame, is_path_available, item_pool
+from occupancy import ENEMY, WALL, CELL_TYPECODE
+
+# Every game in the suite is created from this seed, so runs measure exactly the same work
+SEED = 1234
+
+MAP_SIZES = (10, 50, 100, 250, 500, 1000)
+PATH_MAP_SIZES = (10, 50, 100, 250)
+ENEMY_COUNTS = (10, 100, 1000, 10000)
+ENEMY_MAP_SIZE = 200
+SESSION_COUNTS = (100, 1000, 5000)
+
+# Sizes left out by --quick
+QUICK_MAX_MAP_SIZE = 250
+
+
+def measure(function, min_time=0.2, min_repeats=3, max_repeats=1000, warmup=0.05):
+    """
+    Calls a function until at least min_time has passed and it ran at least min_repeats times.
+    The first warmup seconds are not counted, they fill caches and let the CPU clock up.
+
+    :param function: Function without arguments to time.
+    :param min_time: Seconds to keep repeating for.
+    :param min_repeats: Lowest number of calls.
+    :param max_repeats: Highest number of calls.
+    :param warmup: Seconds of calls to run before measuring, at least one call.
+    :return: Dictionary with the median and minimum time per call in seconds and the number of calls.
+    """
+    warm_until = time.perf_counter() + warmup
+    function()
+    while time.perf_counter() < warm_until:
+        function()
+    durations = []
+    started = time.perf_counter()
+    while len(durations) < max_repeats and (len(durations) < min_repeats or time.perf_counter() - started < min_time):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(durations), "min_s": min(durations), "repeats": len(durations)}
+
+
+def bench_generate_new_map(map_sizes):
+    """
+    :param map_sizes: Map sizes to generate levels for.
+    :return: Dictionary with the time of one generate_new_map call per map size.
+    """
+    results = {}
+    for map_size in map_sizes:
+        game = DungeonGame(map_size, seed=SEED)
+        results[f"generate_new_map/{map_size}"] = measure(game.generate_new_map)
+    return results
+
+
+def bench_is_path_available(map_sizes):
+    """
+    :param map_sizes: Map sizes to search on.
+    :return: Dictionary with the time of one player-to-portal search per map size.
+    """
+    results = {}
+    for map_size in map_sizes:
+        game = DungeonGame(map_size, seed=SEED)
+        results[f"is_path_available/{map_size}"] = measure(
+            lambda: is_path_available(game.player_position, game.portal_position, game.grid))
+    return results
+
+
+def bench_reachability(map_sizes):
+    """
+    :param map_sizes: Map sizes to update the reachability on.
+    :return: Dictionary with the time of adding and removing a wall on an open cell, with the distances to the portal
+        kept up to date, and asking whether the portal can still be reached, per map size.
+    """
+    results = {}
+    for map_size in map_sizes:
+        game = DungeonGame(map_size, seed=SEED)
+        reachability = game.reachability
+        reachability.distance(game.player_position)  # Floods the distances, so they are maintained from now on
+        rng = random.Random(SEED)
+        open_cells = [[row, col] for row in range(1, map_size + 1) for col in range(1, map_size + 1)
+                      if not game.grid.has(WALL, [row, col]) and [row, col] != game.portal_position]
+
+        def toggle():
+            position = rng.choice(open_cells)
+            reachability.add_wall(position)
+            reachability.connected(game.player_position, game.portal_position)
+            reachability.remove_wall(position)
+        results[f"reachability/{map_size}"] = measure(toggle)
+    return results
+
+
+def horde_game(enemy_count, batched):
+    """
+    :param enemy_count: Number of goblins.
+    :param batched: Whether the game moves them with NumPy.
+    :return: A DungeonGame on an ENEMY_MAP_SIZE map with enemy_count goblins spread over its open cells and a player
+        that cannot die.
+    """
+    game = DungeonGame(ENEMY_MAP_SIZE, batched_enemies=batched, seed=SEED)
+    rng = random.Random(SEED)
+    open_cells = [game.grid.index([row, col]) for row in range(1, ENEMY_MAP_SIZE + 1)
+                  for col in range(1, ENEMY_MAP_SIZE + 1)
+                  if not game.grid.has(WALL, [row, col]) and [row, col] != game.player_position]
+    game.enemies = array(CELL_TYPECODE, rng.sample(open_cells, min(enemy_count, len(open_cells))))
+    game.grid.replace(ENEMY, game.enemies)
+    game.player_stats["health"] = 10 ** 12
+    return game
+
+
+def bench_enemy_turn(enemy_counts, batched_available):
+    """
+    :param enemy_counts: Numbers of goblins to move.
+    :param batched_available: Whether NumPy is installed, to also time the batched enemy turn.
+    :return: Dictionary with the time of one enemy_turn call per enemy count.
+    """
+    results = {}
+    for enemy_count in enemy_counts:
+        game = horde_game(enemy_count, False)
+        results[f"enemy_turn/{enemy_count}"] = measure(game.enemy_turn)
+        if batched_available:
+            game = horde_game(enemy_count, True)
+            results[f"enemy_turn_batched/{enemy_count}"] = measure(game.enemy_turn)
+    return results
+
+
+def bench_render():
+    """
+    :return: Dictionary with the time of drawing and pushing a whole frame, with the inventory closed and open.
+    """
+    # Imported here, they need a display
+    from assets import SpriteAtlas
+    from renderer import Renderer
+
+    map_size = 10
+    cell_size = 50
+    screen = pygame.display.set_mode(((map_size + 2) * cell_size + 200, (map_size + 2) * cell_size))
+    atlas = SpriteAtlas({
+        "adventurer": 'adventurer.png',
+        "goblin": 'goblin.png',
+        "wall": 'wal.png',
+        "chest": 'chest.png',
+        "spider": 'spooder.png'
+    }, cell_size)
+    renderer = Renderer(screen, cell_size, {
+        "adventurer": atlas.get("adventurer"),
+        "goblin": atlas.get("goblin"),
+        "wall": atlas.get("wall"),
+        "chest": atlas.get("chest"),
+        "boss": atlas.scaled("spider", 1.5)
+    })
+    game = DungeonGame(map_size, seed=SEED)
+    game.inventory = list(item_pool)
+
+    def full_frame():
+        renderer.map_version = None  # Forces the background to be rebuilt and everything to be drawn
+        pygame.display.update(renderer.draw(game))
+
+    results = {}
+    for inventory_open in (False, True):
+        game.inventory_open = inventory_open
+        name = "inventory_open" if inventory_open else "inventory_closed"
+        results[f"render_full_frame/{name}"] = measure(full_frame)
+    return results
+
+
+def bench_render_tilemap(map_sizes):
+    """
+    :param map_sizes: Map sizes to draw through the scrolling tile map renderer.
+    :return: Dictionary with the time of drawing and pushing one frame per map size, with the chunks in view baked.
+    """
+    from renderer import TileMapRenderer
+
+    view_cells = 16
+    cell_size = 50
+    screen = pygame.display.set_mode((view_cells * cell_size + 200, view_cells * cell_size))
+    sprites = {name: pygame.Surface((cell_size, cell_size)).convert() for name in ("adventurer", "goblin", "wall",
+                                                                                     "chest")}
+    sprites["boss"] = pygame.Surface((cell_size * 3 // 2, cell_size * 3 // 2)).convert()
+    results = {}
+    for map_size in map_sizes:
+        game = DungeonGame(map_size, seed=SEED)
+        game.player_position = [map_size // 2, map_size // 2]  # Away from the corner, so the camera spans chunks
+        renderer = TileMapRenderer(screen, cell_size, sprites, view_cells)
+        results[f"render_tilemap/{map_size}"] = measure(lambda: pygame.display.update(renderer.draw(game)))
+    return results
+
+
+def bench_server_tick(session_counts):
+    """
+    :param session_counts: Numbers of sessions hosted by one server.
+    :return: Dictionary with the time of one server tick per session count, with a key pressed in every session.
+    """
+    from game import ACTIONS
+    from server import GameServer
+
+    results = {}
+    for session_count in session_counts:
+        server = GameServer()
+        sessions = [server.create_session(seed=SEED + number) for number in range(session_count)]
+        for session in sessions:
+            session.game.player_stats["health"] = 10 ** 9  # Keep every session playing however long it runs
+        rng = random.Random(SEED)
+
+        def tick():
+            for session in sessions:
+                server.queue(session, rng.choice(ACTIONS))
+            server.tick()
+        results[f"server_tick/{session_count}"] = measure(tick)
+    return results
+
+
+def environment():
+    """
+    :return: Dictionary describing the machine and library versions the results were measured with.
+    """
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "pygame": pygame.version.ver,
+        "numpy": numpy_version,
+        "seed": SEED
+    }
+
+
+def run(quick=False, only=None):
+    """
+    :param quick: Leave out the largest maps.
+    :param only: If given, only run benchmarks whose name contains this text.
+    :return: Dictionary with the environment and the result of every benchmark.
+    """
+    pygame.init()
+    map_sizes = [size for size in MAP_SIZES if not quick or size <= QUICK_MAX_MAP_SIZE]
+    try:
+        import numpy  # noqa: F401, only checks that the batched enemy turn can run
+        batched_available = True
+    except ImportError:
+        batched_available = False
+
+    suites = {
+        "generate_new_map": lambda: bench_generate_new_map(map_sizes),
+        "is_path_available": lambda: bench_is_path_available(PATH_MAP_SIZES),
+        "reachability": lambda: bench_reachability(PATH_MAP_SIZES),
+        "enemy_turn": lambda: bench_enemy_turn(ENEMY_COUNTS, batched_available),
+        "render_full_frame": bench_render,
+        "render_tilemap": lambda: bench_render_tilemap(map_sizes),
+        "server_tick": lambda: bench_server_tick(SESSION_COUNTS)
+    }
+    results = {}
+    for name, suite in suites.items():
+        if only and only not in name:
+            continue
+        for benchmark, result in suite().items():
+            results[benchmark] = result
+            print(f"{benchmark:40} {result['median_s'] * 1000:10.3f} ms  ({result['repeats']} runs)")
+    pygame.quit()
+    return {"environment": environment(), "results": results}
+
+
+def compare(results, baseline, tolerance):
+    """
+    :param results: Output of run().
+    :param baseline: Output of an earlier run().
+    :param tolerance: Allowed slowdown of the median as a fraction, e.g. 0.1 for 10%.
+    :return: List of (benchmark, baseline median, new median) for every benchmark that got slower than allowed.
+    """
+    regressions = []
+    for benchmark, result in results["results"].items():
+        old = baseline["results"].get(benchmark)
+        if old is None:
+            continue
+        ratio = result["median_s"] / old["median_s"]
+        status = "REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{benchmark:40} {old['median_s'] * 1000:10.3f} -> {result['median_s'] * 1000:10.3f} ms "
+              f"{ratio:6.2f}x {status}")
+        if status:
+            regressions.append((benchmark, old["median_s"], result["median_s"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark map generation, enemy AI, rendering and the game server headlessly.")
+    parser.add_argument("--output", default="benchmark_results.json", help="File the results are written to")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown before flagging, 0.15 = 15%%")
+    parser.add_argument("--quick", action="store_true", help=f"Skip maps larger than {QUICK_MAX_MAP_SIZE}")
+    parser.add_argument("--only", help="Only run benchmarks whose name contains this text")
+    arguments = parser.parse_args()
+
+    results = run(arguments.quick, arguments.only)
+    with open(arguments.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+        if baseline["environment"] != results["environment"]:
+            print("Warning: the baseline was measured in a different environment")
+        if compare(results, baseline, arguments.tolerance):
+            sys.exit(1)
@@ -0,0 +1,50 @@
+import sys
+from array import array
+
+
+def pack_bits(cells):
+    """
+    :param cells: Bytes holding 0 or 1 per cell.
+    :return: The same cells packed eight to a byte, the first cell in the lowest bit.
+    """
+    padded = bytes(cells) + bytes(-len(cells) % 8)
+    packed = 0
+    for bit in range(8):
+        packed |= int.from_bytes(padded[bit::8].translate(bytes([0, 1 << bit] + [0] * 254)), "little")
+    return packed.to_bytes(len(padded) // 8, "little")
+
+
+def unpack_bits(bitmap, count):
+    """
+    :param bitmap: Bytes from pack_bits.
+    :param count: Number of cells that were packed.
+    :return: Bytearray holding 0 or 1 per cell.
+    """
+    cells = bytearray(len(bitmap) * 8)
+    for bit in range(8):
+        cells[bit::8] = bytes(bitmap).translate(bytes((value >> bit) & 1 for value in range(256)))
+    return cells[:count]
+
+
+def little_endian_bytes(values):
+    """
+    :param values: An array.
+    :return: Its items as little-endian bytes, whatever the byte order of the machine.
+    """
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def little_endian_array(typecode, data):
+    """
+    :param typecode: Type code of the array.
+    :param data: Bytes from little_endian_bytes, or any buffer holding them.
+    :return: The array.
+    """
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
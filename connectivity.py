@@ -0,0 +1,439 @@
+import heapq
+from array import array
+from collections import deque
+from occupancy import WALL
+
+# Terrain values used by the connectivity stage
+OPEN = 0
+BLOCKED = 1
+OUTSIDE = 2
+
+# Distance of cells the target cannot be reached from
+UNREACHED = 1 << 30
+
+
+def build_terrain(grid):
+    """
+    :param grid: OccupancyGrid of the map.
+    :return: Bytearray in the grid layout with BLOCKED on walls, OUTSIDE on the border and OPEN everywhere else.
+    """
+    width = grid.width
+    terrain = grid.cells.translate(bytes(BLOCKED if flags & WALL else OPEN for flags in range(256)))
+    terrain[:width] = bytes([OUTSIDE]) * width
+    terrain[-width:] = bytes([OUTSIDE]) * width
+    terrain[::width] = bytes([OUTSIDE]) * width
+    terrain[width - 1::width] = bytes([OUTSIDE]) * width
+    return terrain
+
+
+def label_components(terrain, width):
+    """
+    Labels the connected open areas with a single flood fill over the whole map.
+
+    :param terrain: Bytearray from build_terrain.
+    :param width: Row length of the terrain.
+    :return: Tuple (labels, count). labels is an array holding the component number of every open cell and -1 for
+        every other cell, count is the number of components.
+    """
+    labels = array("i", [-1]) * len(terrain)
+    offsets = (-width, width, -1, 1)
+    count = 0
+
+    for seed in range(len(terrain)):
+        if terrain[seed] != OPEN or labels[seed] != -1:
+            continue
+        labels[seed] = count
+        stack = [seed]
+        while stack:
+            cell = stack.pop()
+            for offset in offsets:
+                neighbor = cell + offset
+                if terrain[neighbor] == OPEN and labels[neighbor] == -1:
+                    labels[neighbor] = count
+                    stack.append(neighbor)
+        count += 1
+
+    return labels, count
+
+
+def walls_to_open(terrain, width, start, end):
+    """
+    Finds the smallest set of walls that has to be removed to walk from start to end, using a 0-1 BFS in which
+    entering an open cell is free and entering a wall costs one. Ties are broken by a fixed neighbour order,
+    so the same map always gives the same answer.
+
+    :param terrain: Bytearray from build_terrain.
+    :param width: Row length of the terrain.
+    :param start: Index of the start cell. It counts as open even if it is a wall.
+    :param end: Index of the end cell.
+    :return: List of wall indices to open, or None if end cannot be reached at all.
+    """
+    unvisited = len(terrain) + 1
+    cost = array("i", [unvisited]) * len(terrain)
+    came_from = array("i", [-1]) * len(terrain)
+    offsets = (-width, width, -1, 1)
+
+    cost[start] = 0
+    queue = deque([start])
+    while queue:
+        cell = queue.popleft()
+        if cell == end:
+            break
+        current = cost[cell]
+        for offset in offsets:
+            neighbor = cell + offset
+            kind = terrain[neighbor]
+            if kind == OUTSIDE:
+                continue
+            new_cost = current + kind
+            if new_cost < cost[neighbor]:
+                cost[neighbor] = new_cost
+                came_from[neighbor] = cell
+                if kind == OPEN:
+                    queue.appendleft(neighbor)
+                else:
+                    queue.append(neighbor)
+
+    if cost[end] == unvisited:
+        return None
+
+    walls = []
+    cell = end
+    while cell != start:
+        if terrain[cell] == BLOCKED:
+            walls.append(cell)
+        cell = came_from[cell]
+    walls.reverse()
+    return walls
+
+
+def connect(grid, start, end):
+    """
+    Makes sure end can be reached from start. The open areas are labelled once; if start and end are in different
+    ones, the smallest set of walls joining them is chosen.
+
+    :param grid: OccupancyGrid of the map.
+    :param start: Start position as a list [y, x].
+    :param end: End position as a list [y, x].
+    :return: List of [y, x] wall positions that have to be removed, empty if the two are already connected.
+    """
+    return Reachability(grid).connect(start, end)
+
+
+class Reachability:
+    """
+        Class Reachability:
+            Connected open areas and the walking distance to one target cell (the portal), kept up to date while
+            walls are removed and added, so the generator's repair loop and doors or destructible walls don't need a
+            full BFS per query.
+
+            The areas are a union-find over nodes. The cells start out as the nodes of label_components and cells
+            opened later get nodes of their own, so removing a wall only unions the new node with its neighbours.
+            Adding a wall can split an area, which union-find cannot undo. A flood is started from every open
+            neighbour of the new wall, one cell each in turn. Floods that meet merge, and the search stops as soon
+            as only one is left running. Every flood that ran out first is a part that was cut off and gets a new
+            node, so the cost is the size of the smaller parts, not of the map.
+
+            Distances are only computed once distance() is first called and are then maintained too. A removed
+            wall lowers distances with a wave from the opened cell. An added wall finds the cells whose every
+            shortest path went through it and refloods just those, from the cells around them.
+
+            Methods
+            -------
+            Connected(self, start, end)
+                Whether two open cells are in the same area, in O(α(n)).
+
+            Distance(self, position)
+                Walking distance from a position to the target, or None if it cannot be reached.
+
+            Remove_wall(self, position), add_wall(self, position)
+                Updates the areas and distances after the wall of a cell was removed or added.
+
+            Connect(self, start, end)
+                Opens the fewest walls joining start and end and returns them.
+    """
+    def __init__(self, grid, target=None):
+        """
+        :param grid: OccupancyGrid of the map.
+        :param target: Position [y, x] distances are measured to, or None if only connectivity is needed.
+        """
+        self.width = grid.width
+        self.terrain = build_terrain(grid)
+        self.target = None if target is None else target[0] * self.width + target[1]
+        self.distances = None  # Flooded on the first distance() call
+        self.relabel()
+
+    def relabel(self):
+        """
+        Rebuilds the union-find from a fresh labelling, which also drops the nodes left over from earlier updates.
+
+        :return: None
+        """
+        labels, count = label_components(self.terrain, self.width)
+        self.nodes = labels  # Node of every open cell, -1 for the others
+        self.parent = array("i", range(count))
+        self.rank = bytearray(count)
+
+    def new_node(self):
+        """
+        :return: A new node, in an area of its own.
+        """
+        node = len(self.parent)
+        self.parent.append(node)
+        self.rank.append(0)
+        return node
+
+    def find(self, node):
+        """
+        :param node: A union-find node.
+        :return: The root of the node's area, halving the path on the way.
+        """
+        parent = self.parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(self, first, second):
+        """
+        :param first: A union-find node.
+        :param second: Another union-find node.
+        :return: None
+        """
+        first = self.find(first)
+        second = self.find(second)
+        if first == second:
+            return
+        if self.rank[first] < self.rank[second]:
+            first, second = second, first
+        self.parent[second] = first
+        if self.rank[first] == self.rank[second]:
+            self.rank[first] += 1
+
+    def component(self, position):
+        """
+        :param position: A position as a list [y, x].
+        :return: Identifier of the open area the position is in, or None if it is not open. Identifiers change as the
+            map is updated, only compare identifiers taken in between the same updates.
+        """
+        node = self.nodes[position[0] * self.width + position[1]]
+        return None if node == -1 else self.find(node)
+
+    def connected(self, start, end):
+        """
+        :param start: A position as a list [y, x].
+        :param end: Another position as a list [y, x].
+        :return: True if both positions are open and can be walked between.
+        """
+        start = self.component(start)
+        return start is not None and start == self.component(end)
+
+    def distance(self, position):
+        """
+        :param position: A position as a list [y, x].
+        :return: Number of steps from the position to the target, or None if it cannot be reached.
+        """
+        if self.distances is None:
+            self.flood()
+        value = self.distances[position[0] * self.width + position[1]]
+        return None if value == UNREACHED else value
+
+    def flood(self):
+        """
+        Computes the distance of every cell with a BFS from the target.
+
+        :return: None
+        """
+        terrain = self.terrain
+        width = self.width
+        distances = self.distances = array("i", [UNREACHED]) * len(terrain)
+        if self.target is None or terrain[self.target] != OPEN:
+            return
+        distances[self.target] = 0
+        queue = deque([self.target])
+        while queue:
+            cell = queue.popleft()
+            next_distance = distances[cell] + 1
+            for neighbor in (cell - width, cell + width, cell - 1, cell + 1):
+                if terrain[neighbor] == OPEN and distances[neighbor] == UNREACHED:
+                    distances[neighbor] = next_distance
+                    queue.append(neighbor)
+
+    def remove_wall(self, position):
+        """
+        :param position: Position [y, x] of a cell that was a wall and is open now.
+        :return: None
+        """
+        terrain = self.terrain
+        width = self.width
+        cell = position[0] * width + position[1]
+        if terrain[cell] != BLOCKED:
+            return
+        terrain[cell] = OPEN
+        node = self.nodes[cell] = self.new_node()
+        neighbors = [neighbor for neighbor in (cell - width, cell + width, cell - 1, cell + 1)
+                     if terrain[neighbor] == OPEN]
+        for neighbor in neighbors:
+            self.union(node, self.nodes[neighbor])
+
+        distances = self.distances
+        if distances is None:
+            return
+        if cell == self.target:
+            distances[cell] = 0
+        else:
+            distances[cell] = min([distances[neighbor] + 1 for neighbor in neighbors], default=UNREACHED)
+            if distances[cell] > UNREACHED:
+                distances[cell] = UNREACHED
+        if distances[cell] == UNREACHED:
+            return
+        # The opened cell can only have brought cells closer
+        queue = deque([cell])
+        while queue:
+            cell = queue.popleft()
+            next_distance = distances[cell] + 1
+            for neighbor in (cell - width, cell + width, cell - 1, cell + 1):
+                if terrain[neighbor] == OPEN and distances[neighbor] > next_distance:
+                    distances[neighbor] = next_distance
+                    queue.append(neighbor)
+
+    def add_wall(self, position):
+        """
+        :param position: Position [y, x] of a cell that was open and is a wall now.
+        :return: None
+        """
+        terrain = self.terrain
+        width = self.width
+        cell = position[0] * width + position[1]
+        if terrain[cell] != OPEN:
+            return
+        terrain[cell] = BLOCKED
+        self.nodes[cell] = -1
+        neighbors = [neighbor for neighbor in (cell - width, cell + width, cell - 1, cell + 1)
+                     if terrain[neighbor] == OPEN]
+        if len(neighbors) > 1:  # A wall next to a single open cell cannot cut anything off
+            self.split(neighbors)
+        if self.distances is not None:
+            self.lengthen(cell, neighbors)
+        if len(self.parent) > len(terrain):
+            self.relabel()
+
+    def split(self, starts):
+        """
+        Finds the parts of an area a new wall cut off, by flooding from all of its open neighbours in turn until
+        only one flood is still running, and moves every part whose flood ran out to a new node.
+
+        :param starts: The open cells next to the new wall.
+        :return: None
+        """
+        terrain = self.terrain
+        width = self.width
+        merged = list(range(len(starts)))  # Floods that met point to the flood they continue in
+
+        def flood_of(cell):
+            flood = owner[cell]
+            while merged[flood] != flood:
+                flood = merged[flood]
+            return flood
+
+        owner = {cell: flood for flood, cell in enumerate(starts)}
+        queues = [deque([cell]) for cell in starts]
+        reached = [[cell] for cell in starts]
+        running = list(range(len(starts)))
+        while len(running) > 1:
+            for flood in running:
+                if merged[flood] != flood:
+                    continue
+                queue = queues[flood]
+                if not queue:
+                    # Ran out before meeting the others, this part is cut off
+                    node = self.new_node()
+                    for cell in reached[flood]:
+                        self.nodes[cell] = node
+                    merged[flood] = -1
+                    continue
+                cell = queue.popleft()
+                for neighbor in (cell - width, cell + width, cell - 1, cell + 1):
+                    if terrain[neighbor] != OPEN:
+                        continue
+                    if neighbor not in owner:
+                        owner[neighbor] = flood
+                        reached[flood].append(neighbor)
+                        queue.append(neighbor)
+                        continue
+                    other = flood_of(neighbor)
+                    if other != flood:
+                        merged[other] = flood
+                        queue.extend(queues[other])
+                        reached[flood].extend(reached[other])
+            running = [flood for flood in running if merged[flood] == flood]
+
+    def lengthen(self, wall, neighbors):
+        """
+        Updates the distances after a wall was added. Cells whose every shortest path went through it are found in
+        order of distance, then reflooded from the unaffected cells around them.
+
+        :param wall: Index of the new wall.
+        :param neighbors: The open cells next to it.
+        :return: None
+        """
+        terrain = self.terrain
+        width = self.width
+        distances = self.distances
+        wall_distance = distances[wall]
+        distances[wall] = UNREACHED
+        if wall_distance == UNREACHED:
+            return
+
+        affected = set()
+        queue = deque(neighbor for neighbor in neighbors if distances[neighbor] == wall_distance + 1)
+        while queue:
+            cell = queue.popleft()
+            if cell in affected:
+                continue
+            distance = distances[cell]
+            around = (cell - width, cell + width, cell - 1, cell + 1)
+            if any(terrain[neighbor] == OPEN and distances[neighbor] == distance - 1 and neighbor not in affected
+                   for neighbor in around):
+                continue  # Still as close through another neighbour
+            affected.add(cell)
+            for neighbor in around:
+                if terrain[neighbor] == OPEN and distances[neighbor] == distance + 1:
+                    queue.append(neighbor)
+
+        heap = []
+        for cell in affected:
+            distances[cell] = UNREACHED
+        for cell in affected:
+            best = min([distances[neighbor] for neighbor in (cell - width, cell + width, cell - 1, cell + 1)
+                        if terrain[neighbor] == OPEN and neighbor not in affected], default=UNREACHED)
+            if best != UNREACHED:
+                distances[cell] = best + 1
+                heap.append((best + 1, cell))
+        heapq.heapify(heap)
+        while heap:
+            distance, cell = heapq.heappop(heap)
+            if distance > distances[cell]:
+                continue
+            for neighbor in (cell - width, cell + width, cell - 1, cell + 1):
+                if terrain[neighbor] == OPEN and distances[neighbor] > distance + 1:
+                    distances[neighbor] = distance + 1
+                    heapq.heappush(heap, (distance + 1, neighbor))
+
+    def connect(self, start, end):
+        """
+        Makes sure end can be reached from start, opening the smallest set of walls joining them if they are in
+        different areas. The opened walls are applied here; the caller removes them from its grid.
+
+        :param start: Start position as a list [y, x].
+        :param end: End position as a list [y, x].
+        :return: List of [y, x] wall positions that were opened, empty if the two were already connected.
+        """
+        if self.connected(start, end):
+            return []
+        width = self.width
+        walls = walls_to_open(self.terrain, width, start[0] * width + start[1], end[0] * width + end[1]) or []
+        positions = [[cell // width, cell % width] for cell in walls]
+        for position in positions:
+            self.remove_wall(position)
+        return positions
@@ -1,4 +1,6 @@
 import pygame
+from collections import OrderedDict
+from profiler import profiler
 
 # Define colors
 WHITE = (255, 255, 255)
@@ -11,8 +13,72 @@ MOSS_GREEN = (34, 139, 34)  # Moss color for cobblestones
 GOLD = (255, 215, 0)  # Color for chests
 PORTAL_COLOR = (100, 100, 255)  # Portal color
 
+# Fonts loaded so far, by size
+fonts = {}
+
+
+def get_font(size):
+    """
+    :param size: Point size of the default pygame font.
+    :return: The pygame.font.Font for that size, loaded on first use and reused afterward.
+    """
+    font = fonts.get(size)
+    if font is None:
+        font = fonts[size] = pygame.font.Font(None, size)
+    return font
+
+
+class TextCache:
+    """
+        Class TextCache:
+            Least recently used cache of rendered text surfaces, keyed by (text, size, color).
+            Keeps at most max_entries surfaces and at most max_bytes of pixel data; the oldest surfaces are evicted first.
+    """
+    def __init__(self, max_entries=256, max_bytes=4 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.surfaces = OrderedDict()
+        self.size_in_bytes = 0
+
+    def render(self, text, size, color):
+        """
+        :param text: The text to render.
+        :param size: Font size.
+        :param color: Text color as an RGB tuple.
+        :return: Anti-aliased text surface, rendered only if it is not already cached.
+        """
+        key = (text, size, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        surface = get_font(size).render(text, True, color)
+        self.surfaces[key] = surface
+        self.size_in_bytes += surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+        # Evict the least recently used surfaces, but always keep the one just rendered
+        while len(self.surfaces) > 1 and (len(self.surfaces) > self.max_entries or self.size_in_bytes > self.max_bytes):
+            _, evicted = self.surfaces.popitem(last=False)
+            self.size_in_bytes -= evicted.get_width() * evicted.get_height() * evicted.get_bytesize()
+        return surface
+
+    def clear(self):
+        """
+        Drops every cached surface.
+
+        :return: None
+        """
+        self.surfaces.clear()
+        self.size_in_bytes = 0
+
+
+# Text surfaces shared by the inventory and stats panels
+text_cache = TextCache()
+
 
 # Function to draw the player's character
+@profiler.timed("draw_adventurer")
 def draw_adventurer(screen, x, y, sprite):
     """
     :param screen: The surface to draw the sprite on.
@@ -24,6 +90,7 @@ def draw_adventurer(screen, x, y, sprite):
     screen.blit(sprite, (x, y))
 
 
+@profiler.timed("draw_enemy")
 def draw_enemy(screen, x, y, sprite):
     """
     :param screen: The surface on which the sprite will be drawn.
@@ -35,6 +102,7 @@ def draw_enemy(screen, x, y, sprite):
     screen.blit(sprite, (x, y))
 
 # Function to draw obstacles (cobblestones with moss)
+@profiler.timed("draw_obstacle")
 def draw_obstacle(screen, x, y, sprite):
     """
     :param screen: The display surface to which the obstacle sprite will be rendered.
@@ -46,6 +114,7 @@ def draw_obstacle(screen, x, y, sprite):
     screen.blit(sprite, (x, y))
 
 # Function to draw chests
+@profiler.timed("draw_chest")
 def draw_chest(screen, x, y, sprite):
     """
     :param screen: The Surface object representing the game screen where the sprite will be drawn.
@@ -57,10 +126,11 @@ def draw_chest(screen, x, y, sprite):
     screen.blit(sprite, (x,y))
 
 # Function to draw the inventory
+@profiler.timed("draw_inventory")
 def draw_inventory(screen, inventory, selected_item_index):
     """
     :param screen: The Pygame display surface where the inventory will be drawn.
-    :param inventory: A list of items where each item is a dictionary containing details like 'name' and 'description'.
+    :param inventory: A list of game.Item records, showing their name and description.
     :param selected_item_index: Index of the currently selected item in the inventory.
     :return: None
     """
@@ -72,22 +142,23 @@ def draw_inventory(screen, inventory, selected_item_index):
     # Draw each item in the inventory
     for index, item in enumerate(inventory):
         color = YELLOW if index == selected_item_index else WHITE
-        item_name = item["name"]
-        text_surface = pygame.font.Font(None, 24).render(item_name, True, color)
+        item_name = item.name
+        text_surface = text_cache.render(item_name, 24, color)
         screen.blit(text_surface, (40, 40 + index * 30))
 
     # Display details of the selected item
     if inventory:
         selected_item = inventory[selected_item_index]
-        details = f"Name: {selected_item['name']}"
-        details_surface = pygame.font.Font(None, 24).render(details, True, WHITE)
+        details = f"Name: {selected_item.name}"
+        details_surface = text_cache.render(details, 24, WHITE)
         screen.blit(details_surface, (40, 250))
-        description = selected_item["description"]
-        description_surface = pygame.font.Font(None, 20).render(description, True, WHITE)
+        description = selected_item.description
+        description_surface = text_cache.render(description, 20, WHITE)
         screen.blit(description_surface, (40, 280))
 
 
 # Function to draw the player's stats on the right side of the screen
+@profiler.timed("draw_stats")
 def draw_stats(screen, player_stats, level):
     """
     :param screen: The surface on which the stats panel will be drawn.
@@ -114,17 +185,20 @@ def draw_stats(screen, player_stats, level):
 
     # Render each line of the stat text
     for i, text in enumerate(stats_text):
-        text_surface = pygame.font.Font(None, 24).render(text, True, WHITE)
+        text_surface = text_cache.render(text, 24, WHITE)
         screen.blit(text_surface, (stats_panel_x + 10, stats_panel_y + 20 + i * 30))
 
 
 def perform_attack_animation(screen, player_position, player_direction, cell_size):
     """
+    Draws one frame of the sword swing line. It no longer flips the display or waits; schedule it with an
+    animations.Animator to keep it on screen for a while.
+
     :param screen: The display surface on which animations are drawn.
     :param player_position: Tuple representing the player's current position (row, column) on the grid.
     :param player_direction: String indicating the direction the player is facing; can be "up", "down", "left", or "right".
     :param cell_size: The size of each cell in the grid (width and height in pixels).
-    :return: None
+    :return: The rect covered by the swing.
     """
     # Calculate the center of the player's current position
     x = player_position[1] * cell_size + cell_size // 2
@@ -144,20 +218,44 @@ def perform_attack_animation(screen, player_position, player_direction, cell_siz
         end_pos = start_pos
 
     # Draw the attack line in yellow to represent a sword swing
-    pygame.draw.line(screen, YELLOW, start_pos, end_pos, 3)
+    return pygame.draw.line(screen, YELLOW, start_pos, end_pos, 3)
+
+
+def attack_circle_center(player_position, player_direction, cell_size):
+    """
+    :param player_position: The player's position as a list [y, x].
+    :param player_direction: The direction the player is facing.
+    :param cell_size: The size of each cell in the grid.
+    :return: Screen coordinates of the center of the attack circles, just past the edge of the player's cell.
+    """
+    x = player_position[1] * cell_size
+    y = player_position[0] * cell_size
+    if player_direction == "up":
+        return x + cell_size // 2, y - cell_size // 4
+    elif player_direction == "down":
+        return x + cell_size // 2, y + cell_size + cell_size // 4
+    elif player_direction == "left":
+        return x - cell_size // 4, y + cell_size // 2
+    return x + cell_size + cell_size // 4, y + cell_size // 2
 
-    # Update the display to show the attack animation
-    pygame.display.flip()
 
-    # Pause briefly to display the animation
-    pygame.time.delay(100)
+@profiler.timed("draw_attack_circles")
+def draw_attack_circles(screen, center, progress):
+    """
+    Draws the expanding circles of the player's attack as they look at the given point of the animation.
 
-    # Redraw the cell to remove the attack line (for a simple animation effect)
-    pygame.draw.rect(screen, BLACK, (player_position[1] * cell_size, player_position[0] * cell_size, cell_size,
-                                     cell_size))
-    pygame.display.flip()
+    :param screen: The surface to draw on.
+    :param center: Center of the circles, see attack_circle_center.
+    :param progress: How far the animation has played, from 0 to 1.
+    :return: None
+    """
+    radii = range(5, 15, 3)  # Vary the size for an expanding circle
+    shown = min(len(radii), int(progress * len(radii)) + 1)
+    for radius in radii[:shown]:
+        pygame.draw.circle(screen, YELLOW, center, radius, 1)
 
 
+@profiler.timed("draw_portal")
 def draw_portal(screen, x, y, cell_size):
     """
     :param screen: The surface to draw the portal on.
@@ -172,3 +270,38 @@ def draw_portal(screen, x, y, cell_size):
     pygame.draw.circle(screen, (0, 0, 128), (x + cell_size // 2, y + cell_size // 2), cell_size // 4, 2)
     # Add a small center glow for effect
     pygame.draw.circle(screen, (173, 216, 230), (x + cell_size // 2, y + cell_size // 2), cell_size // 8)
+
+
+# Area of the profiler overlay, below the stats panel
+PROFILER_RECT_TOP = 240
+PROFILER_RECT_HEIGHT = 340
+
+
+def profiler_overlay_rect(screen):
+    """
+    :param screen: The surface the overlay is drawn on.
+    :return: The rect covered by draw_profiler_overlay.
+    """
+    return pygame.Rect(screen.get_width() - 180, PROFILER_RECT_TOP, 160, PROFILER_RECT_HEIGHT)
+
+
+def draw_profiler_overlay(screen, profiler):
+    """
+    Draws p50/p95/p99 of the slowest profiled sections, in milliseconds, below the stats panel.
+
+    :param screen: The surface on which the overlay will be drawn.
+    :param profiler: The profiler.Profiler to show.
+    :return: The rect that was drawn.
+    """
+    rect = profiler_overlay_rect(screen)
+    pygame.draw.rect(screen, BLACK, rect)
+    pygame.draw.rect(screen, WHITE, rect, 2)
+    screen.blit(text_cache.render("ms   p50 / p95 / p99", 18, YELLOW), (rect.x + 10, rect.y + 10))
+
+    sections = sorted(profiler.samples, key=lambda name: profiler.percentiles(name, (95,))[0], reverse=True)
+    for index, name in enumerate(sections[:8]):
+        p50, p95, p99 = profiler.percentiles(name)
+        y = rect.y + 34 + index * 38
+        screen.blit(text_cache.render(name, 18, WHITE), (rect.x + 10, y))
+        screen.blit(text_cache.render(f"{p50:.2f} / {p95:.2f} / {p99:.2f}", 18, WHITE), (rect.x + 20, y + 16))
+    return rect
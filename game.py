@@ -0,0 +1,520 @@
+import random
+from array import array
+from collections import deque, namedtuple
+from connectivity import OPEN
+from levels import LevelPipeline, generate_level
+from maze import default_algorithm
+from occupancy import OccupancyGrid, WALL, ENEMY, CHEST, PORTAL, BOSS, CELL_TYPECODE
+from pathfinding import DistanceField, preferred_steps, UNREACHED
+from profiler import profiler
+from visibility import Visibility
+
+# An item found in chests. Items are immutable and only exist once, in item_pool: the inventory holds references to
+# them, and item_pool[item.id] is the item itself
+Item = namedtuple("Item", ["id", "name", "description", "attack_bonus", "defense_bonus", "healing"],
+                  defaults=(0, 0, 0))
+
+# Define items in chests
+item_pool = (
+    Item(0, "Iron Sword", "A sturdy sword with a sharp edge.", attack_bonus=2),
+    Item(1, "Healing Potion", "Restores 20 health.", healing=20),
+    Item(2, "Steel Shield", "A strong shield for defense.", defense_bonus=3)
+)
+
+# Enemy stats
+enemy_stats = {
+    "health": 30,
+    "attack": 3
+}
+
+# Every action step() accepts; replay logs store an action as its index in this tuple
+ACTIONS = ("up", "down", "left", "right", "attack", "equip", "inventory", "wait")
+
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+# Row/column offsets for each facing direction
+DIRECTIONS = {
+    "up": (-1, 0),
+    "down": (1, 0),
+    "left": (0, -1),
+    "right": (0, 1)
+}
+
+
+class Boss:
+    """
+        Class Boss:
+            Represents a boss enemy with higher health and attack than regular enemies.
+
+            Methods
+            -------
+            __init__(self, position)
+                Initializes the Boss with a specified position.
+
+            Move_towards(self, target_position, map_size, field=None, rng=random)
+                Moves the boss towards the player at a slower pace.
+
+            Attack_player(self, player_position, player_stats)
+                Attacks the player if the player is adjacent.
+    """
+    __slots__ = ("position", "health", "attack", "movement_speed")
+
+    def __init__(self, position):
+        self.position = position
+        self.health = 100  # Higher health than regular enemies
+        self.attack = 8  # Stronger attack than regular enemies
+        self.movement_speed = 0.5  # Moves slower than regular enemies
+
+    def move_towards(self, target_position, map_size, field=None, rng=random):
+        """
+        Moves the boss towards the player at a slower pace.
+
+        :param target_position: The player's position as a list [y, x].
+        :param map_size: Width and height of the playable area.
+        :param field: Optional DistanceField to the player; when given, the boss walks around walls instead of
+            stepping straight at the player.
+        :param rng: Random number generator deciding whether the boss moves this turn.
+        :return: None
+        """
+        if field is not None and field.distance(self.position) is not None:
+            # Move every other turn for slower movement
+            if rng.random() < self.movement_speed:
+                new_pos = field.step_towards(self.position, preferred_steps(self.position, target_position),
+                                             lambda position: position != target_position)
+                if new_pos:
+                    self.position = new_pos
+            return
+
+        diff_x = target_position[1] - self.position[1]
+        diff_y = target_position[0] - self.position[0]
+
+        move_x = 0
+        move_y = 0
+
+        if abs(diff_x) > abs(diff_y):
+            move_x = 1 if diff_x > 0 else -1
+        else:
+            move_y = 1 if diff_y > 0 else -1
+
+        # Move every other turn for slower movement
+        if rng.random() < self.movement_speed:
+            new_pos = [self.position[0] + move_y, self.position[1] + move_x]
+            if 1 <= new_pos[0] <= map_size and 1 <= new_pos[1] <= map_size and new_pos != target_position:
+                self.position = new_pos
+
+    def attack_player(self, player_position, player_stats):
+        """
+        Attacks the player if adjacent.
+
+        :param player_position: The player's position as a list [y, x].
+        :param player_stats: Dictionary containing the player's stats; health is reduced on a hit.
+        :return: True if the player was hit, False otherwise.
+        """
+        diff_x = abs(player_position[1] - self.position[1])
+        diff_y = abs(player_position[0] - self.position[0])
+
+        if diff_x + diff_y == 1:  # Adjacent to the player
+            player_stats["health"] -= self.attack
+            return True
+        return False
+
+
+# Function to check if a path exists using BFS
+def is_path_available(start, end, grid):
+    """
+    :param start: Starting point of the pathfinding as a list [y, x].
+    :param end: End point of the pathfinding as a list [y, x].
+    :param grid: OccupancyGrid of the map; cells flagged as WALL are obstacles.
+    :return: Boolean value indicating whether a path exists from start to end without hitting obstacles.
+    """
+    map_size = grid.map_size
+    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # Up, down, left, right
+    queue = deque([start])
+    visited = set()
+    visited.add(tuple(start))
+
+    while queue:
+        current = queue.popleft()
+        if current == end:
+            return True
+
+        for dy, dx in directions:
+            neighbor = [current[0] + dy, current[1] + dx]
+            if (1 <= neighbor[0] <= map_size and 1 <= neighbor[1] <= map_size and
+                    tuple(neighbor) not in visited and not grid.has(WALL, neighbor)):
+                queue.append(neighbor)
+                visited.add(tuple(neighbor))
+
+    return False
+
+
+class DungeonGame:
+    """
+        Class DungeonGame:
+            Holds the complete state of one dungeon run and applies the game rules to it.
+            It has no dependency on pygame, so it can be stepped without a display.
+
+            Methods
+            -------
+            __init__(self, map_size=10, maze_algorithm=None, batched_enemies=False, seed=None, generate_map=True,
+                     levels_ahead=0, level_cache_dir=None, fov_radius=None, activity_radius=None)
+                Creates a new run at level 1 and generates the first map. Runs with the same seed and actions
+                play out exactly the same. With levels_ahead, the next levels are generated in the background.
+                fov_radius turns on fog of war and activity_radius limits which goblins move.
+
+            Step(self, action)
+                Applies one player action, the same way a key press does in the main loop.
+
+            Generate_new_map(self)
+                Builds the map for the current level.
+
+            Move_player(self, direction), attack(self), enemy_turn(self), open_chest(self, position),
+            advance_level(self), toggle_inventory(self), equip_item(self, item)
+                The individual game rules.
+    """
+    def __init__(self, map_size=10, maze_algorithm=None, batched_enemies=False, seed=None, generate_map=True,
+                 levels_ahead=0, level_cache_dir=None, fov_radius=None, activity_radius=None):
+        self.map_size = map_size
+        # Every random decision of the run comes from this stream, so the seed and the actions reproduce it
+        self.seed = random.randrange(2 ** 63) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.actions = bytearray()  # Index in ACTIONS of every action taken, see replay.py
+        # Name of one of maze.ALGORITHMS, maze.default_algorithm(map_size) if None
+        self.maze_algorithm = maze_algorithm or default_algorithm(map_size)
+        self.batched_enemies = batched_enemies  # Move enemies with NumPy (see horde.py), for very large hordes
+        # Generates the next levels ahead of time and/or caches them on disk, see levels.py
+        self.levels = None
+        if levels_ahead or level_cache_dir:
+            self.levels = LevelPipeline(self.seed, map_size, self.maze_algorithm, levels_ahead, level_cache_dir)
+
+        # Player stats
+        self.player_stats = {
+            "health": 100,
+            "attack": 5,
+            "defense": 1
+        }
+        self.damage_taken = 0  # Total damage suffered during the run
+        self.last_attacker = None  # "goblin" or "boss", whoever hit the player last
+
+        # Level counter
+        self.level = 1
+        self.player_position = [1, 1]
+        self.player_direction = "down"
+
+        # Inventory properties
+        self.inventory = []
+        self.selected_item_index = 0
+        self.inventory_open = False
+
+        self.current_message = ""
+        self.message_timer = 0  # Timer to track how long the message should display
+
+        # Game entities
+        self.portal_position = []
+        self.obstacles = []
+        self.enemies = array(CELL_TYPECODE)  # Flat cell indices (see OccupancyGrid.index), in turn order
+        self.chests = []
+        self.boss = None
+        self.grid = OccupancyGrid(map_size)
+        self.map_version = 0  # Increased every time a new map is generated
+        self.distance_field = DistanceField()  # Shared by every enemy and the boss
+        # Open areas of the map and distances to the portal, kept up to date as walls change (see connectivity.py)
+        self.reachability = None
+        # Field of view and fog of war (see visibility.py), None shows the whole map
+        self.visibility = Visibility(fov_radius) if fov_radius else None
+        # Only goblins within this Manhattan distance of the player take turns (walls are not walked around),
+        # None moves all of them
+        self.activity_radius = activity_radius
+
+        self.running = True
+        if generate_map:  # Only skipped when the state is about to be restored, see snapshot.py
+            self.generate_new_map()
+
+    def set_message(self, message, duration=60):
+        """
+        :param message: Text to show to the player.
+        :param duration: How many frames the message should be displayed for.
+        :return: None
+        """
+        self.current_message = message
+        self.message_timer = duration
+
+    def step(self, action):
+        """
+        Applies a single player action. While the inventory is open, "up" and "down" move the selection,
+        "equip" uses the selected item and "inventory" closes it. Otherwise the directions move the player,
+        "attack" swings in the facing direction, "inventory" opens it and "wait" lets the enemies take a turn
+        while the player stands still (used by real-time play).
+
+        :param action: One of "up", "down", "left", "right", "attack", "equip", "inventory" or "wait".
+        :return: True while the game is still running, False once the player has been defeated.
+        """
+        if not self.running or action not in ACTION_CODES:
+            return self.running
+        self.actions.append(ACTION_CODES[action])
+
+        if self.inventory_open:
+            if action == "up":
+                self.selected_item_index = max(0, self.selected_item_index - 1)
+            elif action == "down":
+                self.selected_item_index = min(len(self.inventory) - 1, self.selected_item_index + 1)
+            elif action == "equip" and self.inventory:
+                self.equip_item(self.inventory[self.selected_item_index])
+            elif action == "inventory":
+                self.toggle_inventory()
+        else:
+            if action in DIRECTIONS:
+                self.move_player(action)
+            elif action == "attack":
+                self.attack()
+            elif action == "inventory":
+                self.toggle_inventory()
+            elif action == "wait":
+                self.enemy_turn()
+        self.update_visibility()
+
+        # Check if the player's health is zero or below
+        if self.player_stats["health"] <= 0:
+            self.set_message("You have been defeated!", 120)
+            self.running = False
+
+        return self.running
+
+    @profiler.timed("generate_new_map")
+    def generate_new_map(self):
+        """
+        Generate a new map for the game, including player position, enemies, obstacles, chests, portal, and a boss if applicable.
+
+        The map only depends on the seed and the level number (see levels.py). With a level pipeline it was usually
+        generated in the background already, and this just swaps it in.
+
+        :return: None
+        """
+        if self.levels is not None:
+            level = self.levels.take(self.level, self.portal_position)
+        else:
+            level = generate_level(self.seed, self.level, self.map_size, self.maze_algorithm, self.portal_position)
+
+        self.map_version += 1
+        self.player_position = level.player_position  # Reset player position to the starting point
+        self.obstacles = level.obstacles
+        self.enemies = level.enemies
+        self.chests = level.chests
+        if level.portal_position is not None:  # The boss room keeps the portal of the level before
+            self.portal_position = level.portal_position
+        self.boss = Boss(level.boss_position) if level.boss_position else None
+        self.grid = level.grid
+        self.distance_field = level.distance_field
+        self.distance_field.map_version = self.map_version
+        self.reachability = level.reachability
+        self.update_visibility()
+
+    def update_visibility(self):
+        """
+        Recomputes the field of view if fog of war is on and the player moved or the map changed.
+
+        :return: None
+        """
+        if self.visibility is not None:
+            self.visibility.update(self.grid, self.player_position, self.map_version)
+
+    def move_player(self, direction):
+        """
+        :param direction: The direction in which the player should move. Accepted values are "up", "down", "left", and "right".
+        :return: None. The method updates the player's position and triggers relevant game mechanics such as enemy turns, chest interactions, and level advancement.
+        """
+        self.player_direction = direction
+        dy, dx = DIRECTIONS[direction]
+        new_position = [self.player_position[0] + dy, self.player_position[1] + dx]
+
+        # Positions just outside the map land on the border, which the grid also covers
+        cell = self.grid.at(new_position)
+
+        # Check if the new position is valid for movement
+        if ((1 <= new_position[0] <= self.map_size and 1 <= new_position[1] <= self.map_size) and
+                not cell & (ENEMY | WALL | BOSS)):
+            self.player_position = new_position
+            self.enemy_turn()  # Trigger enemy turn only if the player actually moved
+
+        # Check for interaction with chests if the player moves into a chest's position
+        if cell & CHEST:
+            self.open_chest(new_position)
+
+        # Check for interaction with the portal
+        if cell & PORTAL:
+            self.advance_level()
+
+    # Method to open a chest and add item to inventory
+    def open_chest(self, position):
+        """
+        :param position: The coordinates of the chest that the player has interacted with.
+        :return: Returns nothing.
+        """
+        self.chests.remove(position)
+        self.grid.remove(CHEST, position)
+        item = self.rng.choice(item_pool)
+        self.inventory.append(item)
+        self.set_message(f"You picked up {item.name}!")
+
+    def attack_position(self):
+        """
+        :return: The cell in front of the player, based on the direction the player is facing.
+        """
+        dy, dx = DIRECTIONS[self.player_direction]
+        return [self.player_position[0] + dy, self.player_position[1] + dx]
+
+    def attack(self):
+        """
+        Performs the player's attack action. Removes an enemy if one is hit, damages the boss if it is hit,
+        and triggers the enemy's turn. Drawing the swing is left to the renderer.
+
+        :return: None
+        """
+        attack_position = self.attack_position()
+
+        # Remove the enemy if one is at the attack position
+        if self.grid.has(ENEMY, attack_position):
+            self.enemies.remove(self.grid.index(attack_position))
+            self.grid.remove(ENEMY, attack_position)
+            self.set_message("You defeated an enemy!")
+
+        # Attack the boss if it is at the attack position
+        if self.boss and attack_position == self.boss.position:
+            self.boss.health -= self.player_stats["attack"]
+            self.set_message(f"You hit the boss for {self.player_stats['attack']} damage!")
+
+            # Check if the boss is defeated
+            if self.boss.health <= 0:
+                self.set_message("You defeated the boss!", 120)
+                self.grid.remove(BOSS, self.boss.position)
+                self.boss = None  # Remove the boss after it's defeated
+                self.advance_level()  # Advance the level when the boss is defeated
+
+        # Trigger enemy turn after the player attacks
+        self.enemy_turn()
+
+    @profiler.timed("enemy_turn")
+    def enemy_turn(self):
+        """
+        Performs the enemy's turn in the game. This involves moving each enemy towards the player's position and updating the player's health if any enemy is adjacent to the player. The method also processes the boss's actions if a boss exists.
+
+        Enemies follow the shared distance field to the player, so they walk around walls. An enemy that cannot
+        reach the player at all falls back to stepping straight at them. With batched_enemies the same rules are
+        applied to all enemies at once with NumPy. With an activity_radius, goblins further away from the player
+        stay where they are.
+
+        :return: None
+        """
+        player_position = self.player_position
+        grid = self.grid
+        field = None
+        if self.enemies or self.boss:
+            field = self.distance_field.update(grid, player_position, self.map_version)
+        hits = 0
+        if self.batched_enemies and self.enemies:
+            # NumPy is only needed for horde levels, so it is imported on first use
+            from horde import move_enemies
+            hits = move_enemies(grid, field, self.enemies, player_position, self.activity_radius)
+        elif self.enemies:
+            # Every goblin next to the player before moving gets a hit in, found through the spatial hash
+            enemy_counts = grid.counts[ENEMY]
+            hits = sum(enemy_counts[cell] for cell in grid.near(ENEMY, player_position, 1))
+
+            # Goblins are kept as flat cell indices and moved in place, looking steps up in the field's arrays
+            width = grid.width
+            player_cell = player_position[0] * width + player_position[1]
+            terrain = field.terrain
+            raw = field.raw
+            enemies = self.enemies
+            claimed = set()  # Cells taken by enemies that already moved this turn
+
+            active = None
+            if self.activity_radius is not None:
+                active = {row * width + col for row, col in grid.near(ENEMY, player_position, self.activity_radius)}
+
+            for index, cell in enumerate(enemies):
+                if active is None or cell in active:
+                    row, col = divmod(cell, width)
+                    diff_x = player_position[1] - col
+                    diff_y = player_position[0] - row
+                    step_x = 1 if diff_x > 0 else -1
+                    step_y = width if diff_y > 0 else -width
+                    if abs(diff_x) > abs(diff_y):
+                        first, second = step_x, step_y
+                    else:
+                        first, second = step_y, step_x
+
+                    new_cell = None
+                    if raw[cell] < UNREACHED // 2:
+                        # The free neighbour closest to the player, ties go to the steps in preferred_steps order
+                        best = raw[cell]
+                        for step in (first, second, -second, -first):
+                            neighbor = cell + step
+                            if (terrain[neighbor] == OPEN and raw[neighbor] < best and neighbor not in claimed and
+                                    neighbor != player_cell):
+                                new_cell = neighbor
+                                best = raw[neighbor]
+                    else:
+                        # Cut off from the player, so just step straight at them
+                        neighbor = cell + first
+                        if terrain[neighbor] == OPEN and neighbor not in claimed and neighbor != player_cell:
+                            new_cell = neighbor
+
+                    if new_cell is not None:
+                        grid.move(ENEMY, (row, col), divmod(new_cell, width))
+                        enemies[index] = new_cell
+                        cell = new_cell
+                claimed.add(cell)
+
+        if hits:
+            damage = enemy_stats["attack"]
+            self.player_stats["health"] -= damage * hits
+            self.damage_taken += damage * hits
+            self.last_attacker = "goblin"
+            self.set_message(f"You suffered {damage} damage!")
+
+        # Handle boss turn if it exists
+        if self.boss:
+            old_position = self.boss.position
+            self.boss.move_towards(player_position, self.map_size, field, self.rng)
+            grid.move(BOSS, old_position, self.boss.position)
+            if self.boss.attack_player(player_position, self.player_stats):
+                self.damage_taken += self.boss.attack
+                self.last_attacker = "boss"
+                self.set_message(f"The boss hits you for {self.boss.attack} damage!")
+
+    # Method to advance to the next level
+    def advance_level(self):
+        """
+        Increases the current level by one and generates a new map for the advanced level.
+
+        :return: None
+        """
+        self.level += 1
+        self.generate_new_map()
+
+    # Method to toggle the inventory display
+    def toggle_inventory(self):
+        """
+        Toggles the state of the inventory. If the inventory is currently open, it will be closed,
+        and if it is currently closed, it will be opened.
+
+        :return: None
+        """
+        self.inventory_open = not self.inventory_open
+
+    # Method to equip an item
+    def equip_item(self, item):
+        """
+        :param item: The Item to equip. Its attack_bonus, defense_bonus or healing is applied.
+        :return: None
+        """
+        if item.attack_bonus:
+            self.player_stats["attack"] += item.attack_bonus
+        elif item.defense_bonus:
+            self.player_stats["defense"] += item.defense_bonus
+        elif item.healing:
+            self.player_stats["health"] = min(100, self.player_stats["health"] + item.healing)
+        self.inventory.remove(item)
+        # Keep the selection on an existing item, the list just got shorter
+        self.selected_item_index = max(0, min(self.selected_item_index, len(self.inventory) - 1))
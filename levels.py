@@ -0,0 +1,310 @@
+import os
+import random
+import struct
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from bitpack import pack_bits, unpack_bits, little_endian_bytes, little_endian_array
+from connectivity import Reachability
+from maze import default_algorithm, generate_maze, WALL as WALL_CELL, PATH as PATH_CELL
+from occupancy import OccupancyGrid, WALL, CELL_TYPECODE
+from pathfinding import DistanceField
+from profiler import profiler
+
+# Level on which the boss room is generated
+BOSS_LEVEL = 5
+
+# Chests placed on every normal level
+NUM_CHESTS = 3
+
+# Mazes carved for one level before giving up on a map too small or narrow for the player, chests and portal
+MAX_MAZE_ATTEMPTS = 100
+
+# Level file header: magic, format version, seed, map size, level, flags, portal y/x, boss y/x,
+# enemy and chest counts, length of the maze algorithm name
+LEVEL_HEADER = struct.Struct("<4sBQIIBIIIIIIB")
+LEVEL_MAGIC = b"DCLV"
+LEVEL_VERSION = 1
+
+# Level file flags
+HAS_PORTAL = 1
+HAS_BOSS = 2
+
+# Positions are stored as little-endian flat cell indices, in the same arrays the game keeps its goblins in
+_POSITIONS = CELL_TYPECODE
+
+
+class Level:
+    """
+        Class Level:
+            Everything DungeonGame needs to start a level, ready to be swapped in: the entities (goblins as an
+            array of flat cell indices), an OccupancyGrid already filled with them, a DistanceField already flooded
+            from the player's start and the Reachability of the map, measuring distances to the portal.
+
+            portal_position is None on the boss level, which keeps the portal of the level before it.
+    """
+    def __init__(self, number, obstacles, enemies, chests, portal_position, boss_position=None,
+                 player_position=(1, 1)):
+        self.number = number
+        self.obstacles = obstacles
+        self.enemies = enemies
+        self.chests = chests
+        self.portal_position = portal_position
+        self.boss_position = boss_position
+        self.player_position = list(player_position)
+        self.grid = None
+        self.distance_field = None
+        self.reachability = None
+
+    def build(self, map_size, previous_portal, grid=None, reachability=None):
+        """
+        Fills the grid, the distance field and the reachability of the level.
+
+        :param map_size: Width and height of the playable area.
+        :param previous_portal: Portal position of the level before, which stays on the map of the boss level.
+        :param grid: OccupancyGrid already holding the level's entities, if the caller has one.
+        :param reachability: Reachability of the grid towards the portal, if the caller has one.
+        :return: The level itself.
+        """
+        portal_position = self.portal_position if self.portal_position is not None else previous_portal
+        if grid is None:
+            grid = OccupancyGrid(map_size)
+            grid.rebuild(self.obstacles, self.enemies, self.chests, portal_position, self.boss_position)
+        self.grid = grid
+        self.distance_field = DistanceField().update(self.grid, self.player_position, None)
+        self.reachability = reachability or Reachability(grid, portal_position)
+        return self
+
+
+def level_rng(seed, number):
+    """
+    :param seed: Seed of the run.
+    :param number: Level number.
+    :return: The random number generator the map of that level is generated from. Levels only depend on the seed and
+        their number, not on what happened during the run, so they can be generated ahead of time.
+    """
+    return random.Random(f"{seed}:level:{number}")
+
+
+def generate_level(seed, number, map_size=10, maze_algorithm=None, previous_portal=None):
+    """
+    Generates the map of one level: the boss room on BOSS_LEVEL, otherwise a maze with 2 + level enemies,
+    NUM_CHESTS chests and a portal that can be reached from the player's start.
+
+    :param seed: Seed of the run.
+    :param number: Level number.
+    :param map_size: Width and height of the playable area.
+    :param maze_algorithm: Name of one of maze.ALGORITHMS, maze.default_algorithm(map_size) if None.
+    :param previous_portal: Portal position of the level before, only used by the boss room. Generated if not given.
+    :return: A built Level.
+    :raises ValueError: If the map is too small to hold the player, the chests and the portal.
+    """
+    rng = level_rng(seed, number)
+    maze_algorithm = maze_algorithm or default_algorithm(map_size)
+    player_position = [1, 1]  # Reset player position to the starting point
+    num_enemies = 2 + number  # Increase enemies with each level
+    num_chests = NUM_CHESTS
+
+    if number == BOSS_LEVEL:
+        # Boss room with no obstacles, just the player and the boss
+        if previous_portal is None:
+            previous_portal = generate_level(seed, number - 1, map_size, maze_algorithm).portal_position
+        boss_position = [map_size // 2, map_size // 2]  # Center of the map
+        return Level(number, [], array(_POSITIONS), [], None, boss_position).build(map_size, previous_portal)
+
+    # Normal room generation with enemies and chests
+    # Carve a maze over the whole map, laid out row by row with the border included (0 = wall, 1 = path)
+    # Carve again if the maze came out too small to hold the player, chests and portal
+    # (the random carve occasionally stops after a handful of cells)
+    width = map_size + 2
+    if map_size * map_size < num_chests + 3:
+        raise ValueError(f"A {map_size}x{map_size} map cannot hold the player, {num_chests} chests and the portal")
+    with profiler.section("generate_maze"):
+        maze = generate_maze(map_size, maze_algorithm, rng)
+        attempts = 1
+        while maze.count(PATH_CELL) < num_chests + 3:
+            if attempts == MAX_MAZE_ATTEMPTS:
+                raise ValueError(f"No {maze_algorithm} maze of size {map_size} has room for the player, "
+                                 f"{num_chests} chests and the portal")
+            maze = generate_maze(map_size, maze_algorithm, rng)
+            attempts += 1
+
+    # Convert the maze into obstacle positions (walls are 0)
+    obstacles = [[r, c] for r in range(1, map_size + 1) for c in range(1, map_size + 1)
+                 if maze[r * width + c] == WALL_CELL]
+
+    # Find open positions for enemies and chests
+    open_positions = [[r, c] for r in range(1, map_size + 1) for c in range(1, map_size + 1)
+                      if maze[r * width + c] == PATH_CELL]
+
+    # Place enemies and chests at random open positions
+    candidates = [pos for pos in open_positions if pos != player_position]
+    # Leave room for the chests and the portal when the maze is crowded
+    enemies = rng.sample(candidates, max(0, min(num_enemies, len(candidates) - num_chests - 1)))
+    taken = {tuple(pos) for pos in enemies}
+    enemies = array(_POSITIONS, [row * width + col for row, col in enemies])
+    candidates = [pos for pos in candidates if tuple(pos) not in taken]
+    chests = rng.sample(candidates, min(num_chests, len(candidates)))
+    taken.update(tuple(pos) for pos in chests)
+
+    # Place the portal at a random open position far from the player
+    portal_position = rng.choice([pos for pos in open_positions if tuple(pos) not in taken and pos != player_position])
+
+    # Ensure there's a path from the player to the portal by opening the fewest walls needed
+    grid = OccupancyGrid(map_size)
+    grid.rebuild(obstacles, enemies, chests, portal_position)
+    with profiler.section("connect"):
+        reachability = Reachability(grid, portal_position)
+        opened = reachability.connect(player_position, portal_position)
+    if opened:
+        for position in opened:
+            grid.remove(WALL, position)
+        opened = {tuple(position) for position in opened}
+        obstacles = [pos for pos in obstacles if tuple(pos) not in opened]
+    return Level(number, obstacles, enemies, chests, portal_position).build(map_size, None, grid, reachability)
+
+
+def level_bytes(level, seed, map_size, maze_algorithm):
+    """
+    :param level: The Level to store, before it was played.
+    :param seed: Seed of the run.
+    :param map_size: Width and height of the playable area.
+    :param maze_algorithm: Name of one of maze.ALGORITHMS.
+    :return: The level in its file format: header, maze algorithm name, wall bitmap and the enemy and chest positions.
+    """
+    width = map_size + 2
+    walls = bytearray(map_size * map_size)
+    for row, col in level.obstacles:
+        walls[(row - 1) * map_size + col - 1] = 1
+    flags = (HAS_PORTAL if level.portal_position is not None else 0) | (HAS_BOSS if level.boss_position else 0)
+    portal = level.portal_position or [0, 0]
+    boss = level.boss_position or [0, 0]
+    algorithm = maze_algorithm.encode()
+    header = LEVEL_HEADER.pack(LEVEL_MAGIC, LEVEL_VERSION, seed, map_size, level.number, flags, portal[0], portal[1],
+                               boss[0], boss[1], len(level.enemies), len(level.chests), len(algorithm))
+    enemies = level.enemies
+    chests = array(_POSITIONS, [row * width + col for row, col in level.chests])
+    return b"".join([header, algorithm, pack_bits(walls), little_endian_bytes(enemies), little_endian_bytes(chests)])
+
+
+def level_from_bytes(data, previous_portal):
+    """
+    :param data: A level in its file format.
+    :param previous_portal: Portal position of the level before, see Level.build.
+    :return: The built Level.
+    """
+    (magic, version, seed, map_size, number, flags, portal_y, portal_x, boss_y, boss_x, enemy_count, chest_count,
+     name_length) = LEVEL_HEADER.unpack_from(data)
+    if magic != LEVEL_MAGIC or version != LEVEL_VERSION:
+        raise ValueError("Not a Dungeon Crawler level (or an unsupported version)")
+    width = map_size + 2
+    offset = LEVEL_HEADER.size + name_length
+
+    bitmap_size = (map_size * map_size + 7) // 8
+    walls = unpack_bits(data[offset:offset + bitmap_size], map_size * map_size)
+    offset += bitmap_size
+    obstacles = [[index // map_size + 1, index % map_size + 1] for index, wall in enumerate(walls) if wall]
+
+    itemsize = array(_POSITIONS).itemsize
+    enemies = little_endian_array(_POSITIONS, data[offset:offset + enemy_count * itemsize])
+    offset += enemy_count * itemsize
+    chests = little_endian_array(_POSITIONS, data[offset:offset + chest_count * itemsize])
+    chests = [[cell // width, cell % width] for cell in chests]
+
+    portal_position = [portal_y, portal_x] if flags & HAS_PORTAL else None
+    boss_position = [boss_y, boss_x] if flags & HAS_BOSS else None
+    return Level(number, obstacles, enemies, chests, portal_position, boss_position).build(map_size, previous_portal)
+
+
+class LevelPipeline:
+    """
+        Class LevelPipeline:
+            Generates the next levels of a run ahead of time on a worker thread, so stepping through the portal swaps
+            in a finished Level instead of generating one on that frame. At most `ahead` levels wait in the queue.
+
+            A thread is used rather than a process so the finished grid and distance field can be handed over as they
+            are, without copying them between processes. The main loop sleeps most of every frame, which leaves the
+            worker plenty of time.
+
+            With a cache_dir, every generated level is also written to a level file keyed by seed, map size, maze
+            algorithm and level number, and later runs with the same seed load it instead of generating it again.
+
+            Methods
+            -------
+            Take(self, number, previous_portal)
+                Returns the level, waiting for the worker only if it is not finished yet, and queues the next ones.
+
+            Close(self)
+                Stops the worker, dropping levels that were not started.
+    """
+    def __init__(self, seed, map_size=10, maze_algorithm="prim", ahead=2, cache_dir=None):
+        self.seed = seed
+        self.map_size = map_size
+        self.maze_algorithm = maze_algorithm
+        self.ahead = ahead
+        self.cache_dir = cache_dir
+        self.pending = {}  # Level number -> Future of a Level
+        self.portals = {}  # Level number -> portal position, for the boss level
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="levels")
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def level_path(self, number):
+        """
+        :param number: Level number.
+        :return: Path of the level's file in the cache directory.
+        """
+        return os.path.join(self.cache_dir, f"{self.seed}_{self.map_size}_{self.maze_algorithm}_{number}.level")
+
+    def build(self, number, previous_portal=None):
+        """
+        Loads the level from the cache directory or generates it. Runs on the worker thread for queued levels.
+
+        :param number: Level number.
+        :param previous_portal: Portal position of the level before, if known.
+        :return: The built Level.
+        """
+        if previous_portal is None:
+            previous_portal = self.portals.get(number - 1)
+        if previous_portal is None and number == BOSS_LEVEL:
+            previous_portal = self.build(number - 1).portal_position
+        level = None
+        if self.cache_dir:
+            try:
+                with open(self.level_path(number), "rb") as file:
+                    level = level_from_bytes(file.read(), previous_portal)
+            except (FileNotFoundError, ValueError, struct.error):
+                level = None
+        if level is None:
+            level = generate_level(self.seed, number, self.map_size, self.maze_algorithm, previous_portal)
+            if self.cache_dir:
+                path = self.level_path(number)
+                with open(path + ".tmp", "wb") as file:
+                    file.write(level_bytes(level, self.seed, self.map_size, self.maze_algorithm))
+                os.replace(path + ".tmp", path)
+        if level.portal_position is not None:
+            self.portals[number] = level.portal_position
+        return level
+
+    def take(self, number, previous_portal=None):
+        """
+        :param number: Level number the game is advancing to.
+        :param previous_portal: Portal position of the level the game is leaving.
+        :return: The built Level, not shared with anything else.
+        """
+        future = self.pending.pop(number, None)
+        level = future.result() if future else self.build(number, previous_portal)
+
+        # Forget levels the game skipped over and queue the next ones
+        for stale in [pending for pending in self.pending if pending < number]:
+            self.pending.pop(stale).cancel()
+        for upcoming in range(number + 1, number + 1 + self.ahead):
+            if upcoming not in self.pending:
+                self.pending[upcoming] = self.executor.submit(self.build, upcoming)
+        return level
+
+    def close(self):
+        """
+        :return: None
+        """
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.pending = {}
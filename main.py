@@ -1,559 +1,282 @@
-import pygame
-import random
 from collections import deque
-from draw_functions import (draw_adventurer, draw_enemy, draw_obstacle, draw_chest, draw_inventory, draw_stats,
-                            draw_portal)
-
-# Initialize Pygame
-pygame.init()
-
-# Set up the screen
+from time import perf_counter_ns
+import pygame
+from animations import Animator, MessageCountdown
+from assets import BackgroundAtlas, placeholder
+from draw_functions import attack_circle_center, draw_attack_circles, draw_profiler_overlay, profiler_overlay_rect
+from game import DungeonGame
+from renderer import Renderer, ChunkRenderer, TileMapRenderer
+from profiler import profiler
+from replay import ActionLog
+from snapshot import AutoSaver
+from timestep import FixedTimestep
+from world import EndlessGame
+
+# Screen layout
 map_size = 10
 cell_size = 50
-screen_width = (map_size + 2) * cell_size + 200  # Additional space for stats panel
-screen_height = (map_size + 2) * cell_size
-screen = pygame.display.set_mode((screen_width, screen_height))
-pygame.display.set_caption("Dungeon Crawler")
+# Cells shown across the window; larger maps scroll with the player (see renderer.TileMapRenderer)
+view_cells = min(map_size + 2, 16)
+screen_width = view_cells * cell_size + 200  # Additional space for stats panel
+screen_height = view_cells * cell_size
 
-# Define colors
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-YELLOW = (255, 255, 0)  # Color for sword swing
-GOLD = (255, 215, 0)
-PORTAL_COLOR = (100, 100, 255)  # Color for the portal
+# Levels generated in the background ahead of the player, so stepping through the portal doesn't stall a frame
+levels_ahead = 2
 
-# Define inventory properties
-inventory = []
-selected_item_index = 0
-inventory_open = False
-
-current_message = ""
-message_timer = 0  # Timer to track how long the message should display
-
-# Define items in chests
-item_pool = [
-    {"name": "Iron Sword", "attack_bonus": 2, "description": "A sturdy sword with a sharp edge."},
-    {"name": "Healing Potion", "healing": 20, "description": "Restores 20 health."},
-    {"name": "Steel Shield", "defense_bonus": 3, "description": "A strong shield for defense."}
-]
-
-# Player stats
-player_stats = {
-    "health": 100,
-    "attack": 5,
-    "defense": 1
-}
+# How far the player sees; the rest of the map stays dark or, once explored, shaded (None shows the whole map)
+fov_radius = 6
 
-# Level counter
-level = 1
-player_position = [1, 1]
-player_direction = "down"
+# Goblins further than this Manhattan distance from the player, walls ignored, wait instead of moving
+# (None moves every goblin)
+activity_radius = None
 
-# Enemy stats
-enemy_stats = {
-    "health": 30,
-    "attack": 3
-}
+# Play the endless chunked dungeon (see world.py) instead of one fixed map per level
+endless_mode = False
 
+# Where chunks the player changed are kept once they scroll out of memory, in endless mode
+chunk_cache_dir = ".chunk_cache"
 
-class Boss:
-    """
-        Class Boss:
-            Represents a boss enemy with higher health and attack than regular enemies.
+# Upper limit for frames drawn per second
+max_fps = 30
 
-            Methods
-            -------
-            __init__(self, position)
-                Initializes the Boss with a specified position.
+# Simulation ticks per second. Key presses are queued and applied one per tick, and message durations count ticks
+tick_rate = 30
 
-            Move_towards(self, target_position)
-                Moves the boss towards the player at a slower pace.
+# In real-time mode the enemies take a turn after this many ticks without a key press (0 = only when the player acts)
+realtime_turn_ticks = 0
 
-            Attack_player(self, player_stats)
-                Attacks the player if the player is adjacent.
-    """
-    def __init__(self, position):
-        self.position = position
-        self.health = 100  # Higher health than regular enemies
-        self.attack = 8  # Stronger attack than regular enemies
-        self.sprite = pygame.transform.scale(spider_sprite, (int(cell_size * 1.5), int(cell_size * 1.5)))  # Larger size
-        self.movement_speed = 0.5  # Moves slower than regular enemies
-
-    def move_towards(self, target_position):
-        """
-        Moves the boss towards the player at a slower pace.
-        """
-        diff_x = target_position[1] - self.position[1]
-        diff_y = target_position[0] - self.position[0]
-
-        move_x = 0
-        move_y = 0
-
-        if abs(diff_x) > abs(diff_y):
-            move_x = 1 if diff_x > 0 else -1
-        else:
-            move_y = 1 if diff_y > 0 else -1
+# How long the attack effect stays on screen, in milliseconds
+attack_animation_time = 120
 
-        # Move every other turn for slower movement
-        if random.random() < self.movement_speed:
-            new_pos = [self.position[0] + move_y, self.position[1] + move_x]
-            if 1 <= new_pos[0] <= map_size and 1 <= new_pos[1] <= map_size and new_pos != player_position:
-                self.position = new_pos
+# Where the action log of the last run is written
+replay_file = "last_run.replay"
 
-    def attack_player(self, player_stats):
-        """
-        Attacks the player if adjacent.
-        """
-        diff_x = abs(player_position[1] - self.position[1])
-        diff_y = abs(player_position[0] - self.position[0])
+# Where the game is saved whenever the player reaches a new level
+save_file = "autosave.dcsv"
 
-        if diff_x + diff_y == 1:  # Adjacent to the player
-            player_stats["health"] -= self.attack
-            global current_message, message_timer
-            current_message = f"The boss hits you for {self.attack} damage!"
-            message_timer = 60
+# Time every part of the frame and show the percentiles below the stats panel; F3 toggles it while playing
+profile_frames = False
+profile_file = "profile.json"
+profile_trace_file = "profile_trace.json"  # Chrome trace format, open in chrome://tracing or ui.perfetto.dev
 
+# Define colors
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+YELLOW = (255, 255, 0)  # Color for sword swing
+GOLD = (255, 215, 0)
+PORTAL_COLOR = (100, 100, 255)  # Color for the portal
 
-class SpriteLoader:
-    """
-        class SpriteLoader:
-    def __init__(self, file_name, cell_size):
-        """
-    def __init__(self, file_name, cell_size):
-        """
-        Initialize the sprite loader with the file name and desired cell size.
-
-        :param file_name: Path to the sprite image file.
-        :param cell_size: Tuple (width, height) for scaling the sprite.
-        """
-        self.file_name = file_name
-        self.cell_size = cell_size
-        self.sprite = self.load_and_scale()
-
-    def load_and_scale(self):
-        """
-        Load the sprite from the file and scale it to the desired size.
-
-        :return: Scaled sprite as a pygame.Surface object.
-        """
-        sprite = pygame.image.load(self.file_name).convert_alpha()
-        return pygame.transform.scale(sprite, self.cell_size)
-
-
-# Define the cell size for scaling
-cell_size_tuple = (cell_size, cell_size)
-
-# Load all sprites using the SpriteLoader class
-adventurer_sprite = SpriteLoader('adventurer.png', cell_size_tuple).sprite
-goblin_sprite = SpriteLoader('goblin.png', cell_size_tuple).sprite
-wall_sprite = SpriteLoader('wal.png', cell_size_tuple).sprite
-chest_sprite = SpriteLoader('chest.png', cell_size_tuple).sprite
-spider_sprite = SpriteLoader('spooder.png', cell_size_tuple).sprite
-
-# Portal position
-portal_position = []
-
-# Define global variables for game entities
-obstacles = []
-enemies = []
-chests = []
-
-
-# Function to check if a path exists using BFS
-def is_path_available(start, end, obstacles):
-    """
-    :param start: Starting point of the pathfinding as a list [y, x].
-    :param end: End point of the pathfinding as a list [y, x].
-    :param obstacles: List of points that are obstacles, each point represented as a list [y, x].
-    :return: Boolean value indicating whether a path exists from start to end without hitting obstacles.
-    """
-    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # Up, down, left, right
-    queue = deque([start])
-    visited = set()
-    visited.add(tuple(start))
-
-    while queue:
-        current = queue.popleft()
-        if current == end:
-            return True
-
-        for dy, dx in directions:
-            neighbor = [current[0] + dy, current[1] + dx]
-            if (1 <= neighbor[0] <= map_size and 1 <= neighbor[1] <= map_size and
-                    tuple(neighbor) not in visited and neighbor not in obstacles):
-                queue.append(neighbor)
-                visited.add(tuple(neighbor))
-
-    return False
+# Sprite images, decoded on a worker thread while the first frames are drawn with flat colored placeholders
+sprite_files = {
+    "adventurer": 'adventurer.png',
+    "goblin": 'goblin.png',
+    "wall": 'wal.png',
+    "chest": 'chest.png',
+    "spider": 'spooder.png'
+}
+placeholder_colors = {
+    "adventurer": (0, 255, 0),
+    "goblin": (255, 0, 0),
+    "wall": (128, 128, 128),
+    "chest": GOLD,
+    "boss": (128, 0, 128)
+}
+boss_scale = 1.5  # The boss sprite is larger than a cell
+
+# Map keys to game actions, depending on whether the inventory is open
+inventory_key_actions = {
+    pygame.K_UP: "up",
+    pygame.K_DOWN: "down",
+    pygame.K_e: "equip",
+    pygame.K_i: "inventory"
+}
+map_key_actions = {
+    pygame.K_UP: "up",
+    pygame.K_DOWN: "down",
+    pygame.K_LEFT: "left",
+    pygame.K_RIGHT: "right",
+    pygame.K_SPACE: "attack",
+    pygame.K_i: "inventory"
+}
 
 
-def generate_new_map():
+def atlas_sprites(atlas):
     """
-    Generate a new map for the game, including player position, enemies, obstacles, chests, portal, and a boss if applicable.
-
-    :return: None
+    :param atlas: The loaded SpriteAtlas.
+    :return: Dictionary with the sprites the renderers draw, by name.
     """
-    global enemies, obstacles, chests, player_position, portal_position, boss
-    player_position = [1, 1]  # Reset player position to the starting point
-    boss = None  # Reset the boss for each level
-    num_enemies = 2 + level  # Increase enemies with each level
-    num_chests = 3
-
-    if level == 5:
-        # Boss room with no obstacles, just the player and the boss
-        obstacles = []
-        chests = []
-        enemies = []
-        boss_position = [map_size // 2, map_size // 2]  # Center of the map
-        boss = Boss(boss_position)
-    else:
-        # Normal room generation with enemies and chests
-        # Create an empty grid to represent the maze structure, all walls initially (0 = wall, 1 = path)
-        maze = [[0 for _ in range(map_size)] for _ in range(map_size)]
-
-        # Start from a random position in the maze and mark it as a path
-        start_x, start_y = random.choice(range(1, map_size, 2)), random.choice(range(1, map_size, 2))
-        maze[start_y][start_x] = 1
-
-        # List of walls to consider for carving paths
-        walls = [(start_y + dy, start_x + dx) for dy, dx in [(-1, 0), (1, 0), (0, -1), (0, 1)] if
-                 0 <= start_y + dy < map_size and 0 <= start_x + dx < map_size]
-
-        # Carve out the maze using Prim's algorithm
-        while walls:
-            wy, wx = random.choice(walls)
-            walls.remove((wy, wx))
+    return {
+        "adventurer": atlas.get("adventurer"),
+        "goblin": atlas.get("goblin"),
+        "wall": atlas.get("wall"),
+        "chest": atlas.get("chest"),
+        "boss": atlas.scaled("spider", boss_scale)  # Larger size
+    }
 
-            # Check if it is a wall and has exactly one adjacent path
-            adjacent_paths = [(wy + dy, wx + dx) for dy, dx in [(-1, 0), (1, 0), (0, -1), (0, 1)] if 0 <= wy + dy <
-                              map_size and 0 <= wx + dx < map_size and maze[wy + dy][wx + dx] == 1]
-            if maze[wy][wx] == 0 and len(adjacent_paths) == 1:
-                # Turn this wall into a path with a higher probability (e.g., 80%)
-                if random.random() < 0.9:
-                    maze[wy][wx] = 1
 
-                # Add neighboring walls to the list
-                for dy, dx in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    ny, nx = wy + dy, wx + dx
-                    if 0 <= ny < map_size and 0 <= nx < map_size and maze[ny][nx] == 0:
-                        walls.append((ny, nx))
-
-        # Convert the maze into obstacle positions (walls are 0)
-        obstacles = [[r + 1, c + 1] for r in range(map_size) for c in range(map_size) if maze[r][c] == 0]
-
-        # Find open positions for enemies and chests
-        open_positions = [[r + 1, c + 1] for r in range(map_size) for c in range(map_size) if maze[r][c] == 1]
-
-        # Place enemies and chests at random open positions
-        enemies = random.sample([pos for pos in open_positions if pos != player_position],
-                                min(num_enemies, len(open_positions)))
-        chests = random.sample([pos for pos in open_positions if pos not in enemies and pos != player_position],
-                               min(num_chests, len(open_positions)))
-
-        # Place the portal at a random open position far from the player
-        portal_position = random.choice(
-            [pos for pos in open_positions if pos not in enemies and pos not in chests and pos != player_position])
-
-        # Ensure there's a path from the player to the portal
-        while not is_path_available(player_position, portal_position, obstacles):
-            # Remove a random obstacle to clear a path
-            if obstacles:
-                obstacles.pop(random.randint(0, len(obstacles) - 1))
-
-
-# Initialize the first map
-generate_new_map()
-
-
-def move_player(direction):
+def placeholder_sprites():
     """
-    :param direction: The direction in which the player should move. Accepted values are "up", "down", "left", and "right".
-    :return: None. The function updates the player's position and triggers relevant game mechanics such as enemy turns, chest interactions, and level advancement.
+    :return: Dictionary with a flat colored square for every sprite, drawn until the real ones have loaded.
     """
-    global player_position, player_direction
-    player_direction = direction
-    new_position = player_position.copy()
-
-    if direction == "up":
-        new_position[0] -= 1
-    elif direction == "down":
-        new_position[0] += 1
-    elif direction == "left":
-        new_position[1] -= 1
-    elif direction == "right":
-        new_position[1] += 1
-
-    # Check if the new position is valid for movement
-    if ((1 <= new_position[0] <= map_size and 1 <= new_position[1] <= map_size) and
-            new_position not in enemies and
-            new_position not in obstacles and
-            (not boss or new_position != boss.position)):
-        player_position = new_position
-        enemy_turn()  # Trigger enemy turn only if the player actually moved
-
-    # Check for interaction with chests if the player moves into a chest's position
-    if new_position in chests:
-        open_chest(new_position)
-
-    # Check for interaction with the portal
-    if new_position == portal_position:
-        advance_level()
-
-
-# Function to open a chest and add item to inventory
-def open_chest(position):
-    """
-    :param position: The coordinates of the chest that the player has interacted with.
-    :return: Returns nothing.
-    """
-    global current_message, message_timer
-    chests.remove(position)
-    item = random.choice(item_pool)
-    inventory.append(item)
-    current_message = f"You picked up {item['name']}!"
-    message_timer = 60  # Display the message for about 60 frames (adjust as needed)
+    sprites = {name: placeholder(color, cell_size) for name, color in placeholder_colors.items()}
+    sprites["boss"] = placeholder(placeholder_colors["boss"], int(cell_size * boss_scale))
+    return sprites
 
 
-def attack():
+def play_attack_animation(animator, player_position, player_direction):
     """
-    Performs the player's attack action. It updates the game state by handling
-    the attack animation, removing enemies if hit, damaging the boss if hit,
-    and triggering the enemy's turn.
-
-    Global Variables:
-        current_message (str): The message displayed to the player.
-        Message_timer (int): The timer for the current message.
-        Boss (Boss): The boss object in the game.
-
-    Game State Variables:
-        player_position (list of int): The current position of the player.
-        Player_direction (str): The direction the player is facing.
-        Cell_size (int): The size of each cell in the game grid.
-        Screen (pygame.Surface): The game screen where graphics are drawn.
-        YELLOW (tuple of int): The color used for the attack animation.
-        Enemies (list of int): The list of enemy positions.
-        Player_stats (dict): Dictionary containing player's stats such as attack power.
+    Schedules the expanding circle effect of the player's sword swing.
 
+    :param animator: The Animator running the frame's effects.
+    :param player_position: The current position of the player as a list [y, x].
+    :param player_direction: The direction the player is facing.
     :return: None
     """
-    global current_message, message_timer, boss  # Declare boss as global to modify it
-    # Get the position the player is attacking based on a direction
-    attack_position = player_position.copy()
-    if player_direction == "up":
-        attack_position[0] -= 1
-    elif player_direction == "down":
-        attack_position[0] += 1
-    elif player_direction == "left":
-        attack_position[1] -= 1
-    elif player_direction == "right":
-        attack_position[1] += 1
-
-    # Draw a more dynamic attack animation
-    x = player_position[1] * cell_size
-    y = player_position[0] * cell_size
-
-    # Create a circular effect for the attack
-    for radius in range(5, 15, 3):  # Vary the size for an expanding circle
-        if player_direction == "up":
-            pygame.draw.circle(screen, YELLOW, (x + cell_size // 2, y - cell_size // 4), radius, 1)
-        elif player_direction == "down":
-            pygame.draw.circle(screen, YELLOW, (x + cell_size // 2, y + cell_size + cell_size // 4), radius, 1)
-        elif player_direction == "left":
-            pygame.draw.circle(screen, YELLOW, (x - cell_size // 4, y + cell_size // 2), radius, 1)
-        elif player_direction == "right":
-            pygame.draw.circle(screen, YELLOW, (x + cell_size + cell_size // 4, y + cell_size // 2), radius, 1)
-        pygame.display.flip()
-        pygame.time.delay(30)
-
-    # Remove the enemy if one is at the attack position
-    if attack_position in enemies:
-        enemies.remove(attack_position)
-        current_message = "You defeated an enemy!"
-        message_timer = 60
-
-    # Attack the boss if it is at the attack position
-    if boss and attack_position == boss.position:
-        boss.health -= player_stats["attack"]
-        current_message = f"You hit the boss for {player_stats['attack']} damage!"
-        message_timer = 60
-
-        # Check if the boss is defeated
-        if boss.health <= 0:
-            current_message = "You defeated the boss!"
-            message_timer = 120
-            boss = None  # Remove the boss after it's defeated
-            advance_level()  # Advance the level when the boss is defeated
-
-    # Trigger enemy turn after the player attacks
-    enemy_turn()
-
-
-def enemy_turn():
-    """
-    Performs the enemy's turn in the game. This involves moving each enemy towards the player's position and updating the player's health if any enemy is adjacent to the player. The function also processes the boss's actions if a boss exists.
+    center = attack_circle_center(player_position, player_direction, cell_size)
+    rect = pygame.Rect(0, 0, 30, 30)
+    rect.center = center
+    animator.play(attack_animation_time, lambda surface, progress: draw_attack_circles(surface, center, progress),
+                  rect)
 
-    Global player_stats: Dictionary containing the player's statistics.
-    Global current_message: String for the message to be displayed to the player.
-    Global message_timer: Integer for the duration of the current message will be displayed.
 
-    :var new_enemy_positions: List to store new positions of enemies.
-    :var enemy_pos: List containing the current position of an enemy.
-    :var diff_x: Integer for the difference in the x-axis between player and enemy.
-    :var diff_y: Integer for the difference in the y-axis between player and enemy.
-    :var move_x: Integer for the movement step in the x-axis.
-    :var move_y: Integer for the movement step in the y-axis.
-    :var new_pos: List containing the new coordinates for the enemy after movement.
-    :var damage: Integer for the damage dealt to the player by an adjacent enemy.
-
-    :return: None
+def main():
     """
-    global player_stats, current_message, message_timer
-    new_enemy_positions = []
-
-    for enemy_pos in enemies:
-        diff_x = player_position[1] - enemy_pos[1]
-        diff_y = player_position[0] - enemy_pos[0]
-        move_x = 0
-        move_y = 0
-
-        if abs(diff_x) > abs(diff_y):
-            move_x = 1 if diff_x > 0 else -1
-        else:
-            move_y = 1 if diff_y > 0 else -1
-
-        new_pos = [enemy_pos[0] + move_y, enemy_pos[1] + move_x]
-
-        if ((1 <= new_pos[0] <= map_size and 1 <= new_pos[1] <= map_size) and new_pos not in obstacles and new_pos not
-                in new_enemy_positions and new_pos != player_position):
-            new_enemy_positions.append(new_pos)
-        else:
-            new_enemy_positions.append(enemy_pos)
-
-        if abs(diff_x) + abs(diff_y) == 1:
-            damage = enemy_stats["attack"]
-            player_stats["health"] -= damage
-            current_message = f"You suffered {damage} damage!"
-            message_timer = 60
-
-    enemies[:] = new_enemy_positions
-
-    # Handle boss turn if it exists
-    if boss:
-        boss.move_towards(player_position)
-        boss.attack_player(player_stats)
+    Opens the window and runs the game until it is closed or the player is defeated.
 
-
-# Function to advance to the next level
-def advance_level():
-    """
-    Increases the current level by one and generates a new map for the advanced level.
+    Only the pygame modules the game uses (display and font) are initialized, and the sprites are decoded on a
+    worker thread, so the first frame is drawn right away with placeholders. With profile_frames on, the time from
+    here to the first frame on screen is recorded as "time_to_first_frame".
 
     :return: None
     """
-    global level
-    level += 1
-    generate_new_map()
+    started = perf_counter_ns()
+    pygame.display.init()
+    pygame.font.init()
+    pygame.display.set_caption("Dungeon Crawler")
+    screen = pygame.display.set_mode((screen_width, screen_height))
+
+    # Load all sprites into one atlas, cached on disk between runs
+    atlas = BackgroundAtlas(sprite_files, cell_size)
+    sprites = placeholder_sprites()
+
+    # Create the game state, which also generates the first map
+    if endless_mode:
+        # The viewport fills the window left of the stats panel
+        game = EndlessGame(cache_dir=chunk_cache_dir)
+        renderer = ChunkRenderer(screen, cell_size, sprites, view_cells)
+    else:
+        game = DungeonGame(map_size, levels_ahead=levels_ahead, fov_radius=fov_radius,
+                           activity_radius=activity_radius)
+        if map_size + 2 > view_cells:
+            renderer = TileMapRenderer(screen, cell_size, sprites, view_cells)
+        else:
+            renderer = Renderer(screen, cell_size, sprites)
+
+    # Timed effects, advanced once per frame by the elapsed time
+    animator = Animator()
+
+    # The simulation runs at a fixed tick rate, independently of the frame rate
+    timestep = FixedTimestep(tick_rate)
+    message_countdown = MessageCountdown(game)
+    pending_keys = deque()  # Key presses waiting for the next tick
+    idle_ticks = 0
+
+    # Writes the autosaves in the background so level changes don't stall a frame
+    autosaver = AutoSaver()
+
+    # Main game loop
+    clock = pygame.time.Clock()
+    elapsed = 0.0  # Seconds the last frame took
+    first_frame = True
+    profiler.enabled = profile_frames
+    running = True
+    while running:
+        with profiler.section("frame"):
+            with profiler.section("input"):
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        running = False
+                    elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                        profiler.enabled = not profiler.enabled
+                        if not profiler.enabled:
+                            # Erase the overlay
+                            pygame.draw.rect(screen, BLACK, profiler_overlay_rect(screen))
+                            pygame.display.update(profiler_overlay_rect(screen))
+                    elif event.type == pygame.KEYDOWN:
+                        pending_keys.append(event.key)
+
+            # Run the simulation ticks that are due, applying at most one key press per tick
+            with profiler.section("simulation"):
+                for _ in range(timestep.advance(elapsed)):
+                    action = None
+                    if pending_keys:
+                        key = pending_keys.popleft()
+                        # Looked up when applied, an earlier key in the queue may have opened or closed the inventory
+                        key_actions = inventory_key_actions if game.inventory_open else map_key_actions
+                        action = key_actions.get(key)
+                        idle_ticks = 0
+                    elif realtime_turn_ticks and not game.inventory_open:
+                        idle_ticks += 1
+                        if idle_ticks >= realtime_turn_ticks:
+                            action = "wait"
+                            idle_ticks = 0
+                    if action == "attack" and not game.inventory_open:
+                        play_attack_animation(animator, renderer.screen_cell(game, game.player_position),
+                                              game.player_direction)
+                    if action:
+                        level = game.level
+                        game.step(action)
+                        if game.level != level and not endless_mode:  # Endless runs keep their state in the chunk cache
+                            autosaver.save(game, save_file)
+                    message_countdown.update(timestep.tick_time * 1000)
+
+            # Draw everything that changed since the last frame, then the running effects on top
+            with profiler.section("render"):
+                rects = renderer.draw(game)
+                for rect in animator.draw(screen):
+                    rects.append(rect)
+                    renderer.invalidate_rect(rect)  # Erase the effect on the next frame
+                if profiler.enabled:
+                    rects.append(draw_profiler_overlay(screen, profiler))
+            with profiler.section("display_update"):
+                if rects:
+                    pygame.display.update(rects)
+            if first_frame:
+                if profiler.enabled:
+                    profiler.record("time_to_first_frame", started, perf_counter_ns())
+                first_frame = False
+
+        # Swap in the real sprites once they have been decoded
+        if atlas is not None:
+            loaded = atlas.poll()
+            if loaded is not None:
+                renderer.set_sprites(atlas_sprites(loaded))
+                atlas = None
+
+        # End the game once the player has been defeated (replace this with a game over screen/restart logic)
+        if not game.running:
+            running = False
 
+        # Cap the frame rate so the loop doesn't spin while idle, and advance the effects by the elapsed time
+        frame_time = clock.tick(max_fps)
+        animator.update(frame_time)
+        elapsed = frame_time / 1000
 
-# Function to toggle the inventory display
-def toggle_inventory():
-    """
-    Toggles the state of the inventory. If the inventory is currently open, it will be closed,
-    and if it is currently closed, it will be opened.
+    # Keep the run so it can be played again with replay.Replay
+    if endless_mode:
+        game.world.flush()
+    else:
+        ActionLog.from_game(game).save(replay_file)
+        if game.levels:
+            game.levels.close()
+    autosaver.close()
+    if profiler.samples:
+        profiler.save_json(profile_file)
+        profiler.save_chrome_trace(profile_trace_file)
 
-    :return: None
-    """
-    global inventory_open
-    inventory_open = not inventory_open
+    # Quit Pygame
+    pygame.quit()
 
 
-# Function to equip an item
-def equip_item(item):
-    """
-    :param item: Dictionary representing the item to equip. It may contain keys like 'attack_bonus', 'defense_bonus', or 'healing'.
-    :return: None
-    """
-    if "attack_bonus" in item:
-        player_stats["attack"] += item["attack_bonus"]
-    elif "defense_bonus" in item:
-        player_stats["defense"] += item["defense_bonus"]
-    elif "healing" in item:
-        player_stats["health"] = min(100, player_stats["health"] + item["healing"])
-    inventory.remove(item)
-
-
-# Main game loop
-running = True
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.KEYDOWN:
-            if inventory_open:
-                if event.key == pygame.K_UP:
-                    selected_item_index = max(0, selected_item_index - 1)
-                elif event.key == pygame.K_DOWN:
-                    selected_item_index = min(len(inventory) - 1, selected_item_index + 1)
-                elif event.key == pygame.K_e and inventory:
-                    equip_item(inventory[selected_item_index])
-                elif event.key == pygame.K_i:
-                    toggle_inventory()
-            else:
-                if event.key == pygame.K_UP:
-                    move_player("up")
-                elif event.key == pygame.K_DOWN:
-                    move_player("down")
-                elif event.key == pygame.K_LEFT:
-                    move_player("left")
-                elif event.key == pygame.K_RIGHT:
-                    move_player("right")
-                elif event.key == pygame.K_SPACE:
-                    attack()
-                elif event.key == pygame.K_i:
-                    toggle_inventory()
-
-    # Draw the background
-    screen.fill(BLACK)
-
-    # Draw the map and entities
-    for row in range(map_size + 2):
-        for col in range(map_size + 2):
-            x = col * cell_size
-            y = row * cell_size
-
-            if row == 0 or row == map_size + 1 or col == 0 or col == map_size + 1:
-                pygame.draw.rect(screen, WHITE, (x, y, cell_size, cell_size), 1)
-            elif [row, col] == player_position:
-                draw_adventurer(screen, x, y, adventurer_sprite)
-            elif [row, col] in enemies:
-                draw_enemy(screen, x, y, goblin_sprite)
-            elif [row, col] in obstacles:
-                draw_obstacle(screen, x, y, wall_sprite)
-            elif [row, col] in chests:
-                draw_chest(screen, x, y, chest_sprite)
-            elif [row, col] == portal_position:
-                draw_portal(screen, x, y, cell_size)
-            else:
-                pygame.draw.rect(screen, BLACK, (x, y, cell_size, cell_size))
-
-    # Draw the boss if it exists (Level 5)
-    if boss:
-        draw_enemy(screen, boss.position[1] * cell_size, boss.position[0] * cell_size, boss.sprite)
-
-    # Check if the player's health is zero or below
-    if player_stats["health"] <= 0:
-        current_message = "You have been defeated!"
-        message_timer = 120
-        running = False  # End the game or replace this with a game over screen/restart logic
-
-    # Draw the inventory if it's open
-    if inventory_open:
-        draw_inventory(screen, inventory, selected_item_index)
-
-    # Draw the stats panel
-    draw_stats(screen, player_stats, level)
-
-    pygame.display.flip()
-
-# Quit Pygame
-pygame.quit()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# Flags stored per cell in the occupancy grid
+WALL = 1
+ENEMY = 2
+CHEST = 4
+PORTAL = 8
+BOSS = 16
+
+KINDS = (WALL, ENEMY, CHEST, PORTAL, BOSS)
+
+# Kinds indexed by the spatial hash for radius queries; walls are only ever looked up cell by cell
+HASHED_KINDS = ENEMY | CHEST | PORTAL | BOSS
+
+# Width and height of a spatial hash bucket, in cells
+BUCKET_SIZE = 4
+
+# Typecode of the arrays holding goblins as flat cell indices (see OccupancyGrid.index)
+CELL_TYPECODE = "I"
+
+
+class OccupancyGrid:
+    """
+        Class OccupancyGrid:
+            Keeps track of what occupies every cell of the map, so "is there a wall/enemy/chest here?"
+            is a single array lookup instead of a scan over a list of positions.
+
+            The grid covers the playable area plus the one cell border, indexed by [row, col] exactly
+            like the positions used by the game. Each cell holds a bitmask of the kinds present in it.
+            Next to the grid, every kind keeps a count per occupied position, since two goblins can end up
+            sharing a cell and removing one of them must not clear the other.
+
+            Entities other than walls are also filed in a spatial hash of BUCKET_SIZE x BUCKET_SIZE buckets, kept up
+            to date by the same add/remove/move calls. A radius query only visits the buckets around the position,
+            so it costs about as much as the number of entities near it, however many there are on the map.
+
+            Cells whose wall appears or disappears after the last rebuild are appended to wall_changes, so views that
+            pre-render the walls can refresh just those cells instead of the whole map.
+
+            Methods
+            -------
+            __init__(self, map_size)
+                Creates an empty grid for a map of the given size.
+
+            Rebuild(self, obstacles, enemies, chests, portal_position, boss_position)
+                Replaces the whole contents, used on level changes.
+
+            Add(self, kind, position), remove(self, kind, position), move(self, kind, old, new)
+                Incremental updates for single entities.
+
+            Replace(self, kind, new_cells)
+                Bulk update of every entity of one kind.
+
+            Has(self, kind, position), at(self, position), positions(self, kind)
+                Queries.
+
+            Near(self, kinds, position, radius)
+                Returns the entities within a Manhattan radius of a position.
+    """
+    def __init__(self, map_size):
+        self.map_size = map_size
+        self.width = map_size + 2
+        self.cells = bytearray(self.width * self.width)
+        self.counts = {kind: {} for kind in KINDS}
+        self.buckets = {}  # (bucket row, bucket col) -> set of (y, x) holding any of HASHED_KINDS
+        self.wall_changes = []  # Flat indices of cells whose WALL flag changed since the last rebuild, in order
+
+    def index(self, position):
+        """
+        :param position: A position as a list or tuple [y, x].
+        :return: Index of the position in the flat cell array.
+        """
+        return position[0] * self.width + position[1]
+
+    def clear(self):
+        """
+        Removes everything from the grid.
+
+        :return: None
+        """
+        self.cells = bytearray(self.width * self.width)
+        self.counts = {kind: {} for kind in KINDS}
+        self.buckets = {}
+        self.wall_changes = []
+
+    def rebuild(self, obstacles, enemies, chests, portal_position, boss_position=None):
+        """
+        :param obstacles: List of wall positions.
+        :param enemies: Enemy cells as flat indices.
+        :param chests: List of chest positions.
+        :param portal_position: Position of the portal, or an empty list if there is none.
+        :param boss_position: Position of the boss, or None if there is none.
+        :return: None
+        """
+        self.clear()
+        for position in obstacles:
+            self.add(WALL, position)
+        width = self.width
+        for cell in enemies:
+            self.add(ENEMY, divmod(cell, width))
+        for position in chests:
+            self.add(CHEST, position)
+        if portal_position:
+            self.add(PORTAL, portal_position)
+        if boss_position:
+            self.add(BOSS, boss_position)
+        self.wall_changes = []  # A new map, every view of the old one is redrawn anyway
+
+    def add(self, kind, position):
+        """
+        :param kind: One of the WALL, ENEMY, CHEST, PORTAL or BOSS flags.
+        :param position: The position the entity occupies.
+        :return: None
+        """
+        key = (position[0], position[1])
+        counts = self.counts[kind]
+        counts[key] = counts.get(key, 0) + 1
+        index = self.index(position)
+        if kind & WALL and not self.cells[index] & WALL:
+            self.wall_changes.append(index)
+        self.cells[index] |= kind
+        if kind & HASHED_KINDS:
+            self.hash_add(key)
+
+    def remove(self, kind, position):
+        """
+        :param kind: One of the WALL, ENEMY, CHEST, PORTAL or BOSS flags.
+        :param position: The position the entity is leaving.
+        :return: None
+        """
+        key = (position[0], position[1])
+        counts = self.counts[kind]
+        remaining = counts[key] - 1
+        if remaining:
+            counts[key] = remaining
+        else:
+            del counts[key]
+            index = self.index(position)
+            self.cells[index] &= ~kind
+            if kind & WALL:
+                self.wall_changes.append(index)
+            if kind & HASHED_KINDS and not self.cells[index] & HASHED_KINDS:
+                self.hash_discard(key)
+
+    def move(self, kind, old_position, new_position):
+        """
+        :param kind: One of the WALL, ENEMY, CHEST, PORTAL or BOSS flags.
+        :param old_position: The position the entity is leaving.
+        :param new_position: The position the entity moves to.
+        :return: None
+        """
+        if old_position != new_position:
+            self.remove(kind, old_position)
+            self.add(kind, new_position)
+
+    def replace(self, kind, new_cells):
+        """
+        Replaces every entity of a kind at once, cheaper than moving thousands of them one by one.
+
+        :param kind: One of the WALL, ENEMY, CHEST, PORTAL or BOSS flags.
+        :param new_cells: The new cells of all entities of that kind, as flat indices.
+        :return: None
+        """
+        cells = self.cells
+        width = self.width
+        keep = ~kind & 0xFF
+        hashed = kind & HASHED_KINDS
+        if kind & WALL:
+            old_cells = {key[0] * width + key[1] for key in self.counts[kind]}
+            self.wall_changes.extend(sorted(old_cells.symmetric_difference(new_cells)))
+        for key in self.counts[kind]:
+            index = key[0] * width + key[1]
+            cells[index] &= keep
+            if hashed and not cells[index] & HASHED_KINDS:
+                self.hash_discard(key)
+
+        counts = {}
+        for cell in new_cells:
+            counts[cell] = counts.get(cell, 0) + 1
+        keyed = {}
+        for cell, count in counts.items():
+            cells[cell] |= kind
+            key = divmod(cell, width)
+            keyed[key] = count
+            if hashed:
+                self.hash_add(key)
+        self.counts[kind] = keyed
+
+    def hash_add(self, key):
+        """
+        :param key: A (y, x) tuple that now holds an entity of one of the HASHED_KINDS.
+        :return: None
+        """
+        bucket_key = (key[0] // BUCKET_SIZE, key[1] // BUCKET_SIZE)
+        bucket = self.buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self.buckets[bucket_key] = set()
+        bucket.add(key)
+
+    def hash_discard(self, key):
+        """
+        :param key: A (y, x) tuple that no longer holds any entity of the HASHED_KINDS.
+        :return: None
+        """
+        bucket_key = (key[0] // BUCKET_SIZE, key[1] // BUCKET_SIZE)
+        bucket = self.buckets[bucket_key]
+        bucket.discard(key)
+        if not bucket:
+            del self.buckets[bucket_key]
+
+    def has(self, kind, position):
+        """
+        :param kind: One of the WALL, ENEMY, CHEST, PORTAL or BOSS flags.
+        :param position: The position to check. Must lie on the map or its border.
+        :return: True if an entity of that kind occupies the position.
+        """
+        return bool(self.cells[position[0] * self.width + position[1]] & kind)
+
+    def at(self, position):
+        """
+        :param position: The position to check. Must lie on the map or its border.
+        :return: Bitmask of every kind occupying the position.
+        """
+        return self.cells[position[0] * self.width + position[1]]
+
+    def positions(self, kind):
+        """
+        :param kind: One of the WALL, ENEMY, CHEST, PORTAL or BOSS flags.
+        :return: A view of the (y, x) tuples occupied by that kind.
+        """
+        return self.counts[kind].keys()
+
+    def near(self, kinds, position, radius):
+        """
+        :param kinds: Bitmask of the kinds to look for, any of the HASHED_KINDS.
+        :param position: Center of the query as a list or tuple [y, x].
+        :param radius: Maximum Manhattan distance from the center, walls are not taken into account.
+        :return: List of the (y, x) tuples within the radius that hold at least one of the kinds. Use counts to tell
+            how many entities of a kind share a position.
+        """
+        y, x = position[0], position[1]
+        cells = self.cells
+        width = self.width
+        buckets = self.buckets
+        found = []
+        for bucket_row in range((y - radius) // BUCKET_SIZE, (y + radius) // BUCKET_SIZE + 1):
+            for bucket_col in range((x - radius) // BUCKET_SIZE, (x + radius) // BUCKET_SIZE + 1):
+                bucket = buckets.get((bucket_row, bucket_col))
+                if bucket:
+                    for key in bucket:
+                        if abs(key[0] - y) + abs(key[1] - x) <= radius and cells[key[0] * width + key[1]] & kinds:
+                            found.append(key)
+        return found
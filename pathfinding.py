@@ -0,0 +1,229 @@
+import heapq
+from array import array
+from collections import deque
+from connectivity import build_terrain, OPEN
+
+# Raw value of cells the distance field has not reached
+UNREACHED = 1 << 30
+
+
+class DistanceField:
+    """
+        Class DistanceField:
+            Walking distance from every cell to one target cell (the player), shared by every enemy and the boss,
+            so a turn costs one field update instead of one search per enemy.
+
+            Distances are stored as raw values plus a common offset. When the target moves to a neighbouring cell,
+            every distance grows by at most one, so the offset is raised by one and a wave is flooded out of the new
+            target cell that only lowers the cells that actually got closer. Walls only change when a new map is
+            generated, which triggers a full BFS.
+
+            Methods
+            -------
+            Update(self, grid, target, map_version)
+                Brings the field up to date for the target, incrementally if possible.
+
+            Distance(self, position)
+                Returns the walking distance to the target, or None if it cannot be reached.
+
+            Step_towards(self, position, preferred, is_free)
+                Picks the neighbouring cell that brings an entity closest to the target.
+    """
+    def __init__(self):
+        self.terrain = None
+        self.width = 0
+        self.raw = None
+        self.offset = 0
+        self.target = None
+        self.map_version = None
+
+    def update(self, grid, target, map_version):
+        """
+        :param grid: OccupancyGrid of the map.
+        :param target: The target position as a list [y, x].
+        :param map_version: Version of the map, a change means the walls changed and the field is rebuilt.
+        :return: The field itself.
+        """
+        target = (target[0], target[1])
+        if map_version != self.map_version or self.target is None:
+            self.terrain = build_terrain(grid)
+            self.width = grid.width
+            self.map_version = map_version
+            self.flood(target)
+        elif target != self.target:
+            # The shortcut needs the old target to be walkable; the player can start on a wall cell
+            old_target = self.target[0] * self.width + self.target[1]
+            if (abs(target[0] - self.target[0]) + abs(target[1] - self.target[1]) == 1 and
+                    self.terrain[old_target] == OPEN):
+                self.move_target(target)
+            else:
+                self.flood(target)
+        return self
+
+    def flood(self, target):
+        """
+        Recomputes the whole field with a BFS from the target.
+
+        :param target: The target position as a (y, x) tuple.
+        :return: None
+        """
+        terrain = self.terrain
+        width = self.width
+        raw = array("i", [UNREACHED]) * len(terrain)
+        start = target[0] * width + target[1]
+        raw[start] = 0
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            next_distance = raw[cell] + 1
+            for neighbor in (cell - width, cell + width, cell - 1, cell + 1):
+                if terrain[neighbor] == OPEN and raw[neighbor] == UNREACHED:
+                    raw[neighbor] = next_distance
+                    queue.append(neighbor)
+        self.raw = raw
+        self.offset = 0
+        self.target = target
+
+    def move_target(self, target):
+        """
+        Updates the field after the target moved to a neighbouring cell. The old distances plus one are valid upper
+        bounds for the new ones, so only cells that got closer have to be touched.
+
+        :param target: The new target position as a (y, x) tuple, next to the old one.
+        :return: None
+        """
+        terrain = self.terrain
+        width = self.width
+        raw = self.raw
+        self.offset += 1
+        offset = self.offset
+
+        start = target[0] * width + target[1]
+        raw[start] = -offset
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            next_raw = raw[cell] + 1
+            for neighbor in (cell - width, cell + width, cell - 1, cell + 1):
+                if terrain[neighbor] == OPEN and raw[neighbor] > next_raw:
+                    raw[neighbor] = next_raw
+                    queue.append(neighbor)
+        self.target = target
+
+    def distance(self, position):
+        """
+        :param position: A position as a list [y, x].
+        :return: Number of steps from the position to the target, or None if it cannot be reached.
+        """
+        value = self.raw[position[0] * self.width + position[1]]
+        if value >= UNREACHED // 2:
+            return None
+        return value + self.offset
+
+    def step_towards(self, position, preferred, is_free):
+        """
+        :param position: Current position of the entity as a list [y, x].
+        :param preferred: Steps (dy, dx) in order of preference, used to break ties between equally good cells.
+        :param is_free: Function is_free(position) telling whether the entity may enter a cell.
+        :return: The free, open neighbouring cell closest to the target if it is closer than the current one, else None.
+        """
+        current = self.distance(position)
+        if current is None:
+            return None
+        best = None
+        best_distance = current
+        for dy, dx in preferred:
+            neighbor = [position[0] + dy, position[1] + dx]
+            if self.terrain[neighbor[0] * self.width + neighbor[1]] != OPEN:
+                continue
+            distance = self.distance(neighbor)
+            if distance is not None and distance < best_distance and is_free(neighbor):
+                best = neighbor
+                best_distance = distance
+        return best
+
+
+def preferred_steps(position, target):
+    """
+    :param position: Position of the moving entity as a list [y, x].
+    :param target: Position it is moving to as a list [y, x].
+    :return: The four steps (dy, dx), starting with the one the old greedy movement would have taken.
+    """
+    diff_x = target[1] - position[1]
+    diff_y = target[0] - position[0]
+    step_x = (0, 1 if diff_x > 0 else -1)
+    step_y = (1 if diff_y > 0 else -1, 0)
+    if abs(diff_x) > abs(diff_y):
+        first, second = step_x, step_y
+    else:
+        first, second = step_y, step_x
+    return first, second, (-second[0], -second[1]), (-first[0], -first[1])
+
+
+class PathFinder:
+    """
+        Class PathFinder:
+            A* search for one-off path queries on the current map. The Manhattan heuristic of every cell is cached
+            per goal, so repeated queries to the same goal don't recompute it.
+
+            Methods
+            -------
+            Find_path(self, grid, start, goal)
+                Returns the list of positions from start to goal, or None if there is no path.
+    """
+    def __init__(self, max_cached_goals=8):
+        self.max_cached_goals = max_cached_goals
+        self.heuristics = {}
+
+    def heuristic(self, width, goal):
+        """
+        :param width: Row length of the grid.
+        :param goal: Goal position as a (y, x) tuple.
+        :return: Array with the Manhattan distance from every cell to the goal.
+        """
+        key = (width, goal)
+        values = self.heuristics.get(key)
+        if values is None:
+            if len(self.heuristics) >= self.max_cached_goals:
+                del self.heuristics[next(iter(self.heuristics))]
+            row_part = [abs(row - goal[0]) for row in range(width)]
+            column_part = [abs(col - goal[1]) for col in range(width)]
+            values = self.heuristics[key] = array("i", [dy + dx for dy in row_part for dx in column_part])
+        return values
+
+    def find_path(self, grid, start, goal):
+        """
+        :param grid: OccupancyGrid of the map; walls are impassable.
+        :param start: Start position as a list [y, x].
+        :param goal: Goal position as a list [y, x].
+        :return: List of [y, x] positions from start to goal, both included, or None if the goal cannot be reached.
+        """
+        terrain = build_terrain(grid)
+        width = grid.width
+        heuristic = self.heuristic(width, (goal[0], goal[1]))
+        start_index = start[0] * width + start[1]
+        goal_index = goal[0] * width + goal[1]
+
+        cost = {start_index: 0}
+        came_from = {start_index: -1}
+        queue = [(heuristic[start_index], 0, start_index)]
+        while queue:
+            _, current_cost, cell = heapq.heappop(queue)
+            if cell == goal_index:
+                path = []
+                while cell != -1:
+                    path.append([cell // width, cell % width])
+                    cell = came_from[cell]
+                path.reverse()
+                return path
+            if current_cost > cost[cell]:
+                continue
+            for neighbor in (cell - width, cell + width, cell - 1, cell + 1):
+                if terrain[neighbor] != OPEN and neighbor != goal_index:
+                    continue
+                new_cost = current_cost + 1
+                if new_cost < cost.get(neighbor, UNREACHED):
+                    cost[neighbor] = new_cost
+                    came_from[neighbor] = cell
+                    heapq.heappush(queue, (new_cost + heuristic[neighbor], new_cost, neighbor))
+        return None
@@ -0,0 +1,149 @@
+import functools
+import json
+from collections import deque
+from contextlib import nullcontext
+from time import perf_counter_ns
+
+# Shared by every section that is entered while profiling is off
+_DISABLED_SECTION = nullcontext()
+
+
+class _Section:
+    """
+        Class _Section:
+            Context manager timing one run of a named section.
+    """
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start, perf_counter_ns())
+
+
+class Profiler:
+    """
+        Class Profiler:
+            Times named sections of the frame (input, enemy turn, map generation, each draw_* call, the display
+            update...). Every section keeps its last window durations, from which percentiles are computed, and
+            every timed run is also kept as an event for a Chrome trace (chrome://tracing or ui.perfetto.dev).
+
+            While disabled, section() hands out a shared no-op context manager and timed() functions only check one
+            attribute before calling through, so the instrumentation can stay in place at almost no cost.
+
+            Methods
+            -------
+            Section(self, name)
+                Context manager timing the code inside it.
+
+            Timed(self, name)
+                Decorator timing every call of a function.
+
+            Percentiles(self, name, points=(50, 95, 99))
+                Returns percentiles of the recent durations of a section, in milliseconds.
+
+            Save_json(self, path), save_chrome_trace(self, path)
+                Exports the statistics or the events.
+    """
+    def __init__(self, enabled=False, window=240, max_events=100000):
+        self.enabled = enabled
+        self.window = window
+        self.samples = {}
+        self.events = deque(maxlen=max_events)
+        self.origin = perf_counter_ns()
+
+    def section(self, name):
+        """
+        :param name: Name of the section.
+        :return: Context manager timing the code inside it while profiling is enabled.
+        """
+        if not self.enabled:
+            return _DISABLED_SECTION
+        return _Section(self, name)
+
+    def timed(self, name):
+        """
+        :param name: Name of the section.
+        :return: Decorator timing every call of the decorated function while profiling is enabled.
+        """
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = perf_counter_ns()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, start, perf_counter_ns())
+            return wrapper
+        return decorate
+
+    def record(self, name, start, end):
+        """
+        :param name: Name of the section.
+        :param start: perf_counter_ns() when the section was entered.
+        :param end: perf_counter_ns() when it was left.
+        :return: None
+        """
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(end - start)
+        self.events.append((name, start, end))
+
+    def percentiles(self, name, points=(50, 95, 99)):
+        """
+        :param name: Name of the section.
+        :param points: Percentiles to compute.
+        :return: List with the duration in milliseconds at every percentile, over the recent runs of the section.
+        """
+        durations = sorted(self.samples.get(name, ()))
+        if not durations:
+            return [0.0 for _ in points]
+        last = len(durations) - 1
+        return [durations[round(last * point / 100)] / 1e6 for point in points]
+
+    def summary(self):
+        """
+        :return: Dictionary mapping every section to its number of recent runs and their p50, p95 and p99 in ms.
+        """
+        summary = {}
+        for name in sorted(self.samples):
+            p50, p95, p99 = self.percentiles(name)
+            summary[name] = {"count": len(self.samples[name]), "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+        return summary
+
+    def save_json(self, path):
+        """
+        :param path: File to write the summary to.
+        :return: None
+        """
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def save_chrome_trace(self, path):
+        """
+        :param path: File to write the events to, in the Chrome trace event format.
+        :return: None
+        """
+        events = [{"name": name, "ph": "X", "pid": 1, "tid": 1, "ts": (start - self.origin) / 1000,
+                   "dur": (end - start) / 1000} for name, start, end in self.events]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def clear(self):
+        """
+        :return: None
+        """
+        self.samples = {}
+        self.events.clear()
+
+
+# The profiler every module reports to, enabled from main.py
+profiler = Profiler()
@@ -0,0 +1,717 @@
+import pygame
+from collections import OrderedDict
+from itertools import compress
+from draw_functions import (draw_adventurer, draw_enemy, draw_obstacle, draw_chest, draw_inventory, draw_stats,
+                            draw_portal)
+from occupancy import WALL, ENEMY, CHEST, PORTAL
+
+# Define colors
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+
+# Area covered by the inventory overlay, see draw_functions.draw_inventory
+INVENTORY_RECT = pygame.Rect(20, 20, 260, 360)
+
+# Opacity of the shade over cells the player has explored but cannot see right now
+FOG_ALPHA = 160
+
+# Width and height of the pre-rendered chunks of TileMapRenderer, in cells
+TILE_CHUNK_SIZE = 16
+
+
+class Renderer:
+    """
+        Class Renderer:
+            Draws a DungeonGame onto the screen, only touching the parts of the screen that changed.
+
+            Walls, floor and the border never change during a level, so they are pre-rendered into a background
+            surface that is rebuilt only when the game generates a new map. Every frame the renderer compares the
+            entities on the map with the ones it drew last time, repaints just the cells that differ from the
+            background and returns those rects, to be pushed with pygame.display.update(rects).
+
+            If the game has fog of war (game.visibility), only the cells in view are drawn with their entities. Cells
+            explored earlier show their walls and floor under a dark shade, the rest of the map stays black, and the
+            cells entering or leaving the view are the only extra ones repainted when the player moves.
+
+            Methods
+            -------
+            __init__(self, screen, cell_size, sprites)
+                Sets up the renderer for the given screen, cell size and sprite dictionary.
+
+            Draw(self, game)
+                Brings the screen up to date with the game and returns the rects that were repainted.
+
+            Invalidate_rect(self, rect)
+                Marks every cell under a screen rect for repainting on the next frame.
+
+            Set_sprites(self, sprites)
+                Swaps in new sprites, e.g. once the real ones replace the loading placeholders.
+    """
+    def __init__(self, screen, cell_size, sprites):
+        self.screen = screen
+        self.cell_size = cell_size
+        self.sprites = sprites
+        self.background = None
+        self.map_version = None
+        self.scene = {}
+        self.boss_rect = None
+        self.stats_key = None
+        self.inventory_key = None
+        self.dirty_cells = set()
+        self.grid_width = 0
+        self.visible = set()  # Cells in view when the last frame was drawn, as flat grid indices
+        self.fog = pygame.Surface((cell_size, cell_size))
+        self.fog.set_alpha(FOG_ALPHA)
+
+    def build_background(self, game):
+        """
+        Pre-renders the border, floor and walls of the current map.
+
+        :param game: The DungeonGame whose map should be rendered.
+        :return: None
+        """
+        cell_size = self.cell_size
+        map_size = game.map_size
+        self.grid_width = map_size + 2
+        self.background = pygame.Surface(self.screen.get_size()).convert()
+        self.background.fill(BLACK)
+
+        for row in range(map_size + 2):
+            for col in range(map_size + 2):
+                if row == 0 or row == map_size + 1 or col == 0 or col == map_size + 1:
+                    pygame.draw.rect(self.background, WHITE, (col * cell_size, row * cell_size, cell_size, cell_size), 1)
+
+        for row, col in game.obstacles:
+            draw_obstacle(self.background, col * cell_size, row * cell_size, self.sprites["wall"])
+
+        self.map_version = game.map_version
+
+    def current_scene(self, game):
+        """
+        :param game: The DungeonGame being drawn.
+        :return: Dictionary mapping each (y, x) cell that holds an entity to what should be drawn there.
+        """
+        scene = {}
+        if game.visibility is not None:
+            # Only what is in view, read from the grid so the cost follows the visible area
+            cells = game.grid.cells
+            width = game.grid.width
+            for index in game.visibility.visible:
+                flags = cells[index]
+                if flags & ENEMY:
+                    scene[divmod(index, width)] = "goblin"
+                elif flags & CHEST:
+                    scene[divmod(index, width)] = "chest"
+                elif flags & PORTAL:
+                    scene[divmod(index, width)] = "portal"
+            scene[tuple(game.player_position)] = "adventurer"
+            return scene
+        if game.portal_position:
+            scene[tuple(game.portal_position)] = "portal"
+        for position in game.chests:
+            scene[tuple(position)] = "chest"
+        width = game.grid.width
+        for cell in game.enemies:
+            scene[divmod(cell, width)] = "goblin"
+        scene[tuple(game.player_position)] = "adventurer"
+        return scene
+
+    def cell_rect(self, cell):
+        """
+        :param cell: A (y, x) cell.
+        :return: The screen rect of that cell.
+        """
+        return pygame.Rect(cell[1] * self.cell_size, cell[0] * self.cell_size, self.cell_size, self.cell_size)
+
+    def screen_cell(self, game, position):
+        """
+        :param game: The DungeonGame being drawn.
+        :param position: A map position [y, x].
+        :return: The cell showing that position, the position itself since the whole map is on screen.
+        """
+        return position
+
+    def invalidate_rect(self, rect):
+        """
+        Marks every cell under a screen rect for repainting on the next frame.
+
+        :param rect: A pygame.Rect in screen coordinates.
+        :return: None
+        """
+        last = self.grid_width - 1
+        first_col = max(0, rect.left // self.cell_size)
+        last_col = min(last, (rect.right - 1) // self.cell_size)
+        first_row = max(0, rect.top // self.cell_size)
+        last_row = min(last, (rect.bottom - 1) // self.cell_size)
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                self.dirty_cells.add((row, col))
+
+    def set_sprites(self, sprites):
+        """
+        Swaps in new sprites and redraws everything with them on the next frame.
+
+        :param sprites: Dictionary with the same sprite names as the one passed to __init__.
+        :return: None
+        """
+        self.sprites = sprites
+        self.map_version = None  # Rebuilds the background, which has the walls drawn in
+
+    def draw_cell(self, cell, kind, visibility=None):
+        """
+        Repaints one cell from the background and draws the entity in it, if any.
+
+        :param cell: The (y, x) cell to repaint.
+        :param kind: What occupies the cell, as returned by current_scene, or None for an empty cell.
+        :param visibility: The game's Visibility if it has fog of war.
+        :return: The screen rect that was repainted.
+        """
+        rect = self.cell_rect(cell)
+        if visibility is not None and not visibility.is_visible(cell):
+            if visibility.is_explored(cell):
+                self.screen.blit(self.background, rect, rect)
+                self.screen.blit(self.fog, rect)
+            else:
+                self.screen.fill(BLACK, rect)
+            return rect
+        self.screen.blit(self.background, rect, rect)
+        x, y = rect.topleft
+        if kind == "adventurer":
+            draw_adventurer(self.screen, x, y, self.sprites["adventurer"])
+        elif kind == "goblin":
+            draw_enemy(self.screen, x, y, self.sprites["goblin"])
+        elif kind == "chest":
+            draw_chest(self.screen, x, y, self.sprites["chest"])
+        elif kind == "portal":
+            draw_portal(self.screen, x, y, self.cell_size)
+        return rect
+
+    def draw(self, game):
+        """
+        Brings the screen up to date with the game.
+
+        :param game: The DungeonGame to draw.
+        :return: List of rects that were repainted and need to be pushed to the display.
+        """
+        visibility = game.visibility
+        full_redraw = game.map_version != self.map_version
+        if full_redraw:
+            self.build_background(game)
+            self.scene = {}
+            self.dirty_cells = set()
+            if visibility is not None:
+                # Start from black and repaint what was explored so far, usually just the cells in view
+                self.screen.fill(BLACK)
+                self.visible = set()
+                width = self.grid_width
+                for index in compress(range(len(visibility.explored)), visibility.explored):
+                    self.dirty_cells.add(divmod(index, width))
+            else:
+                self.screen.blit(self.background, (0, 0))
+            self.stats_key = None
+            self.inventory_key = None
+            self.boss_rect = None
+
+        # Cells whose entity appeared, disappeared or changed since the last frame
+        scene = self.current_scene(game)
+        dirty_cells = self.dirty_cells
+        for cell, kind in scene.items():
+            if self.scene.get(cell) != kind:
+                dirty_cells.add(cell)
+        for cell in self.scene:
+            if cell not in scene:
+                dirty_cells.add(cell)
+        self.scene = scene
+
+        # Cells that came into view or went out of it
+        if visibility is not None and visibility.visible is not self.visible:
+            width = self.grid_width
+            for index in visibility.visible.symmetric_difference(self.visible):
+                dirty_cells.add(divmod(index, width))
+            self.visible = visibility.visible
+
+        # The boss sprite is larger than a cell, so repaint everything it covered and covers now
+        boss_rect = None
+        if game.boss and (visibility is None or visibility.is_visible(game.boss.position)):
+            boss_rect = self.sprites["boss"].get_rect(topleft=(game.boss.position[1] * self.cell_size,
+                                                               game.boss.position[0] * self.cell_size))
+        if boss_rect != self.boss_rect:
+            for rect in (self.boss_rect, boss_rect):
+                if rect:
+                    self.invalidate_rect(rect)
+            self.boss_rect = boss_rect
+
+        # Closing the inventory uncovers the map underneath it
+        inventory_key = (game.inventory_open, game.selected_item_index, tuple(item.id for item in game.inventory))
+        inventory_changed = inventory_key != self.inventory_key
+        if inventory_changed and not game.inventory_open and self.inventory_key is not None:
+            self.invalidate_rect(INVENTORY_RECT)
+        self.inventory_key = inventory_key
+
+        rects = [self.draw_cell(cell, scene.get(cell), visibility) for cell in dirty_cells]
+        self.dirty_cells = set()
+
+        # Draw the boss if it exists (Level 5)
+        if boss_rect and (full_redraw or boss_rect.collidelist(rects) != -1):
+            draw_enemy(self.screen, boss_rect.x, boss_rect.y, self.sprites["boss"])
+            rects.append(boss_rect)
+
+        # Draw the inventory if it's open
+        if game.inventory_open and (full_redraw or inventory_changed or INVENTORY_RECT.collidelist(rects) != -1):
+            draw_inventory(self.screen, game.inventory, game.selected_item_index)
+            rects.append(INVENTORY_RECT)
+
+        # Draw the stats panel
+        stats_key = (game.level, game.player_stats["health"], game.player_stats["attack"],
+                     game.player_stats["defense"])
+        if stats_key != self.stats_key:
+            draw_stats(self.screen, game.player_stats, game.level)
+            rects.append(pygame.Rect(self.screen.get_width() - 180, 20, 160, 200))
+            self.stats_key = stats_key
+
+        if full_redraw:
+            rects = [self.screen.get_rect()]
+        return rects
+
+
+class ChunkRenderer:
+    """
+        Class ChunkRenderer:
+            Draws an EndlessGame (see world.py) through a camera that follows the player. Only the chunks that overlap
+            the viewport are touched. The walls of a chunk never change, so each visible chunk is pre-rendered once
+            into a surface and kept in a small LRU cache; goblins and chests are drawn on top every frame.
+
+            The viewport scrolls with every step, so the whole map area is redrawn each frame instead of tracking
+            dirty cells like Renderer does.
+
+            Methods
+            -------
+            __init__(self, screen, cell_size, sprites, view_cells, max_cached_chunks=8)
+                Sets up a view_cells x view_cells viewport in the top left corner of the screen.
+
+            Camera(self, game)
+                Returns the world cell shown in the top left corner of the viewport.
+
+            Draw(self, game)
+                Draws the viewport and the panels and returns the rects that were repainted.
+
+            Set_sprites(self, sprites)
+                Swaps in new sprites, e.g. once the real ones replace the loading placeholders.
+    """
+    def __init__(self, screen, cell_size, sprites, view_cells, max_cached_chunks=8):
+        self.screen = screen
+        self.cell_size = cell_size
+        self.sprites = sprites
+        self.view_cells = view_cells
+        self.viewport = pygame.Rect(0, 0, view_cells * cell_size, view_cells * cell_size)
+        self.max_cached_chunks = max_cached_chunks
+        self.chunk_surfaces = OrderedDict()
+        self.stats_key = None
+        self.cleared = False
+
+    def chunk_surface(self, chunk, chunk_size):
+        """
+        :param chunk: A world.Chunk.
+        :param chunk_size: Width and height of a chunk.
+        :return: Surface with the floor and walls of the chunk.
+        """
+        key = (chunk.row, chunk.col)
+        surface = self.chunk_surfaces.get(key)
+        if surface is not None:
+            self.chunk_surfaces.move_to_end(key)
+            return surface
+
+        cell_size = self.cell_size
+        surface = pygame.Surface((chunk_size * cell_size, chunk_size * cell_size)).convert()
+        surface.fill(BLACK)
+        for index, flags in enumerate(chunk.cells):
+            if flags & WALL:
+                row, col = divmod(index, chunk_size)
+                draw_obstacle(surface, col * cell_size, row * cell_size, self.sprites["wall"])
+        self.chunk_surfaces[key] = surface
+        if len(self.chunk_surfaces) > self.max_cached_chunks:
+            self.chunk_surfaces.popitem(last=False)
+        return surface
+
+    def set_sprites(self, sprites):
+        """
+        Swaps in new sprites and drops the chunk surfaces drawn with the old ones.
+
+        :param sprites: Dictionary with the same sprite names as the one passed to __init__.
+        :return: None
+        """
+        self.sprites = sprites
+        self.chunk_surfaces.clear()
+        self.cleared = False  # Clears the screen, so the stats panel is drawn again too
+        self.stats_key = None
+
+    def camera(self, game):
+        """
+        :param game: The EndlessGame being drawn.
+        :return: The world cell [y, x] in the top left corner of the viewport, chosen to center the player.
+        """
+        half = self.view_cells // 2
+        return [game.player_position[0] - half, game.player_position[1] - half]
+
+    def screen_cell(self, game, position):
+        """
+        :param game: The EndlessGame being drawn.
+        :param position: A world position [y, x].
+        :return: The [y, x] cell of the viewport showing that position.
+        """
+        top, left = self.camera(game)
+        return [position[0] - top, position[1] - left]
+
+    def invalidate_rect(self, rect):
+        """
+        Nothing to do, the whole viewport is redrawn every frame. Kept so effects work the same with both renderers.
+
+        :param rect: A pygame.Rect in screen coordinates.
+        :return: None
+        """
+
+    def draw(self, game):
+        """
+        :param game: The EndlessGame to draw.
+        :return: List of rects that were repainted and need to be pushed to the display.
+        """
+        screen = self.screen
+        rects = []
+        if not self.cleared:
+            screen.fill(BLACK)
+            rects.append(screen.get_rect())
+            self.cleared = True
+
+        cell_size = self.cell_size
+        world = game.world
+        size = world.chunk_size
+        top, left = self.camera(game)
+        bottom, right = top + self.view_cells - 1, left + self.view_cells - 1
+
+        screen.set_clip(self.viewport)
+        screen.fill(BLACK, self.viewport)
+        for chunk in world.chunks_in(top, left, bottom, right):
+            chunk_top = chunk.row * size
+            chunk_left = chunk.col * size
+            screen.blit(self.chunk_surface(chunk, size),
+                        ((chunk_left - left) * cell_size, (chunk_top - top) * cell_size))
+            for index, flags in enumerate(chunk.cells):
+                if flags & (ENEMY | CHEST):
+                    row = chunk_top + index // size
+                    col = chunk_left + index % size
+                    if top <= row <= bottom and left <= col <= right:
+                        x, y = (col - left) * cell_size, (row - top) * cell_size
+                        if flags & CHEST:
+                            draw_chest(screen, x, y, self.sprites["chest"])
+                        if flags & ENEMY:
+                            draw_enemy(screen, x, y, self.sprites["goblin"])
+        player_row, player_col = self.screen_cell(game, game.player_position)
+        draw_adventurer(screen, player_col * cell_size, player_row * cell_size, self.sprites["adventurer"])
+        if game.inventory_open:
+            draw_inventory(screen, game.inventory, game.selected_item_index)
+        screen.set_clip(None)
+        rects.append(self.viewport)
+
+        stats_key = (game.level, game.player_stats["health"], game.player_stats["attack"],
+                     game.player_stats["defense"])
+        if stats_key != self.stats_key:
+            draw_stats(screen, game.player_stats, game.level)
+            rects.append(pygame.Rect(screen.get_width() - 180, 20, 160, 200))
+            self.stats_key = stats_key
+        return rects
+
+
+class TileMapRenderer:
+    """
+        Class TileMapRenderer:
+            Draws a DungeonGame of any size through a camera that follows the player, for maps larger than the window.
+
+            The map is cut into TILE_CHUNK_SIZE x TILE_CHUNK_SIZE chunks. The floor, walls and border of a chunk never
+            change during a level, so they are baked into one surface the first time the chunk comes into view and
+            kept in a small LRU cache, dropped when a new map is generated. A wall added or removed during a level
+            (see OccupancyGrid.wall_changes) only drops the chunk it is in. A frame blits the few chunks overlapping
+            the viewport and then draws the entities inside it on top, found through the occupancy grid's spatial
+            hash, so its cost does not depend on the size of the map.
+
+            With fog of war every chunk also has a remembered surface: explored cells shaded, the rest black. Cells
+            are painted into it as the player sees them for the first time, so it never has to be baked again while
+            the level is played. The cells in view are then copied from the lit surface, one blit per row of them.
+
+            Methods
+            -------
+            __init__(self, screen, cell_size, sprites, view_cells, max_cached_chunks=8)
+                Sets up a view_cells x view_cells viewport in the top left corner of the screen.
+
+            Camera(self, game), screen_cell(self, game, position)
+                Map cell in the top left corner of the viewport, and where a map cell is shown in it.
+
+            Draw(self, game)
+                Draws the viewport and the panels and returns the rects that were repainted.
+
+            Invalidate_chunk(self, chunk_row, chunk_col)
+                Drops the baked surfaces of one chunk, so it is baked again from the game on the next frame.
+
+            Set_sprites(self, sprites)
+                Swaps in new sprites, e.g. once the real ones replace the loading placeholders.
+    """
+    def __init__(self, screen, cell_size, sprites, view_cells, max_cached_chunks=8):
+        self.screen = screen
+        self.cell_size = cell_size
+        self.sprites = sprites
+        self.view_cells = view_cells
+        self.viewport = pygame.Rect(0, 0, view_cells * cell_size, view_cells * cell_size)
+        # Never fewer than the viewport can overlap, or a frame would evict chunks it still has to draw
+        self.max_cached_chunks = max(max_cached_chunks, ((view_cells - 1) // TILE_CHUNK_SIZE + 2) ** 2)
+        self.lit = OrderedDict()  # (chunk row, chunk col) -> baked floor, walls and border
+        self.remembered = {}  # (chunk row, chunk col) -> the same as the player remembers it, with fog of war
+        self.map_version = None
+        self.remembered_count = 0  # How much of the game's Visibility.revealed is painted into the remembered chunks
+        self.wall_change_count = 0  # How much of the grid's wall_changes has been applied to the baked chunks
+        self.fog = pygame.Surface((cell_size, cell_size))
+        self.fog.set_alpha(FOG_ALPHA)
+        self.stats_key = None
+        self.cleared = False
+
+    def camera(self, game):
+        """
+        :param game: The DungeonGame being drawn.
+        :return: The map cell [y, x] in the top left corner of the viewport. It centers the player, but stops at the
+            edges of the map so no space is wasted beyond them.
+        """
+        half = self.view_cells // 2
+        last = max(0, game.grid.width - self.view_cells)
+        return [min(max(0, game.player_position[0] - half), last), min(max(0, game.player_position[1] - half), last)]
+
+    def screen_cell(self, game, position):
+        """
+        :param game: The DungeonGame being drawn.
+        :param position: A map position [y, x].
+        :return: The [y, x] cell of the viewport showing that position.
+        """
+        top, left = self.camera(game)
+        return [position[0] - top, position[1] - left]
+
+    def invalidate_rect(self, rect):
+        """
+        Nothing to do, the whole viewport is redrawn every frame. Kept so effects work the same with every renderer.
+
+        :param rect: A pygame.Rect in screen coordinates.
+        :return: None
+        """
+
+    def invalidate_chunk(self, chunk_row, chunk_col):
+        """
+        :param chunk_row: Row of the chunk, in chunks.
+        :param chunk_col: Column of the chunk, in chunks.
+        :return: None
+        """
+        self.lit.pop((chunk_row, chunk_col), None)
+        self.remembered.pop((chunk_row, chunk_col), None)
+
+    def set_sprites(self, sprites):
+        """
+        Swaps in new sprites and drops the chunks baked with the old ones.
+
+        :param sprites: Dictionary with the same sprite names as the one passed to __init__.
+        :return: None
+        """
+        self.sprites = sprites
+        self.lit.clear()
+        self.remembered.clear()
+        self.cleared = False  # Clears the screen, so the stats panel is drawn again too
+        self.stats_key = None
+
+    def lit_chunk(self, game, key):
+        """
+        :param game: The DungeonGame being drawn.
+        :param key: (chunk row, chunk col).
+        :return: Surface with the floor, walls and border of the chunk.
+        """
+        surface = self.lit.get(key)
+        if surface is not None:
+            self.lit.move_to_end(key)
+            return surface
+
+        cell_size = self.cell_size
+        size = TILE_CHUNK_SIZE
+        grid = game.grid
+        last = grid.width - 1
+        surface = pygame.Surface((size * cell_size, size * cell_size)).convert()
+        surface.fill(BLACK)
+        first_row, first_col = key[0] * size, key[1] * size
+        for row in range(first_row, min(first_row + size, last + 1)):
+            for col in range(first_col, min(first_col + size, last + 1)):
+                x, y = (col - first_col) * cell_size, (row - first_row) * cell_size
+                if row == 0 or row == last or col == 0 or col == last:
+                    pygame.draw.rect(surface, WHITE, (x, y, cell_size, cell_size), 1)
+                elif grid.has(WALL, [row, col]):
+                    draw_obstacle(surface, x, y, self.sprites["wall"])
+        self.lit[key] = surface
+        if len(self.lit) > self.max_cached_chunks:
+            evicted, _ = self.lit.popitem(last=False)
+            self.remembered.pop(evicted, None)
+        return surface
+
+    def remembered_chunk(self, game, key):
+        """
+        :param game: The DungeonGame being drawn, with fog of war.
+        :param key: (chunk row, chunk col).
+        :return: Surface with the explored cells of the chunk shaded and the rest black.
+        """
+        lit = self.lit_chunk(game, key)
+        surface = self.remembered.get(key)
+        if surface is not None:
+            return surface
+
+        surface = pygame.Surface(lit.get_size()).convert()
+        surface.fill(BLACK)
+        self.remembered[key] = surface
+        size = TILE_CHUNK_SIZE
+        width = game.grid.width
+        explored = game.visibility.explored
+        for row in range(key[0] * size, min(key[0] * size + size, width)):
+            start = row * width + key[1] * size
+            for index in compress(range(start, start + min(size, width - key[1] * size)),
+                                  explored[start:start + size]):
+                self.remember(index, width)
+        return surface
+
+    def remember(self, index, width):
+        """
+        Paints one explored cell into the remembered surface of its chunk, if that chunk is baked.
+
+        :param index: Flat grid index of the cell.
+        :param width: Row length of the grid.
+        :return: None
+        """
+        row, col = divmod(index, width)
+        key = (row // TILE_CHUNK_SIZE, col // TILE_CHUNK_SIZE)
+        surface = self.remembered.get(key)
+        if surface is None:
+            return
+        cell_size = self.cell_size
+        rect = pygame.Rect((col % TILE_CHUNK_SIZE) * cell_size, (row % TILE_CHUNK_SIZE) * cell_size,
+                           cell_size, cell_size)
+        surface.blit(self.lit[key], rect, rect)
+        surface.blit(self.fog, rect)
+
+    def blit_cells(self, game, top, left, row, first_col, last_col):
+        """
+        Copies a run of cells of one map row from the lit chunks onto the screen.
+
+        :param game: The DungeonGame being drawn.
+        :param top: First map row of the viewport.
+        :param left: First map column of the viewport.
+        :param row: Map row of the cells.
+        :param first_col: First map column of the run.
+        :param last_col: Last map column of the run.
+        :return: None
+        """
+        cell_size = self.cell_size
+        size = TILE_CHUNK_SIZE
+        col = first_col
+        while col <= last_col:
+            # A run can cross the edge of a chunk
+            end = min(last_col, (col // size + 1) * size - 1)
+            source = pygame.Rect((col % size) * cell_size, (row % size) * cell_size,
+                                 (end - col + 1) * cell_size, cell_size)
+            self.screen.blit(self.lit_chunk(game, (row // size, col // size)),
+                             ((col - left) * cell_size, (row - top) * cell_size), source)
+            col = end + 1
+
+    def draw(self, game):
+        """
+        :param game: The DungeonGame to draw.
+        :return: List of rects that were repainted and need to be pushed to the display.
+        """
+        screen = self.screen
+        rects = []
+        if not self.cleared:
+            screen.fill(BLACK)
+            rects.append(screen.get_rect())
+            self.cleared = True
+        if game.map_version != self.map_version:
+            self.lit.clear()
+            self.remembered.clear()
+            self.remembered_count = 0
+            self.wall_change_count = len(game.grid.wall_changes)
+            self.map_version = game.map_version
+
+        cell_size = self.cell_size
+        size = TILE_CHUNK_SIZE
+        grid = game.grid
+        width = grid.width
+
+        # Chunks whose walls changed since the last frame are baked again
+        if len(grid.wall_changes) > self.wall_change_count:
+            for index in grid.wall_changes[self.wall_change_count:]:
+                row, col = divmod(index, width)
+                self.invalidate_chunk(row // size, col // size)
+            self.wall_change_count = len(grid.wall_changes)
+        visibility = game.visibility
+        top, left = self.camera(game)
+        bottom = min(top + self.view_cells, width) - 1
+        right = min(left + self.view_cells, width) - 1
+
+        # Cells explored since the last frame go into the remembered chunks
+        if visibility is not None and len(visibility.revealed) > self.remembered_count:
+            for index in visibility.revealed[self.remembered_count:]:
+                self.remember(index, width)
+            self.remembered_count = len(visibility.revealed)
+
+        screen.set_clip(self.viewport)
+        screen.fill(BLACK, self.viewport)
+        for chunk_row in range(top // size, bottom // size + 1):
+            for chunk_col in range(left // size, right // size + 1):
+                key = (chunk_row, chunk_col)
+                surface = self.lit_chunk(game, key) if visibility is None else self.remembered_chunk(game, key)
+                screen.blit(surface, ((chunk_col * size - left) * cell_size, (chunk_row * size - top) * cell_size))
+
+        # Entities in the viewport: with fog of war the cells in view, lit row by row, otherwise from the spatial hash
+        if visibility is not None:
+            occupied = []
+            run_start = previous = None
+            for index in sorted(visibility.visible):
+                row, col = divmod(index, width)
+                if not (top <= row <= bottom and left <= col <= right):
+                    continue
+                if previous is None or index != previous + 1 or col == left:
+                    if run_start is not None:
+                        self.blit_cells(game, top, left, *divmod(run_start, width), previous % width)
+                    run_start = index
+                previous = index
+                if grid.cells[index] & (ENEMY | CHEST | PORTAL):
+                    occupied.append((row, col))
+            if run_start is not None:
+                self.blit_cells(game, top, left, *divmod(run_start, width), previous % width)
+        else:
+            half = self.view_cells // 2
+            occupied = [cell for cell in grid.near(ENEMY | CHEST | PORTAL, [top + half, left + half], self.view_cells)
+                        if top <= cell[0] <= bottom and left <= cell[1] <= right]
+
+        for row, col in occupied:
+            flags = grid.cells[row * width + col]
+            x, y = (col - left) * cell_size, (row - top) * cell_size
+            if flags & ENEMY:
+                draw_enemy(screen, x, y, self.sprites["goblin"])
+            elif flags & CHEST:
+                draw_chest(screen, x, y, self.sprites["chest"])
+            else:
+                draw_portal(screen, x, y, cell_size)
+        player_row, player_col = self.screen_cell(game, game.player_position)
+        draw_adventurer(screen, player_col * cell_size, player_row * cell_size, self.sprites["adventurer"])
+        if game.boss and (visibility is None or visibility.is_visible(game.boss.position)):
+            boss_row, boss_col = self.screen_cell(game, game.boss.position)
+            draw_enemy(screen, boss_col * cell_size, boss_row * cell_size, self.sprites["boss"])
+        if game.inventory_open:
+            draw_inventory(screen, game.inventory, game.selected_item_index)
+        screen.set_clip(None)
+        rects.append(self.viewport)
+
+        stats_key = (game.level, game.player_stats["health"], game.player_stats["attack"],
+                     game.player_stats["defense"])
+        if stats_key != self.stats_key:
+            draw_stats(screen, game.player_stats, game.level)
+            rects.append(pygame.Rect(screen.get_width() - 180, 20, 160, 200))
+            self.stats_key = stats_key
+        return rects
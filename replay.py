@@ -0,0 +1,160 @@
+import copy
+import struct
+from game import DungeonGame, ACTIONS, ACTION_CODES
+
+# File header: magic, format version, seed, map size, flags, activity radius, length of the maze algorithm name
+HEADER = struct.Struct("<4sBQIBiB")
+MAGIC = b"DCRL"
+VERSION = 3  # Version 3: the options that change how goblins move are stored
+
+# Header flags
+BATCHED_ENEMIES = 1
+
+# Stored activity radius of games in which every goblin moves
+NO_ACTIVITY_RADIUS = -1
+
+
+class ActionLog:
+    """
+        Class ActionLog:
+            Everything needed to play a run again: the settings the game was created with, including the options
+            that change the rules (batched_enemies, activity_radius), and one byte per action (its index in
+            game.ACTIONS).
+
+            Methods
+            -------
+            From_game(game)
+                Takes the settings and actions of a game.
+
+            To_bytes(self), from_bytes(data)
+                Converts the log to and from its binary file format.
+
+            Save(self, path), load(path)
+                Writes and reads log files.
+    """
+    def __init__(self, seed, map_size=10, maze_algorithm="prim", actions=b"", batched_enemies=False,
+                 activity_radius=None):
+        self.seed = seed
+        self.map_size = map_size
+        self.maze_algorithm = maze_algorithm
+        self.actions = bytearray(actions)
+        self.batched_enemies = batched_enemies
+        self.activity_radius = activity_radius
+
+    @classmethod
+    def from_game(cls, game):
+        """
+        :param game: The DungeonGame to take the log of.
+        :return: ActionLog with the game's settings and every action it took so far.
+        """
+        return cls(game.seed, game.map_size, game.maze_algorithm, game.actions, game.batched_enemies,
+                   game.activity_radius)
+
+    def __len__(self):
+        return len(self.actions)
+
+    def action(self, turn):
+        """
+        :param turn: Index of the action.
+        :return: The action name, as accepted by DungeonGame.step.
+        """
+        return ACTIONS[self.actions[turn]]
+
+    def append(self, action):
+        """
+        :param action: Action name to add at the end of the log.
+        :return: None
+        """
+        self.actions.append(ACTION_CODES[action])
+
+    def to_bytes(self):
+        """
+        :return: The log in its binary file format.
+        """
+        algorithm = self.maze_algorithm.encode()
+        flags = BATCHED_ENEMIES if self.batched_enemies else 0
+        activity_radius = NO_ACTIVITY_RADIUS if self.activity_radius is None else self.activity_radius
+        header = HEADER.pack(MAGIC, VERSION, self.seed, self.map_size, flags, activity_radius, len(algorithm))
+        return header + algorithm + self.actions
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        :param data: A log in its binary file format.
+        :return: The ActionLog.
+        """
+        magic, version, seed, map_size, flags, activity_radius, name_length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a Dungeon Crawler replay log (or an unsupported version)")
+        start = HEADER.size + name_length
+        return cls(seed, map_size, data[HEADER.size:start].decode(), data[start:], bool(flags & BATCHED_ENEMIES),
+                   None if activity_radius == NO_ACTIVITY_RADIUS else activity_radius)
+
+    def save(self, path):
+        """
+        :param path: File to write the log to.
+        :return: None
+        """
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: File to read the log from.
+        :return: The ActionLog.
+        """
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read())
+
+
+class Replay:
+    """
+        Class Replay:
+            Plays an ActionLog again on a headless DungeonGame, as fast as the game rules allow.
+
+            While playing forward it keeps a copy of the game every checkpoint_interval turns, so seeking to an
+            earlier turn only replays the turns since the closest checkpoint instead of the whole run.
+
+            Methods
+            -------
+            Game_at(self, turn)
+                Returns the game as it was after the given number of actions.
+
+            Run(self)
+                Plays the whole log and returns the final game.
+    """
+    def __init__(self, log, checkpoint_interval=500):
+        self.log = log
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoints = {0: self.new_game()}
+
+    def new_game(self):
+        """
+        :return: A fresh game with the settings from the log.
+        """
+        log = self.log
+        return DungeonGame(log.map_size, log.maze_algorithm, batched_enemies=log.batched_enemies, seed=log.seed,
+                           activity_radius=log.activity_radius)
+
+    def game_at(self, turn):
+        """
+        :param turn: Number of actions to apply, between 0 and the length of the log.
+        :return: A new DungeonGame in the state it had after that many actions. Changing it does not affect the replay.
+        """
+        if not 0 <= turn <= len(self.log):
+            raise IndexError(f"Turn {turn} is outside the log (0 to {len(self.log)})")
+
+        start = max(checkpoint for checkpoint in self.checkpoints if checkpoint <= turn)
+        game = copy.deepcopy(self.checkpoints[start])
+        for current in range(start, turn):
+            game.step(self.log.action(current))
+            if (current + 1) % self.checkpoint_interval == 0 and current + 1 not in self.checkpoints:
+                self.checkpoints[current + 1] = copy.deepcopy(game)
+        return game
+
+    def run(self):
+        """
+        :return: The game after every action in the log.
+        """
+        return self.game_at(len(self.log))
@@ -0,0 +1,264 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+from array import array
+from bitpack import little_endian_bytes, little_endian_array
+from game import DungeonGame, ACTIONS, DIRECTIONS
+from occupancy import ENEMY, BOSS
+from pathfinding import PathFinder
+
+# How a game ended, stored in the results as the index in this tuple. The game only ends when the player is
+# defeated, so games still running after max_turns are recorded as "turn_limit"
+CAUSES = ("turn_limit", "goblin", "boss")
+
+# Result columns and their array typecodes
+COLUMNS = (
+    ("seed", "Q"),
+    ("level", "H"),
+    ("turns", "I"),
+    ("damage_taken", "I"),
+    ("health", "i"),
+    ("cause", "B")
+)
+
+
+class RandomPolicy:
+    """
+        Class RandomPolicy:
+            Presses random keys, a baseline that explores every game rule including the inventory.
+    """
+    def __init__(self, rng):
+        self.rng = rng
+
+    def choose(self, game):
+        """
+        :param game: The DungeonGame to pick an action for.
+        :return: One of ACTIONS.
+        """
+        return self.rng.choice(ACTIONS)
+
+
+class ScriptedPolicy:
+    """
+        Class ScriptedPolicy:
+            Plays like a careful player: fights adjacent enemies, uses items as soon as it has them, collects the
+            chests and then walks to the portal, or to the boss on the boss level. A chest is kept as the goal until
+            it has been opened or can no longer be reached, so the player never wavers between two equally far ones.
+
+            Methods
+            -------
+            Choose(self, game)
+                Picks the next action.
+
+            Nearest_chest(self, game)
+                Picks the chest to walk to next.
+    """
+    def __init__(self, rng):
+        self.rng = rng
+        self.path_finder = PathFinder()
+        self.goal = None  # Chest currently walked to
+
+    def choose(self, game):
+        """
+        :param game: The DungeonGame to pick an action for.
+        :return: One of ACTIONS.
+        """
+        if game.inventory_open:
+            return "equip" if game.inventory else "inventory"
+        if game.inventory:
+            return "inventory"
+
+        # Face an adjacent enemy first (walking into it only turns the player), then strike
+        position = game.player_position
+        for direction, (dy, dx) in DIRECTIONS.items():
+            if game.grid.at([position[0] + dy, position[1] + dx]) & (ENEMY | BOSS):
+                return "attack" if game.player_direction == direction else direction
+
+        path = None
+        if game.boss:
+            goal = game.boss.position
+        elif game.chests:
+            if self.goal in game.chests:
+                path = self.path_finder.find_path(game.grid, position, self.goal)
+            if not path:
+                self.goal, path = self.nearest_chest(game)
+            goal = self.goal
+        else:
+            goal = game.portal_position
+        if goal and not path:
+            path = self.path_finder.find_path(game.grid, position, goal)
+        if not path or len(path) < 2:
+            return self.rng.choice(tuple(DIRECTIONS))
+        step = (path[1][0] - position[0], path[1][1] - position[1])
+        return next(direction for direction, offset in DIRECTIONS.items() if offset == step)
+
+
+    def nearest_chest(self, game):
+        """
+        :param game: The DungeonGame to pick a chest in.
+        :return: Tuple of the chest with the shortest path from the player, the first one in game.chests on a tie,
+            and that path. (None, None) if no chest can be reached.
+        """
+        best, best_path = None, None
+        for chest in game.chests:
+            path = self.path_finder.find_path(game.grid, game.player_position, chest)
+            if path and (best_path is None or len(path) < len(best_path)):
+                best, best_path = chest, path
+        return best, best_path
+
+
+POLICIES = {
+    "random": RandomPolicy,
+    "scripted": ScriptedPolicy
+}
+
+
+def play_game(seed, policy="scripted", map_size=10, maze_algorithm="prim", max_turns=2000):
+    """
+    Plays one headless game from start to finish. Everything random in the game and the policy comes from the seed,
+    so the same arguments always give the same result, whichever process runs it.
+
+    :param seed: Seed of the game.
+    :param policy: Name of one of POLICIES.
+    :param map_size: Width and height of the playable area.
+    :param maze_algorithm: Name of one of maze.ALGORITHMS.
+    :param max_turns: Number of actions after which a game still running is stopped and recorded as "turn_limit".
+    :return: Tuple with a value for every entry of COLUMNS.
+    """
+    game = DungeonGame(map_size, maze_algorithm, seed=seed)
+    player = POLICIES[policy](random.Random(seed ^ 0x5E1F))
+    turns = 0
+    while game.running and turns < max_turns:
+        game.step(player.choose(game))
+        turns += 1
+    cause = CAUSES.index(game.last_attacker) if not game.running else 0
+    return seed, game.level, turns, game.damage_taken, game.player_stats["health"], cause
+
+
+def _play_game(arguments):
+    return play_game(*arguments)
+
+
+class ColumnWriter:
+    """
+        Class ColumnWriter:
+            Streams rows into a directory with one raw binary file per column (little-endian, typecodes from
+            COLUMNS), so any column can be loaded on its own with read_columns or numpy.fromfile. A schema.json next
+            to them lists the columns, their byte order and the number of rows written.
+
+            Methods
+            -------
+            Append(self, row)
+                Adds one row, flushing to disk every flush_rows rows.
+
+            Close(self)
+                Writes the remaining rows and the schema.
+    """
+    def __init__(self, directory, columns=COLUMNS, flush_rows=4096):
+        self.directory = directory
+        self.columns = columns
+        self.flush_rows = flush_rows
+        self.rows = 0
+        os.makedirs(directory, exist_ok=True)
+        self.buffers = [array(typecode) for _, typecode in columns]
+        self.files = [open(os.path.join(directory, name + ".bin"), "wb") for name, _ in columns]
+
+    def append(self, row):
+        """
+        :param row: Tuple with a value for every column.
+        :return: None
+        """
+        for buffer, value in zip(self.buffers, row):
+            buffer.append(value)
+        self.rows += 1
+        if len(self.buffers[0]) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        """
+        :return: None
+        """
+        for buffer, file in zip(self.buffers, self.files):
+            file.write(little_endian_bytes(buffer))
+            del buffer[:]
+
+    def close(self):
+        """
+        :return: None
+        """
+        self.flush()
+        for file in self.files:
+            file.close()
+        schema = {"rows": self.rows,
+                  "byteorder": "little",
+                  "columns": [{"name": name, "typecode": typecode} for name, typecode in self.columns]}
+        with open(os.path.join(self.directory, "schema.json"), "w") as file:
+            json.dump(schema, file, indent=2)
+
+
+def read_columns(directory):
+    """
+    :param directory: Directory written by ColumnWriter.
+    :return: Dictionary mapping every column name to an array with its values.
+    """
+    with open(os.path.join(directory, "schema.json")) as file:
+        schema = json.load(file)
+    columns = {}
+    for column in schema["columns"]:
+        typecode = column["typecode"]
+        with open(os.path.join(directory, column["name"] + ".bin"), "rb") as file:
+            data = file.read(schema["rows"] * array(typecode).itemsize)
+        columns[column["name"]] = little_endian_array(typecode, data)
+    return columns
+
+
+def run(games, output, policy="scripted", seed=0, processes=None, map_size=10, maze_algorithm="prim",
+        max_turns=2000):
+    """
+    Plays many games across a process pool and streams their results into a ColumnWriter. Every game gets its own
+    seed drawn from the run seed, so the output is the same for any number of processes.
+
+    :param games: Number of games to play.
+    :param output: Directory for the result columns.
+    :param policy: Name of one of POLICIES.
+    :param seed: Seed of the whole run.
+    :param processes: Number of worker processes, all cores by default.
+    :param map_size: Width and height of the playable area.
+    :param maze_algorithm: Name of one of maze.ALGORITHMS.
+    :param max_turns: Turn limit per game.
+    :return: Number of games played.
+    """
+    seeds = random.Random(seed)
+    tasks = [(seeds.randrange(2 ** 63), policy, map_size, maze_algorithm, max_turns) for _ in range(games)]
+    processes = processes or os.cpu_count()
+    writer = ColumnWriter(output)
+    try:
+        if processes == 1:
+            for row in map(_play_game, tasks):
+                writer.append(row)
+        else:
+            # Large chunks keep the inter-process traffic low, enough of them keep every core busy until the end
+            chunk_size = max(1, games // (processes * 16))
+            with multiprocessing.Pool(processes) as pool:
+                for row in pool.imap(_play_game, tasks, chunk_size):
+                    writer.append(row)
+    finally:
+        writer.close()
+    return games
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play many headless Dungeon Crawler games and record the results.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--output", default="selfplay_results")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="scripted")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--map-size", type=int, default=10)
+    parser.add_argument("--maze", default="prim")
+    parser.add_argument("--max-turns", type=int, default=2000)
+    arguments = parser.parse_args()
+    run(arguments.games, arguments.output, arguments.policy, arguments.seed, arguments.processes, arguments.map_size,
+        arguments.maze, arguments.max_turns)
@@ -0,0 +1,537 @@
+import argparse
+import asyncio
+import struct
+from array import array
+from collections import deque
+from bitpack import little_endian_bytes, little_endian_array
+from game import DungeonGame, ACTIONS, ACTION_CODES, Boss, DIRECTIONS, item_pool
+from maze import ALGORITHMS
+from occupancy import ENEMY, CHEST, BOSS, CELL_TYPECODE
+from snapshot import snapshot_bytes, restore
+
+# Every message starts with the length of its payload and its type
+FRAME = struct.Struct("<IB")
+
+# Longest payload accepted from a client, JOIN is the largest message they send
+MAX_CLIENT_PAYLOAD = 256
+
+# Message types sent by clients
+JOIN = 1
+ACTION = 2
+
+# Message types sent by the server
+WELCOME = 10
+# Payload is a snapshot without the seed and random number generator state (see snapshot.py), sent on joining and
+# whenever a new map is generated
+SNAPSHOT = 11
+DELTA = 12
+ERROR = 13
+
+# Roles of a connection in a session; spectators only watch
+PLAYER = 0
+SPECTATOR = 1
+
+# JOIN payload: session id (0 starts a new session), role, whether a seed is given, seed, map size,
+# followed by the maze algorithm name
+JOIN_HEADER = struct.Struct("<IBBQI")
+
+# Map sizes clients may start sessions with
+MIN_MAP_SIZE = 5
+MAX_MAP_SIZE = 200
+
+# WELCOME payload: session id, role
+WELCOME_HEADER = struct.Struct("<IB")
+
+# DELTA payload: turn, player cell, direction, flags, health, attack, defense, selected item, boss cell, boss health,
+# number of enemy entries, removed chests and inventory items. The enemy entries and the removed chest cells follow as
+# little-endian arrays of CELL_TYPECODE, then the inventory item ids.
+DELTA_HEADER = struct.Struct("<IIBBiiiiIiIII")
+
+# DELTA flags
+INVENTORY_OPEN = 1
+RUNNING = 2
+HAS_BOSS = 4
+ENEMIES_REPLACED = 8  # The enemy entries are the whole enemy array instead of (index, cell) pairs of moved enemies
+
+# Key presses a session keeps while it waits for its next tick, more are dropped
+MAX_QUEUED_ACTIONS = 32
+
+# Bytes that may wait to be sent to one connection before it is dropped as too slow
+MAX_BUFFERED = 1 << 20
+
+DIRECTION_NAMES = tuple(DIRECTIONS)
+
+
+def frame(message_type, payload=b""):
+    """
+    :param message_type: One of the message types.
+    :param payload: The message payload.
+    :return: The message as it is sent over the connection.
+    """
+    return FRAME.pack(len(payload), message_type) + payload
+
+
+def delta_bytes(turn, game, previous_enemies, previous_chests):
+    """
+    Packs what changed during one turn. Stats, the boss and the inventory are small and always included, enemies are
+    sent as the (index, cell) pairs of the ones that moved, or all of them if the count changed, and chests as the cells
+    of the ones that were opened.
+
+    :param turn: Number of the turn in the session.
+    :param game: The DungeonGame after the turn.
+    :param previous_enemies: Copy of game.enemies before the turn.
+    :param previous_chests: Set of the chest cells before the turn.
+    :return: The DELTA payload.
+    """
+    width = game.grid.width
+    enemies = game.enemies
+    flags = (INVENTORY_OPEN if game.inventory_open else 0) | (RUNNING if game.running else 0)
+    if len(enemies) != len(previous_enemies):
+        entries = enemies
+        entry_count = len(enemies)
+        flags |= ENEMIES_REPLACED
+    else:
+        entries = array(CELL_TYPECODE)
+        if enemies != previous_enemies:  # Compared in C, most turns in most sessions move nobody
+            for index, (cell, previous) in enumerate(zip(enemies, previous_enemies)):
+                if cell != previous:
+                    entries.append(index)
+                    entries.append(cell)
+        entry_count = len(entries) // 2
+
+    removed_chests = array(CELL_TYPECODE)
+    if len(game.chests) != len(previous_chests):  # Chests are only ever taken away during a level
+        removed_chests.extend(previous_chests - {row * width + col for row, col in game.chests})
+    boss_cell, boss_health = 0, 0
+    if game.boss:
+        flags |= HAS_BOSS
+        boss_cell, boss_health = game.grid.index(game.boss.position), game.boss.health
+    inventory = bytes(item.id for item in game.inventory)
+
+    stats = game.player_stats
+    header = DELTA_HEADER.pack(turn, game.grid.index(game.player_position),
+                               DIRECTION_NAMES.index(game.player_direction), flags, stats["health"], stats["attack"],
+                               stats["defense"], game.selected_item_index, boss_cell, boss_health, entry_count,
+                               len(removed_chests), len(inventory))
+    return b"".join([header, little_endian_bytes(entries), little_endian_bytes(removed_chests), inventory])
+
+
+def apply_delta(game, payload):
+    """
+    Brings a copy of a session's game up to date with one DELTA message.
+
+    :param game: The client's DungeonGame, restored from the last SNAPSHOT and updated with every DELTA since.
+    :param payload: The DELTA payload.
+    :return: The turn number of the delta.
+    """
+    (turn, player_cell, direction, flags, health, attack, defense, selected_item_index, boss_cell, boss_health,
+     entry_count, chest_count, item_count) = DELTA_HEADER.unpack_from(payload)
+    grid = game.grid
+    width = grid.width
+    offset = DELTA_HEADER.size
+
+    itemsize = array(CELL_TYPECODE).itemsize
+    size = entry_count * itemsize * (1 if flags & ENEMIES_REPLACED else 2)
+    entries = little_endian_array(CELL_TYPECODE, payload[offset:offset + size])
+    offset += size
+    if flags & ENEMIES_REPLACED:
+        game.enemies = entries
+    else:
+        for position in range(0, len(entries), 2):
+            game.enemies[entries[position]] = entries[position + 1]
+    if entry_count or flags & ENEMIES_REPLACED:
+        grid.replace(ENEMY, game.enemies)
+
+    removed_chests = little_endian_array(CELL_TYPECODE, payload[offset:offset + chest_count * itemsize])
+    offset += chest_count * itemsize
+    for cell in removed_chests:
+        position = list(divmod(cell, width))
+        game.chests.remove(position)
+        grid.remove(CHEST, position)
+    game.inventory = [item_pool[item] for item in payload[offset:offset + item_count]]
+
+    if flags & HAS_BOSS:
+        boss_position = list(divmod(boss_cell, width))
+        if game.boss:
+            grid.move(BOSS, game.boss.position, boss_position)
+            game.boss.position = boss_position
+        else:
+            game.boss = Boss(boss_position)
+            grid.add(BOSS, boss_position)
+        game.boss.health = boss_health
+    elif game.boss:
+        grid.remove(BOSS, game.boss.position)
+        game.boss = None
+
+    game.player_position = list(divmod(player_cell, width))
+    game.player_direction = DIRECTION_NAMES[direction]
+    game.player_stats = {"health": health, "attack": attack, "defense": defense}
+    game.selected_item_index = selected_item_index
+    game.inventory_open = bool(flags & INVENTORY_OPEN)
+    game.running = bool(flags & RUNNING)
+    game.update_visibility()
+    return turn
+
+
+class Session:
+    """
+        Class Session:
+            One game hosted by the server, with the connections playing or watching it. Key presses are queued and
+            one is applied per server tick. Only the changes are broadcast, so the session keeps what the enemies and
+            chests looked like after the last turn it sent.
+
+            Methods
+            -------
+            Queue(self, action)
+                Queues a player action for the next tick.
+
+            Advance(self)
+                Applies the next queued action and returns the message telling the clients what changed.
+
+            State_message(self)
+                Returns a SNAPSHOT message with the whole state, for connections that just joined.
+    """
+    def __init__(self, session_id, game):
+        self.session_id = session_id
+        self.game = game
+        self.connections = {}  # StreamWriter -> role
+        self.actions = deque()
+        self.turn = 0
+        self.map_version = None
+        self.chests = set()
+        self.remember()
+
+    def remember(self):
+        """
+        Keeps the state the next delta is computed against.
+
+        :return: None
+        """
+        width = self.game.grid.width
+        self.enemies = array(CELL_TYPECODE, self.game.enemies)
+        if self.map_version != self.game.map_version or len(self.chests) != len(self.game.chests):
+            self.chests = {row * width + col for row, col in self.game.chests}
+        self.map_version = self.game.map_version
+
+    def queue(self, action):
+        """
+        :param action: One of game.ACTIONS.
+        :return: True if the action was queued, False if the queue is full.
+        """
+        if len(self.actions) >= MAX_QUEUED_ACTIONS:
+            return False
+        self.actions.append(action)
+        return True
+
+    def state_message(self):
+        """
+        :return: SNAPSHOT message with the whole state of the game, except what would let players predict it.
+        """
+        return frame(SNAPSHOT, snapshot_bytes(self.game, include_rng=False))
+
+    def advance(self):
+        """
+        :return: The message to broadcast: a DELTA, or a SNAPSHOT if the turn generated a new map.
+        """
+        self.game.step(self.actions.popleft())
+        self.turn += 1
+        if self.game.map_version != self.map_version:
+            message = self.state_message()
+        else:
+            message = frame(DELTA, delta_bytes(self.turn, self.game, self.enemies, self.chests))
+        self.remember()
+        return message
+
+
+class GameServer:
+    """
+        Class GameServer:
+            Hosts many independent sessions in one process and lets clients play or watch them over TCP.
+
+            Turns of all sessions are run together, once per tick: every session with a queued key press takes one
+            turn and its message is encoded once and written to every connection of the session without waiting.
+            Sessions nobody pressed a key in cost nothing, so a core can hold thousands of them; writes are left to
+            the event loop, and connections that fall more than MAX_BUFFERED bytes behind are dropped instead of
+            holding everyone else up.
+
+            Methods
+            -------
+            Create_session(self, seed=None, map_size=10, maze_algorithm="prim")
+                Starts a new game and returns its Session.
+
+            Tick(self)
+                Runs one turn of every session with queued actions and broadcasts the results.
+
+            Handle(self, reader, writer)
+                Serves one client connection.
+
+            Serve(self, host, port)
+                Accepts connections and runs the ticks until cancelled.
+    """
+    def __init__(self, tick_rate=30):
+        self.tick_rate = tick_rate
+        self.sessions = {}  # Session id -> Session
+        self.active = {}  # Sessions with queued actions, by id, in the order they became active
+        self.next_session_id = 1
+
+    def create_session(self, seed=None, map_size=10, maze_algorithm="prim"):
+        """
+        :param seed: Seed of the game, random if None.
+        :param map_size: Width and height of the playable area.
+        :param maze_algorithm: Name of one of maze.ALGORITHMS.
+        :return: The new Session.
+        """
+        session = Session(self.next_session_id, DungeonGame(map_size, maze_algorithm, seed=seed))
+        self.sessions[session.session_id] = session
+        self.next_session_id += 1
+        return session
+
+    def queue(self, session, action):
+        """
+        :param session: The Session the action is for.
+        :param action: One of game.ACTIONS.
+        :return: None
+        """
+        if session.queue(action):
+            self.active[session.session_id] = session
+
+    def tick(self):
+        """
+        A session whose turn fails is ended with an ERROR to its connections, the others carry on.
+
+        :return: Number of sessions that took a turn.
+        """
+        active = self.active
+        self.active = {}
+        for session in active.values():
+            try:
+                message = session.advance()
+            except Exception as error:
+                self.end_session(session, f"Session {session.session_id} failed: {error!r}")
+                continue
+            self.broadcast(session, message)
+            if session.actions:
+                self.active[session.session_id] = session
+        return len(active)
+
+    def end_session(self, session, reason):
+        """
+        :param session: The Session to end.
+        :param reason: Text sent to its connections in an ERROR message before they are closed.
+        :return: None
+        """
+        message = frame(ERROR, reason.encode())
+        for writer in list(session.connections):
+            writer.write(message)
+            self.leave(session, writer)
+            writer.close()
+
+    def broadcast(self, session, message):
+        """
+        :param session: The Session the message is about.
+        :param message: The framed message.
+        :return: None
+        """
+        for writer in list(session.connections):
+            if writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                self.leave(session, writer)
+                writer.close()
+            else:
+                writer.write(message)
+
+    def leave(self, session, writer):
+        """
+        Detaches a connection from its session and ends the session once nobody is left in it.
+
+        :param session: The Session the connection was in.
+        :param writer: The connection's StreamWriter.
+        :return: None
+        """
+        session.connections.pop(writer, None)
+        if not session.connections:
+            self.sessions.pop(session.session_id, None)
+            self.active.pop(session.session_id, None)
+
+    def join(self, writer, payload):
+        """
+        :param writer: The connection's StreamWriter.
+        :param payload: The JOIN payload.
+        :return: The joined Session and the connection's role, or (None, None) if the request was refused with an
+            ERROR message.
+        """
+        error = None
+        if len(payload) < JOIN_HEADER.size:
+            error = "Malformed JOIN"
+        else:
+            session_id, role, has_seed, seed, map_size = JOIN_HEADER.unpack_from(payload)
+            maze_algorithm = bytes(payload[JOIN_HEADER.size:]).decode(errors="replace") or "prim"
+            if role not in (PLAYER, SPECTATOR):
+                error = f"Unknown role {role}"
+            elif session_id and session_id not in self.sessions:
+                error = f"No session {session_id}"
+            elif not session_id and not MIN_MAP_SIZE <= map_size <= MAX_MAP_SIZE:
+                error = f"Map size must be between {MIN_MAP_SIZE} and {MAX_MAP_SIZE}"
+            elif not session_id and maze_algorithm not in ALGORITHMS:
+                error = f"Unknown maze algorithm {maze_algorithm!r}"
+        if error:
+            writer.write(frame(ERROR, error.encode()))
+            return None, None
+
+        if session_id:
+            session = self.sessions[session_id]
+        else:
+            session = self.create_session(seed if has_seed else None, map_size, maze_algorithm)
+        session.connections[writer] = role
+        writer.write(frame(WELCOME, WELCOME_HEADER.pack(session.session_id, role)))
+        writer.write(session.state_message())
+        return session, role
+
+    async def handle(self, reader, writer):
+        """
+        :param reader: StreamReader of the connection.
+        :param writer: StreamWriter of the connection.
+        :return: None
+        """
+        session, role = None, None
+        try:
+            while True:
+                length, message_type = FRAME.unpack(await reader.readexactly(FRAME.size))
+                if length > MAX_CLIENT_PAYLOAD:
+                    # The stream cannot be followed past a message that is not read, so the connection ends
+                    writer.write(frame(ERROR, f"Messages are limited to {MAX_CLIENT_PAYLOAD} bytes".encode()))
+                    break
+                payload = await reader.readexactly(length)
+                if message_type == JOIN:
+                    if session is not None:
+                        self.leave(session, writer)
+                    session, role = self.join(writer, payload)
+                elif message_type == ACTION and session is not None and role == PLAYER and payload:
+                    if payload[0] < len(ACTIONS):
+                        self.queue(session, ACTIONS[payload[0]])
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if session is not None:
+                self.leave(session, writer)
+            writer.close()
+
+    async def run_ticks(self):
+        """
+        Runs tick() tick_rate times per second, skipping ticks it falls behind on instead of catching up.
+
+        :return: None, runs until cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.tick_rate
+        next_tick = loop.time()
+        while True:
+            self.tick()
+            next_tick = max(next_tick + interval, loop.time())
+            await asyncio.sleep(next_tick - loop.time())
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        """
+        :param host: Address to listen on.
+        :param port: Port to listen on, 0 picks a free one.
+        :return: None, runs until cancelled.
+        """
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.run_ticks())
+
+
+class Client:
+    """
+        Class Client:
+            Plays or watches a session on a GameServer. It keeps its own copy of the session's game, restored from
+            every SNAPSHOT and updated with every DELTA, which can be drawn with the usual renderers.
+
+            Methods
+            -------
+            Connect(host, port) (class method, coroutine)
+                Opens a connection.
+
+            Join(self, session_id=0, role=PLAYER, seed=None, map_size=10, maze_algorithm="prim") (coroutine)
+                Starts a new session, or joins an existing one if session_id is given, and waits for its state.
+
+            Send_action(self, action)
+                Sends a key press, as one of game.ACTIONS.
+
+            Receive(self) (coroutine)
+                Waits for the next message and applies it to the game.
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.session_id = None
+        self.game = None
+        self.turn = 0
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765):
+        """
+        :param host: Address of the server.
+        :param port: Port of the server.
+        :return: A connected Client.
+        """
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def join(self, session_id=0, role=PLAYER, seed=None, map_size=10, maze_algorithm="prim"):
+        """
+        :param session_id: Session to join, 0 to start a new one.
+        :param role: PLAYER or SPECTATOR.
+        :param seed: Seed of a new session, random if None.
+        :param map_size: Map size of a new session.
+        :param maze_algorithm: Maze algorithm of a new session.
+        :return: The id of the joined session.
+        """
+        payload = JOIN_HEADER.pack(session_id, role, seed is not None, seed or 0, map_size) + maze_algorithm.encode()
+        self.writer.write(frame(JOIN, payload))
+        await self.writer.drain()
+        while self.game is None or self.session_id is None:
+            await self.receive()
+        return self.session_id
+
+    def send_action(self, action):
+        """
+        :param action: One of game.ACTIONS.
+        :return: None
+        """
+        self.writer.write(frame(ACTION, bytes([ACTION_CODES[action]])))
+
+    async def receive(self):
+        """
+        :return: Type of the message that was received.
+        """
+        length, message_type = FRAME.unpack(await self.reader.readexactly(FRAME.size))
+        payload = await self.reader.readexactly(length)
+        if message_type == WELCOME:
+            self.session_id, _ = WELCOME_HEADER.unpack(payload)
+        elif message_type == SNAPSHOT:
+            self.game = restore(payload)
+        elif message_type == DELTA:
+            self.turn = apply_delta(self.game, payload)
+        elif message_type == ERROR:
+            raise ConnectionError(payload.decode())
+        return message_type
+
+    async def close(self):
+        """
+        :return: None
+        """
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host Dungeon Crawler sessions that clients play or watch over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tick-rate", type=int, default=30, help="Turns per second each session can take")
+    arguments = parser.parse_args()
+    try:
+        asyncio.run(GameServer(arguments.tick_rate).serve(arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,320 @@
+import mmap
+import os
+import queue
+import struct
+import threading
+from array import array
+from bitpack import pack_bits, unpack_bits, little_endian_bytes, little_endian_array
+from connectivity import Reachability
+from game import DungeonGame, Boss, DIRECTIONS, item_pool
+from occupancy import WALL, CELL_TYPECODE
+
+# File header, see snapshot_bytes for the layout that follows it
+HEADER = struct.Struct("<4sBIIQiiiIIBBiIIIIiIIIiIB")
+MAGIC = b"DCSV"
+# Version 2: the game's activity radius, batched enemy movement and fog of war are stored, the generator state is
+# optional
+VERSION = 2
+
+# State of the game's random.Random stream: 625 words and the cached gauss value
+RNG_STATE = struct.Struct("<625I?d")
+
+# Header flags
+INVENTORY_OPEN = 1
+RUNNING = 2
+HAS_PORTAL = 4
+HAS_BOSS = 8
+BATCHED_ENEMIES = 16
+HAS_RNG_STATE = 32  # The seed and the random number generator state are stored
+
+# Stored activity radius of games in which every goblin moves
+NO_ACTIVITY_RADIUS = -1
+
+DIRECTION_NAMES = tuple(DIRECTIONS)
+
+# Positions and item ids are stored as little-endian 32 bit and 8 bit arrays
+_POSITIONS = CELL_TYPECODE  # The game keeps its goblins in arrays of this type already
+_ITEMS = "B"
+
+
+def _positions(positions, width):
+    """
+    :param positions: List of [y, x] positions.
+    :param width: Row length of the grid.
+    :return: Array of flat cell indices.
+    """
+    return array(_POSITIONS, [row * width + col for row, col in positions])
+
+
+def snapshot_bytes(game, include_rng=True):
+    """
+    Packs the state of a game. After the header follow the maze algorithm name, the walls as a bitmap with one bit per
+    cell of the playable area, with fog of war the explored cells as a bitmap with one bit per cell of the grid
+    including its border, the enemy and chest positions as flat cell indices, the inventory as indices into
+    item_pool and finally the state of the random number generator. Apart from the generator state, the size is about
+    map_size² / 8 bytes plus a few bytes per entity.
+
+    Without include_rng the seed is stored as 0 and the generator state is left out. Such a snapshot still shows the
+    whole game, but does not give away the chest drops, boss rolls and levels to come, so it is what players are sent.
+
+    :param game: The DungeonGame to save.
+    :param include_rng: Store the seed and the random number generator state, needed to continue the game exactly.
+    :return: The snapshot as bytes.
+    """
+    map_size = game.map_size
+    width = game.grid.width
+    cells = game.grid.cells
+    interior = b"".join(cells[row * width + 1:row * width + 1 + map_size] for row in range(1, map_size + 1))
+    walls = interior.translate(bytes(1 if flags & WALL else 0 for flags in range(256)))
+
+    flags = 0
+    if game.inventory_open:
+        flags |= INVENTORY_OPEN
+    if game.running:
+        flags |= RUNNING
+    portal = game.portal_position or [0, 0]
+    if game.portal_position:
+        flags |= HAS_PORTAL
+    boss_position, boss_health = [0, 0], 0
+    if game.boss:
+        flags |= HAS_BOSS
+        boss_position, boss_health = game.boss.position, game.boss.health
+    if game.batched_enemies:
+        flags |= BATCHED_ENEMIES
+    seed, rng_state = 0, b""
+    if include_rng:
+        flags |= HAS_RNG_STATE
+        seed = game.seed
+        _, words, gauss = game.rng.getstate()
+        rng_state = RNG_STATE.pack(*words, gauss is not None, gauss or 0.0)
+    activity_radius = NO_ACTIVITY_RADIUS if game.activity_radius is None else game.activity_radius
+    fov_radius, explored = 0, b""
+    if game.visibility is not None:
+        fov_radius = game.visibility.radius
+        explored = pack_bits(game.visibility.explored or bytes(width * width))  # Empty until the first update
+
+    algorithm = game.maze_algorithm.encode()
+    inventory = array(_ITEMS, [item.id for item in game.inventory])
+    header = HEADER.pack(MAGIC, VERSION, map_size, game.level, seed, game.player_stats["health"],
+                         game.player_stats["attack"], game.player_stats["defense"], game.player_position[0],
+                         game.player_position[1], DIRECTION_NAMES.index(game.player_direction), flags,
+                         game.selected_item_index, portal[0], portal[1], boss_position[0], boss_position[1],
+                         boss_health, len(game.enemies), len(game.chests), len(inventory), activity_radius,
+                         fov_radius, len(algorithm))
+
+    return b"".join([header, algorithm, pack_bits(walls), explored, little_endian_bytes(game.enemies),
+                     little_endian_bytes(_positions(game.chests, width)), inventory.tobytes(), rng_state])
+
+
+def restore(data):
+    """
+    :param data: A snapshot, as bytes or any buffer such as a memory map.
+    :return: A new DungeonGame in the saved state. Its action log starts empty. Snapshots without the generator state
+        get a new random seed.
+    """
+    data = memoryview(data)
+    (magic, version, map_size, level, seed, health, attack, defense, player_y, player_x, direction, flags,
+     selected_item_index, portal_y, portal_x, boss_y, boss_x, boss_health, enemy_count, chest_count, item_count,
+     activity_radius, fov_radius, name_length) = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a Dungeon Crawler snapshot (or an unsupported version)")
+
+    offset = HEADER.size
+    algorithm = bytes(data[offset:offset + name_length]).decode()
+    offset += name_length
+
+    has_rng_state = flags & HAS_RNG_STATE
+    game = DungeonGame(map_size, algorithm, batched_enemies=bool(flags & BATCHED_ENEMIES),
+                       seed=seed if has_rng_state else None,
+                       generate_map=False,
+                       activity_radius=None if activity_radius == NO_ACTIVITY_RADIUS else activity_radius,
+                       fov_radius=fov_radius or None)
+    width = game.grid.width
+
+    bitmap_size = (map_size * map_size + 7) // 8
+    walls = unpack_bits(data[offset:offset + bitmap_size], map_size * map_size)
+    offset += bitmap_size
+    game.obstacles = [[index // map_size + 1, index % map_size + 1] for index, wall in enumerate(walls) if wall]
+    explored = None
+    if fov_radius:
+        bitmap_size = (width * width + 7) // 8
+        explored = unpack_bits(data[offset:offset + bitmap_size], width * width)
+        offset += bitmap_size
+
+    lists = []
+    for count, typecode in ((enemy_count, _POSITIONS), (chest_count, _POSITIONS), (item_count, _ITEMS)):
+        size = count * array(typecode).itemsize
+        lists.append(little_endian_array(typecode, data[offset:offset + size]))
+        offset += size
+    enemies, chests, items = lists
+    game.enemies = enemies
+    game.chests = [[cell // width, cell % width] for cell in chests]
+    game.inventory = [item_pool[item] for item in items]
+
+    if has_rng_state:
+        state = RNG_STATE.unpack_from(data, offset)
+        game.rng.setstate((3, tuple(state[:625]), state[626] if state[625] else None))
+
+    game.level = level
+    game.player_stats = {"health": health, "attack": attack, "defense": defense}
+    game.player_position = [player_y, player_x]
+    game.player_direction = DIRECTION_NAMES[direction]
+    game.selected_item_index = selected_item_index
+    game.inventory_open = bool(flags & INVENTORY_OPEN)
+    game.running = bool(flags & RUNNING)
+    game.portal_position = [portal_y, portal_x] if flags & HAS_PORTAL else []
+    if flags & HAS_BOSS:
+        game.boss = Boss([boss_y, boss_x])
+        game.boss.health = boss_health
+
+    game.map_version += 1
+    game.grid.rebuild(game.obstacles, game.enemies, game.chests, game.portal_position,
+                      game.boss.position if game.boss else None)
+    game.reachability = Reachability(game.grid, game.portal_position or None)
+    if explored is not None:
+        game.update_visibility()
+        visibility = game.visibility
+        visibility.explored = bytearray(explored)
+        visibility.revealed = [index for index, seen in enumerate(visibility.explored) if seen]
+    return game
+
+
+def save(game, path):
+    """
+    :param game: The DungeonGame to save.
+    :param path: File to write the snapshot to.
+    :return: None
+    """
+    with open(path, "wb") as file:
+        file.write(snapshot_bytes(game))
+
+
+def load(path):
+    """
+    :param path: File to read the snapshot from.
+    :return: The restored DungeonGame.
+    """
+    with open(path, "rb") as file:
+        return restore(file.read())
+
+
+class SnapshotReader:
+    """
+        Class SnapshotReader:
+            Reads a snapshot file through a memory map, so single values can be looked at without reading or decoding
+            the whole file.
+
+            Methods
+            -------
+            Level, map_size, player_stats (properties)
+                Values from the header.
+
+            Is_wall(self, position)
+                Reads one bit of the wall bitmap.
+
+            Game(self)
+                Restores the whole game.
+
+            Close(self)
+                Releases the memory map.
+    """
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header = HEADER.unpack_from(self.data)
+        if self.header[0] != MAGIC or self.header[1] != VERSION:
+            self.close()
+            raise ValueError("Not a Dungeon Crawler snapshot (or an unsupported version)")
+
+    @property
+    def map_size(self):
+        return self.header[2]
+
+    @property
+    def level(self):
+        return self.header[3]
+
+    @property
+    def player_stats(self):
+        return {"health": self.header[5], "attack": self.header[6], "defense": self.header[7]}
+
+    def is_wall(self, position):
+        """
+        :param position: A position on the playable area as a list [y, x].
+        :return: True if the saved map has a wall there.
+        """
+        index = (position[0] - 1) * self.map_size + position[1] - 1
+        return bool(self.data[HEADER.size + self.header[-1] + index // 8] >> (index % 8) & 1)
+
+    def game(self):
+        """
+        :return: The restored DungeonGame.
+        """
+        return restore(self.data)
+
+    def close(self):
+        """
+        :return: None
+        """
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AutoSaver:
+    """
+        Class AutoSaver:
+            Writes snapshots from a background thread. The state is packed immediately on the calling thread, which
+            takes well under a millisecond on normal maps, and only the file write happens in the background.
+
+            Methods
+            -------
+            Save(self, game, path)
+                Packs the game and queues the write.
+
+            Close(self)
+                Waits for the queued writes and stops the thread.
+    """
+    def __init__(self):
+        self.writes = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="autosave", daemon=True)
+        self.thread.start()
+
+    def save(self, game, path):
+        """
+        :param game: The DungeonGame to save.
+        :param path: File to write the snapshot to.
+        :return: None
+        """
+        self.writes.put((path, snapshot_bytes(game)))
+
+    def run(self):
+        """
+        Body of the background thread, writing queued snapshots until close() is called.
+
+        :return: None
+        """
+        while True:
+            write = self.writes.get()
+            if write is None:
+                break
+            path, data = write
+            temporary_path = path + ".tmp"
+            try:
+                with open(temporary_path, "wb") as file:
+                    file.write(data)
+                os.replace(temporary_path, path)
+            except OSError:
+                pass  # A failed autosave must never take the game down
+
+    def close(self):
+        """
+        :return: None
+        """
+        self.writes.put(None)
+        self.thread.join()
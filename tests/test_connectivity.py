@@ -0,0 +1,46 @@
+import random
+import pytest
+from connectivity import Reachability, connect
+from levels import generate_level
+from occupancy import WALL
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_incremental_reachability_matches_a_fresh_one(seed):
+    rng = random.Random(seed)
+    map_size = rng.choice([6, 9, 14])
+    level = generate_level(seed, 1, map_size, rng.choice(["prim", "backtracker", "wilson"]))
+    grid = level.grid
+    target = level.portal_position
+    reachability = Reachability(grid, target)
+    reachability.distance(target)  # From here on the distances are maintained, not flooded again
+    positions = [[row, col] for row in range(1, map_size + 1) for col in range(1, map_size + 1)]
+
+    for _ in range(150):
+        position = rng.choice(positions)
+        if grid.has(WALL, position):
+            grid.remove(WALL, position)
+            reachability.remove_wall(position)
+        else:
+            grid.add(WALL, position)
+            reachability.add_wall(position)
+
+        fresh = Reachability(grid, target)
+        for position in positions:
+            assert reachability.distance(position) == fresh.distance(position)
+        for _ in range(10):
+            start, end = rng.choice(positions), rng.choice(positions)
+            expected = not grid.has(WALL, start) and not grid.has(WALL, end) and connect(grid, start, end) == []
+            assert reachability.connected(start, end) == expected
+
+
+def test_connect_opens_a_path():
+    level = generate_level(3, 2, 15, "backtracker")
+    reachability = Reachability(level.grid)
+    start = [1, 1]
+    end = [15, 15]
+    for position in reachability.connect(start, end):
+        level.grid.remove(WALL, position)
+    if not level.grid.has(WALL, start):
+        assert reachability.connected(start, end)
+    assert connect(level.grid, start, end) == []
@@ -0,0 +1,36 @@
+import random
+from array import array
+import pytest
+from game import DungeonGame
+from occupancy import ENEMY, WALL, CELL_TYPECODE
+
+pytest.importorskip("numpy")
+
+
+def horde_game(seed, map_size, enemy_count, batched, activity_radius=None):
+    game = DungeonGame(map_size, batched_enemies=batched, seed=seed, activity_radius=activity_radius)
+    rng = random.Random(seed)
+    open_cells = [game.grid.index([row, col]) for row in range(1, map_size + 1) for col in range(1, map_size + 1)
+                  if not game.grid.has(WALL, [row, col]) and [row, col] != game.player_position]
+    game.enemies = array(CELL_TYPECODE, rng.sample(open_cells, min(enemy_count, len(open_cells))))
+    game.grid.replace(ENEMY, game.enemies)
+    game.player_stats["health"] = 10 ** 6
+    return game
+
+
+@pytest.mark.parametrize("activity_radius", [None, 0, 4])
+@pytest.mark.parametrize("seed, map_size, enemy_count", [(1, 12, 20), (2, 30, 150), (3, 40, 600)])
+def test_batched_and_scalar_enemy_turns_match(seed, map_size, enemy_count, activity_radius):
+    scalar = horde_game(seed, map_size, enemy_count, False, activity_radius)
+    batched = horde_game(seed, map_size, enemy_count, True, activity_radius)
+    rng = random.Random(seed)
+    for _ in range(60):
+        action = rng.choice(("up", "down", "left", "right", "wait", "wait"))
+        scalar.step(action)
+        batched.step(action)
+        assert list(batched.enemies) == list(scalar.enemies)
+        assert batched.grid.cells == scalar.grid.cells
+        assert batched.player_position == scalar.player_position
+        assert batched.player_stats == scalar.player_stats
+        if scalar.level != 1:
+            break
@@ -0,0 +1,20 @@
+import pytest
+from game import DungeonGame
+from levels import generate_level
+
+
+@pytest.mark.parametrize("map_size, maze_algorithm", [(1, "prim"), (2, "prim"), (3, "backtracker"), (3, "wilson")])
+def test_map_too_small_raises(map_size, maze_algorithm):
+    with pytest.raises(ValueError):
+        generate_level(1, 1, map_size, maze_algorithm)
+    with pytest.raises(ValueError):
+        DungeonGame(map_size, maze_algorithm, seed=1)
+
+
+def test_levels_depend_only_on_seed_and_number():
+    first = generate_level(7, 2, 12)
+    second = generate_level(7, 2, 12)
+    assert first.obstacles == second.obstacles
+    assert list(first.enemies) == list(second.enemies)
+    assert first.chests == second.chests
+    assert first.portal_position == second.portal_position
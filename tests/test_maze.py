@@ -0,0 +1,29 @@
+import pytest
+from maze import ALGORITHMS, LARGE_MAP_SIZE, PATH, WALL, default_algorithm, generate_maze
+
+
+@pytest.mark.parametrize("algorithm", sorted(ALGORITHMS))
+@pytest.mark.parametrize("map_size", [2, 7, 10, 31])
+def test_paths_are_connected_and_inside_the_border(algorithm, map_size):
+    for seed in range(10):
+        cells = generate_maze(map_size, algorithm, seed=seed)
+        width = map_size + 2
+        assert len(cells) == width * width and set(cells) <= {WALL, PATH}
+        for index in range(width):
+            assert cells[index] == cells[-1 - index] == cells[index * width] == cells[index * width + width - 1] == WALL
+        paths = {index for index, cell in enumerate(cells) if cell == PATH}
+        seen = {next(iter(paths))}
+        stack = list(seen)
+        while stack:
+            cell = stack.pop()
+            for neighbour in (cell - width, cell + width, cell - 1, cell + 1):
+                if neighbour in paths and neighbour not in seen:
+                    seen.add(neighbour)
+                    stack.append(neighbour)
+        assert seen == paths
+
+
+def test_large_maps_default_to_the_backtracker():
+    assert default_algorithm(10) == default_algorithm(LARGE_MAP_SIZE) == "prim"
+    assert default_algorithm(LARGE_MAP_SIZE + 1) == "backtracker"
+    assert generate_maze(LARGE_MAP_SIZE + 1, seed=3) == generate_maze(LARGE_MAP_SIZE + 1, "backtracker", seed=3)
@@ -0,0 +1,50 @@
+import random
+import pytest
+from levels import generate_level
+from occupancy import WALL
+from pathfinding import DistanceField, PathFinder
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_incremental_distance_field_matches_a_fresh_flood(seed):
+    rng = random.Random(seed)
+    map_size = rng.choice([6, 10, 16])
+    level = generate_level(seed, 1, map_size, rng.choice(["prim", "backtracker", "wilson"]))
+    grid = level.grid
+    positions = [[row, col] for row in range(1, map_size + 1) for col in range(1, map_size + 1)]
+    field = DistanceField()
+    target = [1, 1]  # Often a wall, which the player can start on
+    for _ in range(200):
+        if rng.random() < 0.05:
+            target = rng.choice(positions)  # Jumps, as on entering a new level
+        else:
+            dy, dx = rng.choice([(-1, 0), (1, 0), (0, -1), (0, 1)])
+            step = [target[0] + dy, target[1] + dx]
+            # Walk on open cells, stepping off a wall start like the player does
+            if 1 <= step[0] <= map_size and 1 <= step[1] <= map_size and not grid.has(WALL, step):
+                target = step
+        field.update(grid, target, 1)
+        fresh = DistanceField().update(grid, target, 1)
+        for position in positions:
+            assert field.distance(position) == fresh.distance(position)
+
+
+def test_new_map_version_refloods():
+    first = generate_level(1, 1, 10)
+    second = generate_level(1, 2, 10)
+    field = DistanceField().update(first.grid, [1, 1], 1)
+    field.update(second.grid, [1, 1], 2)
+    fresh = DistanceField().update(second.grid, [1, 1], 2)
+    assert list(field.raw) == list(fresh.raw) and field.offset == fresh.offset
+
+
+def test_path_finder_agrees_with_the_distance_field():
+    level = generate_level(2, 3, 14, "backtracker")
+    field = DistanceField().update(level.grid, level.portal_position, 1)
+    finder = PathFinder()
+    for start in ([1, 1], [7, 7], [14, 14], level.player_position):
+        path = finder.find_path(level.grid, start, level.portal_position)
+        distance = field.distance(start)
+        if level.grid.has(WALL, start) or distance is None:
+            continue
+        assert path is not None and len(path) - 1 == distance
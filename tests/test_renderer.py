@@ -0,0 +1,42 @@
+import os
+import pytest
+from game import DungeonGame
+from occupancy import WALL, HASHED_KINDS
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+pygame = pytest.importorskip("pygame")
+from renderer import TileMapRenderer  # noqa: E402, needs pygame
+
+WALL_COLOR = (200, 10, 10)
+
+
+@pytest.fixture
+def screen():
+    pygame.display.init()
+    pygame.font.init()
+    yield pygame.display.set_mode((16 * 10 + 200, 16 * 10))
+    pygame.quit()
+
+
+@pytest.mark.parametrize("fov_radius", [None, 6])
+def test_tile_map_follows_wall_changes(screen, fov_radius):
+    game = DungeonGame(40, seed=1, fov_radius=fov_radius)
+    sprites = {name: pygame.Surface((10, 10)).convert() for name in ("adventurer", "goblin", "chest", "boss")}
+    sprites["wall"] = pygame.Surface((10, 10)).convert()
+    sprites["wall"].fill(WALL_COLOR)
+    renderer = TileMapRenderer(screen, 10, sprites, 16)
+    renderer.draw(game)
+
+    top, left = renderer.camera(game)
+    player = game.player_position
+    cell = next([row, col] for row in range(top + 1, top + 15) for col in range(left + 1, left + 15)
+                if not game.grid.at([row, col]) & (WALL | HASHED_KINDS) and [row, col] != player
+                and (game.visibility is None or game.visibility.is_visible([row, col])))
+    pixel = ((cell[1] - left) * 10 + 5, (cell[0] - top) * 10 + 5)
+
+    game.grid.add(WALL, cell)
+    renderer.draw(game)
+    assert screen.get_at(pixel)[:3] == WALL_COLOR
+    game.grid.remove(WALL, cell)
+    renderer.draw(game)
+    assert screen.get_at(pixel)[:3] != WALL_COLOR
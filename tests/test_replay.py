@@ -0,0 +1,41 @@
+import random
+import pytest
+from game import DungeonGame, ACTIONS
+from replay import ActionLog, Replay
+
+
+def play(game, turns, seed):
+    rng = random.Random(seed)
+    for _ in range(turns):
+        if not game.step(rng.choice(ACTIONS)):
+            break
+    return game
+
+
+def state(game):
+    return (list(game.enemies), game.chests, game.player_position, game.player_stats, game.level,
+            [item.id for item in game.inventory], game.boss and (game.boss.position, game.boss.health))
+
+
+@pytest.mark.parametrize("options", [{}, {"activity_radius": 3}, {"activity_radius": 0},
+                                     {"batched_enemies": True, "activity_radius": 3}])
+def test_replay_reproduces_the_run(options):
+    if options.get("batched_enemies"):
+        pytest.importorskip("numpy")
+    for seed in range(10):
+        game = play(DungeonGame(12, seed=seed, **options), 300, seed)
+        log = ActionLog.from_bytes(ActionLog.from_game(game).to_bytes())
+        assert log.batched_enemies == game.batched_enemies
+        assert log.activity_radius == game.activity_radius
+        assert state(Replay(log).run()) == state(game)
+
+
+def test_game_at_matches_playing_forward():
+    game = play(DungeonGame(10, seed=5, activity_radius=2), 200, 5)
+    replay = Replay(ActionLog.from_game(game), checkpoint_interval=40)
+    replay.run()
+    for turn in (0, 39, 40, 121, len(game.actions)):
+        expected = DungeonGame(10, seed=5, activity_radius=2)
+        for action in game.actions[:turn]:
+            expected.step(ACTIONS[action])
+        assert state(replay.game_at(turn)) == state(expected)
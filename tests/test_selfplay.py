@@ -0,0 +1,28 @@
+import json
+import random
+import pytest
+from game import DungeonGame
+from selfplay import COLUMNS, ColumnWriter, ScriptedPolicy, read_columns
+
+
+@pytest.mark.parametrize("seed", [8963783824838420066] + list(range(10)))
+def test_scripted_player_makes_progress(seed):
+    game = DungeonGame(10, seed=seed)
+    player = ScriptedPolicy(random.Random(seed))
+    for _ in range(300):
+        if game.level > 1 or not game.step(player.choose(game)):
+            break
+    assert game.level > 1 or not game.running
+
+
+def test_columns_round_trip_little_endian(tmp_path):
+    rows = [(2 ** 63 + seed, seed, 1000 + seed, 70000 * seed, -seed, seed % 3) for seed in range(10)]
+    writer = ColumnWriter(str(tmp_path), flush_rows=4)
+    for row in rows:
+        writer.append(row)
+    writer.close()
+    with open(tmp_path / "schema.json") as file:
+        assert json.load(file)["byteorder"] == "little"
+    assert (tmp_path / "turns.bin").read_bytes()[:4] == (1000).to_bytes(4, "little")
+    columns = read_columns(str(tmp_path))
+    assert list(zip(*(columns[name] for name, _ in COLUMNS))) == rows
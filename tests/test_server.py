@@ -0,0 +1,93 @@
+import asyncio
+import struct
+import pytest
+from game import item_pool
+from server import GameServer, Client, FRAME, JOIN, DELTA, MAX_MAP_SIZE
+
+
+def run_with_server(scenario):
+    async def main():
+        server = GameServer(tick_rate=200)
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        ticker = asyncio.create_task(server.run_ticks())
+        try:
+            return await scenario(server, listener.sockets[0].getsockname()[1])
+        finally:
+            ticker.cancel()
+            listener.close()
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("join", [{"map_size": 0}, {"map_size": 2}, {"map_size": MAX_MAP_SIZE + 1},
+                                  {"maze_algorithm": "unknown"}, {"session_id": 12345}, {"role": 9}])
+def test_invalid_join_is_refused(join):
+    async def scenario(server, port):
+        client = await Client.connect(port=port)
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(client.join(**join), 5)
+        await client.close()
+        return server.sessions
+    assert run_with_server(scenario) == {}
+
+
+def test_oversized_message_is_refused():
+    async def scenario(server, port):
+        client = await Client.connect(port=port)
+        client.writer.write(FRAME.pack(1 << 31, JOIN))
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(client.receive(), 5)
+    run_with_server(scenario)
+
+
+def test_client_follows_server_state():
+    async def scenario(server, port):
+        player = await Client.connect(port=port)
+        await player.join(seed=3, map_size=12)
+        spectator = await Client.connect(port=port)
+        await spectator.join(player.session_id, role=1)
+        game = server.sessions[player.session_id].game
+        for turn in range(200):
+            if not game.running:
+                break
+            player.send_action(("up", "down", "left", "right", "attack", "wait")[turn * 7 % 6])
+            await asyncio.wait_for(player.receive(), 5)
+            await asyncio.wait_for(spectator.receive(), 5)
+            for client in (player, spectator):
+                assert list(client.game.enemies) == list(game.enemies)
+                assert client.game.chests == game.chests
+                assert client.game.player_position == game.player_position
+                assert client.game.player_stats == game.player_stats
+                assert client.game.grid.cells == game.grid.cells
+    run_with_server(scenario)
+
+
+def test_failing_session_does_not_stop_the_others():
+    async def scenario(server, port):
+        healthy = await Client.connect(port=port)
+        await healthy.join(seed=1)
+        server.sessions[healthy.session_id].game.inventory = [item_pool[0]] * 300
+        broken = await Client.connect(port=port)
+        await broken.join(seed=2)
+        server.sessions[broken.session_id].game.step = None
+        broken.send_action("up")
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(broken.receive(), 5)
+        healthy.send_action("inventory")
+        assert await asyncio.wait_for(healthy.receive(), 5) == DELTA
+        assert len(healthy.game.inventory) == 300
+        assert broken.session_id not in server.sessions
+    run_with_server(scenario)
+
+
+def test_clients_cannot_see_the_random_state():
+    async def scenario(server, port):
+        client = await Client.connect(port=port)
+        await client.join(seed=123456789012345, map_size=12)
+        game = server.sessions[client.session_id].game
+        state = server.sessions[client.session_id].state_message()
+        assert game.seed.to_bytes(8, "little") not in state
+        assert struct.pack("<I", game.rng.getstate()[1][0]) not in state
+        assert client.game.seed != game.seed
+        assert client.game.rng.getstate() != game.rng.getstate()
+        await client.close()
+    run_with_server(scenario)
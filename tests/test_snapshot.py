@@ -0,0 +1,54 @@
+import random
+import pytest
+from game import DungeonGame, ACTIONS
+from snapshot import snapshot_bytes, restore, save, load, SnapshotReader
+
+
+def state(game):
+    return (list(game.enemies), game.chests, game.obstacles, game.portal_position, game.player_position,
+            game.player_direction, game.player_stats, game.level, [item.id for item in game.inventory],
+            game.selected_item_index, game.inventory_open, game.running,
+            game.boss and (game.boss.position, game.boss.health), game.grid.cells, game.rng.getstate(),
+            game.visibility and (game.visibility.radius, game.visibility.explored, game.visibility.visible))
+
+
+@pytest.mark.parametrize("options", [{}, {"activity_radius": 2}, {"batched_enemies": True}, {"fov_radius": 4}])
+def test_restored_game_plays_on_like_the_original(options):
+    if options.get("batched_enemies"):
+        pytest.importorskip("numpy")
+    for seed in range(8):
+        rng = random.Random(seed)
+        original = DungeonGame(rng.choice([8, 12, 20]), rng.choice(["prim", "backtracker"]), seed=seed, **options)
+        for _ in range(rng.randrange(50, 250)):
+            original.step(rng.choice(ACTIONS))
+
+        restored = restore(snapshot_bytes(original))
+        assert restored.batched_enemies == original.batched_enemies
+        assert restored.activity_radius == original.activity_radius
+        assert state(restored) == state(original)
+        for _ in range(200):
+            action = rng.choice(ACTIONS)
+            original.step(action)
+            restored.step(action)
+            assert state(restored) == state(original)
+
+
+def test_snapshot_files(tmp_path):
+    game = DungeonGame(10, seed=4, fov_radius=3)
+    for action in ("down", "right", "inventory", "inventory", "attack", "wait") * 10:
+        game.step(action)
+    path = tmp_path / "game.dcsv"
+    save(game, path)
+    assert state(load(path)) == state(game)
+    with SnapshotReader(path) as reader:
+        assert reader.map_size == 10
+        assert reader.level == game.level
+        assert reader.player_stats == game.player_stats
+        for row, col in game.obstacles:
+            assert reader.is_wall([row, col])
+        assert state(reader.game()) == state(game)
+
+
+def test_rejects_other_files():
+    with pytest.raises(ValueError):
+        restore(b"DCRL" + bytes(200))
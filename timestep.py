@@ -0,0 +1,46 @@
+class FixedTimestep:
+    """
+        Class FixedTimestep:
+            Decouples the simulation rate from the frame rate. Every frame adds the real time that passed to an
+            accumulator, and the simulation runs one tick for every full tick interval in it, so the game advances at
+            tick_rate whether frames come faster or slower. What is left over is exposed as alpha, the fraction of
+            the next tick that has already passed, for drawing in-between states.
+
+            If frames get so slow that more than max_ticks_per_frame ticks are due, the rest is dropped instead of
+            being caught up, so a slow machine slows the game down rather than falling further behind every frame.
+
+            Methods
+            -------
+            Advance(self, elapsed)
+                Adds the time since the last frame and returns how many ticks to run.
+
+            Alpha (property)
+                Progress towards the next tick, from 0 to 1.
+    """
+    def __init__(self, tick_rate=60, max_ticks_per_frame=5):
+        self.tick_rate = tick_rate
+        self.tick_time = 1 / tick_rate
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.accumulator = 0.0
+        self.ticks = 0  # Ticks run since the start
+
+    def advance(self, elapsed):
+        """
+        :param elapsed: Seconds since the last call.
+        :return: Number of simulation ticks to run now.
+        """
+        self.accumulator += elapsed
+        due = int(self.accumulator / self.tick_time)
+        if due > self.max_ticks_per_frame:
+            due = self.max_ticks_per_frame
+            self.accumulator = self.tick_time * due  # Drop the time that cannot be caught up
+        self.accumulator -= due * self.tick_time
+        self.ticks += due
+        return due
+
+    @property
+    def alpha(self):
+        """
+        :return: How far the time between the last tick and the next one has passed, from 0 to 1.
+        """
+        return self.accumulator / self.tick_time
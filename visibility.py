@@ -0,0 +1,134 @@
+from occupancy import WALL
+
+# Row/column multipliers turning the first octant into each of the eight octants around the viewer
+OCTANTS = (
+    (1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+    (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1)
+)
+
+
+def compute_fov(grid, origin, radius):
+    """
+    Finds the cells visible from a position with recursive shadowcasting. Each octant is scanned row by row outwards
+    from the viewer, and a wall narrows the range of slopes the following rows are scanned in, so cells hidden
+    behind walls are never visited. The cost grows with the visible area, not with the size of the map.
+
+    Walls and the border stop sight but are visible themselves.
+
+    :param grid: The OccupancyGrid holding the walls.
+    :param origin: Position [y, x] of the viewer.
+    :param radius: How far the viewer sees, in cells.
+    :return: Set of the flat grid indices (see OccupancyGrid.index) of every visible cell.
+    """
+    cells = grid.cells
+    width = grid.width
+    last = width - 1
+    origin_y, origin_x = origin[0], origin[1]
+    radius_squared = radius * radius + radius  # Rounds the edge of the circle a little outwards
+    visible = {origin_y * width + origin_x}
+
+    def opaque(y, x):
+        return y <= 0 or x <= 0 or y >= last or x >= last or cells[y * width + x] & WALL
+
+    def scan(row, start, end, xx, xy, yx, yy):
+        # start and end are the slopes of the lit range, from the steep side to the shallow side
+        if start < end:
+            return
+        next_start = start
+        for distance in range(row, radius + 1):
+            blocked = False
+            dy = -distance
+            for dx in range(-distance, 1):
+                left_slope = (dx - 0.5) / (dy + 0.5)
+                right_slope = (dx + 0.5) / (dy - 0.5)
+                if start < right_slope:
+                    continue
+                if end > left_slope:
+                    break
+                y = origin_y + dx * yx + dy * yy
+                x = origin_x + dx * xx + dy * xy
+                if dx * dx + dy * dy <= radius_squared and 0 <= y <= last and 0 <= x <= last:
+                    visible.add(y * width + x)
+                if blocked:
+                    if opaque(y, x):
+                        next_start = right_slope
+                    else:
+                        blocked = False
+                        start = next_start
+                elif opaque(y, x) and distance < radius:
+                    # Scan the part of the next rows left of this wall, then continue right of it
+                    blocked = True
+                    scan(distance + 1, start, left_slope, xx, xy, yx, yy)
+                    next_start = right_slope
+            if blocked:
+                break
+
+    for xx, xy, yx, yy in OCTANTS:
+        scan(1, 1.0, 0.0, xx, xy, yx, yy)
+    return visible
+
+
+class Visibility:
+    """
+        Class Visibility:
+            Field of view and fog of war of one player. It keeps the cells the player can see right now and an
+            "explored" bitmap of every cell they have seen during the level, one byte per grid cell.
+
+            The field of view is only recomputed when the player moved or the map changed, so standing still,
+            fighting and using the inventory cost nothing. Newly explored cells are also listed in revealed, for
+            renderers that keep their own copy of the explored map.
+
+            Methods
+            -------
+            Update(self, grid, position, map_version)
+                Recomputes the field of view if the player moved or a new map was generated.
+
+            Is_visible(self, position), is_explored(self, position)
+                Queries.
+    """
+    def __init__(self, radius):
+        self.radius = radius
+        self.visible = set()  # Flat grid indices of the cells in view
+        self.explored = bytearray()  # 1 for every cell seen during the level
+        self.revealed = []  # Flat grid indices of the explored cells, in the order they were first seen
+        self.width = 0
+        self.origin = None
+        self.map_version = None
+
+    def update(self, grid, position, map_version):
+        """
+        :param grid: The OccupancyGrid holding the walls.
+        :param position: Position [y, x] of the player.
+        :param map_version: The game's map_version, a new map resets what was explored.
+        :return: True if the field of view was recomputed.
+        """
+        origin = (position[0], position[1])
+        if map_version != self.map_version:
+            self.map_version = map_version
+            self.width = grid.width
+            self.explored = bytearray(grid.width * grid.width)
+            self.revealed = []
+        elif origin == self.origin:
+            return False
+        self.origin = origin
+        self.visible = compute_fov(grid, origin, self.radius)
+        explored = self.explored
+        for index in self.visible:
+            if not explored[index]:
+                explored[index] = 1
+                self.revealed.append(index)
+        return True
+
+    def is_visible(self, position):
+        """
+        :param position: Position [y, x] on the map or its border.
+        :return: True if the player can see the position.
+        """
+        return position[0] * self.width + position[1] in self.visible
+
+    def is_explored(self, position):
+        """
+        :param position: Position [y, x] on the map or its border.
+        :return: True if the player has seen the position during this level.
+        """
+        return bool(self.explored[position[0] * self.width + position[1]])
@@ -0,0 +1,446 @@
+import os
+import random
+import struct
+from collections import OrderedDict
+from connectivity import Reachability
+from game import DungeonGame, DIRECTIONS, item_pool, enemy_stats
+from maze import generate_maze, PATH as PATH_CELL
+from occupancy import OccupancyGrid, WALL, ENEMY, CHEST
+from pathfinding import preferred_steps
+
+# Width and height of a chunk in cells
+CHUNK_SIZE = 16
+
+# Chunks kept in memory before the least recently used one is evicted
+MAX_CHUNKS = 64
+
+# Chests generated in every chunk
+CHESTS_PER_CHUNK = 2
+
+# Chunk file header: magic, format version, world seed, chunk size
+CHUNK_HEADER = struct.Struct("<4sBQH")
+CHUNK_MAGIC = b"DCCK"
+CHUNK_VERSION = 1
+
+
+def _door(seed, chunk_row, chunk_col, side, chunk_size):
+    """
+    :param seed: World seed.
+    :param chunk_row: Row of the chunk on the north or west side of the edge.
+    :param chunk_col: Column of that chunk.
+    :param side: "south" or "east", the edge of that chunk the door is in.
+    :param chunk_size: Width and height of a chunk.
+    :return: Offset of the door along the edge. Both chunks sharing the edge get the same value.
+    """
+    return random.Random(f"{seed}:{chunk_row}:{chunk_col}:{side}").randrange(chunk_size)
+
+
+def generate_chunk(seed, chunk_row, chunk_col, chunk_size=CHUNK_SIZE, maze_algorithm="prim"):
+    """
+    Generates one chunk with the same maze rules as a normal level. Every chunk gets one door in each of its four
+    edges, at the same offset as the door on the other side of the edge, and the fewest walls needed to reach every
+    door are opened, so the whole world is connected. Chests and goblins are then placed on the open cells; the
+    further the chunk is from the start, the more goblins it holds.
+
+    :param seed: World seed.
+    :param chunk_row: Row of the chunk, 0 is the chunk the player starts in.
+    :param chunk_col: Column of the chunk.
+    :param chunk_size: Width and height of a chunk.
+    :param maze_algorithm: Name of one of maze.ALGORITHMS.
+    :return: Bytearray of chunk_size² cells with WALL, ENEMY and CHEST flags, laid out row by row.
+    """
+    rng = random.Random(f"{seed}:{chunk_row}:{chunk_col}")
+    width = chunk_size + 2
+    maze = generate_maze(chunk_size, maze_algorithm, rng)
+    anchor = maze.index(PATH_CELL)
+
+    last = chunk_size
+    doors = [
+        [1, _door(seed, chunk_row - 1, chunk_col, "south", chunk_size) + 1],
+        [last, _door(seed, chunk_row, chunk_col, "south", chunk_size) + 1],
+        [_door(seed, chunk_row, chunk_col - 1, "east", chunk_size) + 1, 1],
+        [_door(seed, chunk_row, chunk_col, "east", chunk_size) + 1, last]
+    ]
+    for row, col in doors:
+        maze[row * width + col] = PATH_CELL
+
+    grid = OccupancyGrid(chunk_size)
+    for row in range(1, chunk_size + 1):
+        for col in range(1, chunk_size + 1):
+            if maze[row * width + col] != PATH_CELL:
+                grid.add(WALL, [row, col])
+    reachability = Reachability(grid)  # Labelled once, the walls opened for one door count for the next
+    for door in doors:
+        for position in reachability.connect([anchor // width, anchor % width], door):
+            grid.remove(WALL, position)
+
+    cells = bytearray(chunk_size * chunk_size)
+    for row in range(chunk_size):
+        cells[row * chunk_size:(row + 1) * chunk_size] = grid.cells[(row + 1) * width + 1:(row + 2) * width - 1]
+
+    # Doors stay free so nothing is generated blocking the way between chunks
+    door_cells = {(row - 1) * chunk_size + col - 1 for row, col in doors}
+    open_cells = [cell for cell in range(len(cells)) if not cells[cell] & WALL and cell not in door_cells]
+    if chunk_row == 0 and chunk_col == 0:
+        open_cells = open_cells[1:]  # The first open cell is where the player starts
+    ring = max(abs(chunk_row), abs(chunk_col))
+    num_enemies = 0 if ring == 0 else 2 + ring
+    picked = rng.sample(open_cells, min(len(open_cells), CHESTS_PER_CHUNK + num_enemies))
+    for cell in picked[:CHESTS_PER_CHUNK]:
+        cells[cell] |= CHEST
+    for cell in picked[CHESTS_PER_CHUNK:]:
+        cells[cell] |= ENEMY
+    return cells
+
+
+class Chunk:
+    """
+        Class Chunk:
+            One square piece of the endless world: a flag per cell (see occupancy.py) and whether anything changed
+            since it was generated or loaded.
+    """
+    def __init__(self, row, col, cells):
+        self.row = row
+        self.col = col
+        self.cells = cells
+        self.dirty = False
+
+
+class World:
+    """
+        Class World:
+            The endless dungeon, split into square chunks that are generated from (seed, chunk row, chunk column)
+            when first needed. At most max_chunks are kept in memory; evicting the least recently used one either
+            writes it to cache_dir, if the player changed it, or simply drops it, since an untouched chunk can always
+            be generated again. Without a cache_dir, changed chunks are dropped too and come back as generated.
+            Memory use therefore depends on max_chunks, not on how far the player walks.
+
+            Positions are [y, x] lists on one unbounded grid, negative values included. The methods mirror
+            OccupancyGrid, so the world can be queried the same way as a normal level.
+
+            Methods
+            -------
+            Chunk(self, row, col)
+                Returns a chunk, generating or loading it if needed.
+
+            At(self, position), has(self, kind, position)
+                Queries.
+
+            Add(self, kind, position), remove(self, kind, position), move(self, kind, old, new)
+                Changes, which mark the chunk as dirty.
+
+            Chunks_in(self, top, left, bottom, right)
+                Returns every chunk overlapping an area, e.g. the camera viewport.
+    """
+    def __init__(self, seed, maze_algorithm="prim", chunk_size=CHUNK_SIZE, max_chunks=MAX_CHUNKS, cache_dir=None):
+        self.seed = seed
+        self.maze_algorithm = maze_algorithm
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.cache_dir = cache_dir
+        self.chunks = OrderedDict()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def chunk_path(self, row, col):
+        """
+        :param row: Chunk row.
+        :param col: Chunk column.
+        :return: Path of the file the chunk is evicted to.
+        """
+        return os.path.join(self.cache_dir, f"{row}_{col}.chunk")
+
+    def chunk(self, row, col):
+        """
+        :param row: Chunk row.
+        :param col: Chunk column.
+        :return: The Chunk, now the most recently used one.
+        """
+        key = (row, col)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+
+        cells = self.load_chunk(row, col) if self.cache_dir else None
+        if cells is None:
+            cells = generate_chunk(self.seed, row, col, self.chunk_size, self.maze_algorithm)
+        chunk = self.chunks[key] = Chunk(row, col, cells)
+        while len(self.chunks) > self.max_chunks:
+            _, evicted = self.chunks.popitem(last=False)
+            if evicted.dirty and self.cache_dir:
+                self.save_chunk(evicted)
+        return chunk
+
+    def load_chunk(self, row, col):
+        """
+        :param row: Chunk row.
+        :param col: Chunk column.
+        :return: The cells of an evicted chunk, or None if it was never saved for this world.
+        """
+        try:
+            with open(self.chunk_path(row, col), "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        magic, version, seed, chunk_size = CHUNK_HEADER.unpack_from(data)
+        if magic != CHUNK_MAGIC or version != CHUNK_VERSION or seed != self.seed or chunk_size != self.chunk_size:
+            return None
+        return bytearray(data[CHUNK_HEADER.size:])
+
+    def save_chunk(self, chunk):
+        """
+        :param chunk: Chunk to write to the cache directory.
+        :return: None
+        """
+        path = self.chunk_path(chunk.row, chunk.col)
+        with open(path + ".tmp", "wb") as file:
+            file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, CHUNK_VERSION, self.seed, self.chunk_size) + chunk.cells)
+        os.replace(path + ".tmp", path)
+
+    def flush(self):
+        """
+        Writes every changed chunk still in memory to the cache directory.
+
+        :return: None
+        """
+        if self.cache_dir:
+            for chunk in self.chunks.values():
+                if chunk.dirty:
+                    self.save_chunk(chunk)
+                    chunk.dirty = False
+
+    def locate(self, position):
+        """
+        :param position: A position as a list [y, x].
+        :return: Tuple (chunk, index of the cell inside the chunk).
+        """
+        size = self.chunk_size
+        chunk_row, row = divmod(position[0], size)
+        chunk_col, col = divmod(position[1], size)
+        return self.chunk(chunk_row, chunk_col), row * size + col
+
+    def at(self, position):
+        """
+        :param position: A position as a list [y, x].
+        :return: Bitmask of every kind occupying the position.
+        """
+        chunk, index = self.locate(position)
+        return chunk.cells[index]
+
+    def has(self, kind, position):
+        """
+        :param kind: One of the WALL, ENEMY or CHEST flags.
+        :param position: A position as a list [y, x].
+        :return: True if an entity of that kind occupies the position.
+        """
+        return bool(self.at(position) & kind)
+
+    def add(self, kind, position):
+        """
+        :param kind: One of the WALL, ENEMY or CHEST flags.
+        :param position: A position as a list [y, x].
+        :return: None
+        """
+        chunk, index = self.locate(position)
+        chunk.cells[index] |= kind
+        chunk.dirty = True
+
+    def remove(self, kind, position):
+        """
+        :param kind: One of the WALL, ENEMY or CHEST flags.
+        :param position: A position as a list [y, x].
+        :return: None
+        """
+        chunk, index = self.locate(position)
+        chunk.cells[index] &= ~kind
+        chunk.dirty = True
+
+    def move(self, kind, old_position, new_position):
+        """
+        :param kind: One of the WALL, ENEMY or CHEST flags.
+        :param old_position: The position the entity is leaving.
+        :param new_position: The position the entity moves to.
+        :return: None
+        """
+        if old_position != new_position:
+            self.remove(kind, old_position)
+            self.add(kind, new_position)
+
+    def chunks_in(self, top, left, bottom, right):
+        """
+        :param top: First row of the area.
+        :param left: First column of the area.
+        :param bottom: Last row of the area.
+        :param right: Last column of the area.
+        :return: List of every chunk overlapping the area.
+        """
+        size = self.chunk_size
+        return [self.chunk(row, col) for row in range(top // size, bottom // size + 1)
+                for col in range(left // size, right // size + 1)]
+
+    def spawn_position(self):
+        """
+        :return: The cell the player starts on, the first open cell of chunk (0, 0).
+        """
+        cells = self.chunk(0, 0).cells
+        index = next(index for index, flags in enumerate(cells) if not flags & WALL)
+        return list(divmod(index, self.chunk_size))
+
+
+class EndlessGame(DungeonGame):
+    """
+        Class EndlessGame:
+            Endless mode: the same rules as DungeonGame, played on a World instead of a single fixed map. There are no
+            portals; the level shown is how many chunks away from the start the player has made it, and goblins get
+            more numerous with it.
+
+            Only goblins in the 3x3 chunks around the player take turns. They chase the player through a
+            DistanceField over just those chunks, which is rebuilt when the player enters another chunk.
+
+            Methods
+            -------
+            __init__(self, seed, maze_algorithm, chunk_size, max_chunks, cache_dir)
+                Creates the world and puts the player on its spawn cell.
+    """
+    def __init__(self, seed=None, maze_algorithm="prim", chunk_size=CHUNK_SIZE, max_chunks=MAX_CHUNKS,
+                 cache_dir=None):
+        super().__init__(chunk_size, maze_algorithm, seed=seed, generate_map=False)
+        self.world = World(self.seed, maze_algorithm, chunk_size, max_chunks, cache_dir)
+        self.grid = self.world
+        self.player_position = self.world.spawn_position()
+        self.window = None  # OccupancyGrid with the walls of the chunks around the player
+        self.window_origin = None  # World position of the window's first playable cell
+        self.map_version += 1
+
+    def generate_new_map(self):
+        """
+        The world is generated chunk by chunk as the player walks, there is nothing to do per level.
+
+        :return: None
+        """
+
+    def move_player(self, direction):
+        """
+        :param direction: "up", "down", "left" or "right".
+        :return: None
+        """
+        self.player_direction = direction
+        dy, dx = DIRECTIONS[direction]
+        new_position = [self.player_position[0] + dy, self.player_position[1] + dx]
+        cell = self.world.at(new_position)
+
+        if not cell & (ENEMY | WALL):
+            self.player_position = new_position
+            size = self.world.chunk_size
+            ring = max(abs(new_position[0] // size), abs(new_position[1] // size))
+            if ring + 1 > self.level:
+                self.level = ring + 1
+                self.set_message(f"You reached depth {self.level}!")
+            self.enemy_turn()
+
+        if cell & CHEST:
+            self.open_chest(new_position)
+
+    def open_chest(self, position):
+        """
+        :param position: The position of the chest the player walked into.
+        :return: None
+        """
+        self.world.remove(CHEST, position)
+        item = self.rng.choice(item_pool)
+        self.inventory.append(item)
+        self.set_message(f"You picked up {item.name}!")
+
+    def attack(self):
+        """
+        Removes the goblin in front of the player, if any, and triggers the enemy turn.
+
+        :return: None
+        """
+        attack_position = self.attack_position()
+        if self.world.has(ENEMY, attack_position):
+            self.world.remove(ENEMY, attack_position)
+            self.set_message("You defeated an enemy!")
+        self.enemy_turn()
+
+    def update_window(self):
+        """
+        Rebuilds the wall window around the player when they entered another chunk.
+
+        :return: None
+        """
+        size = self.world.chunk_size
+        origin = [(self.player_position[0] // size - 1) * size, (self.player_position[1] // size - 1) * size]
+        if origin == self.window_origin:
+            return
+        window = OccupancyGrid(3 * size)
+        width = window.width
+        for chunk in self.world.chunks_in(origin[0], origin[1], origin[0] + 3 * size - 1, origin[1] + 3 * size - 1):
+            top = chunk.row * size - origin[0] + 1
+            left = chunk.col * size - origin[1] + 1
+            for row in range(size):
+                start = (top + row) * width + left
+                window.cells[start:start + size] = chunk.cells[row * size:(row + 1) * size]
+        window.cells = window.cells.translate(bytes(flags & WALL for flags in range(256)))
+        self.window = window
+        self.window_origin = origin
+        self.map_version += 1
+
+    def enemy_turn(self):
+        """
+        Moves every goblin in the chunks around the player one step towards them, with the same rules as
+        DungeonGame.enemy_turn, and applies the damage of the goblins that were adjacent.
+
+        :return: None
+        """
+        self.update_window()
+        origin = self.window_origin
+        player_position = self.player_position
+        world = self.world
+
+        def to_window(position):
+            return [position[0] - origin[0] + 1, position[1] - origin[1] + 1]
+
+        def to_world(position):
+            return [position[0] + origin[0] - 1, position[1] + origin[1] - 1]
+
+        enemies = []
+        size = world.chunk_size
+        for chunk in world.chunks_in(origin[0], origin[1], origin[0] + 3 * size - 1, origin[1] + 3 * size - 1):
+            for index, flags in enumerate(chunk.cells):
+                if flags & ENEMY:
+                    enemies.append([chunk.row * size + index // size, chunk.col * size + index % size])
+        if not enemies:
+            return
+
+        field = self.distance_field.update(self.window, to_window(player_position), self.map_version)
+        target = to_window(player_position)
+
+        def is_free(position):
+            return position != target and not world.has(ENEMY, to_world(position))
+
+        for enemy_pos in enemies:
+            diff_x = player_position[1] - enemy_pos[1]
+            diff_y = player_position[0] - enemy_pos[0]
+            local = to_window(enemy_pos)
+
+            if field.distance(local) is not None:
+                new_pos = field.step_towards(local, preferred_steps(local, target), is_free)
+            else:
+                if abs(diff_x) > abs(diff_y):
+                    new_pos = [local[0], local[1] + (1 if diff_x > 0 else -1)]
+                else:
+                    new_pos = [local[0] + (1 if diff_y > 0 else -1), local[1]]
+                if self.window.has(WALL, new_pos) or not is_free(new_pos):
+                    new_pos = None
+
+            if new_pos:
+                world.move(ENEMY, enemy_pos, to_world(new_pos))
+
+            if abs(diff_x) + abs(diff_y) == 1:
+                damage = enemy_stats["attack"]
+                self.player_stats["health"] -= damage
+                self.damage_taken += damage
+                self.last_attacker = "goblin"
+                self.set_message(f"You suffered {damage} damage!")